@@ -0,0 +1,186 @@
+import os
+import sys
+import json
+import time
+import uuid
+import glob
+import re
+import threading
+import numpy as np
+from multiprocessing import shared_memory, resource_tracker
+
+from cache_store import CACHE_DIR
+
+# Side channel for large NumPy results (labels, distances, features, ...).
+#
+# Instead of serializing arrays into the MCP response, a tool publishes them
+# and returns a small handle:
+#   {"handle": id, "kind": "npy" | "shm", "location": <file or shm name>,
+#    "shape": [...], "dtype": "float32", "expires_at": <unix time>}
+# "npy"  → a .npy sidecar under .pct_cache/arrays, opened with mmap (no copy)
+# "shm"  → a POSIX shared-memory segment, for consumers on the same host
+# Every handle has a <id>.json record next to it so any process can resolve
+# or expire it; collect_expired() deletes arrays whose TTL has passed.
+
+ARRAY_DIR = os.path.join(CACHE_DIR, "arrays")
+DEFAULT_KIND = os.environ.get("PCT_ARRAY_KIND", "npy")
+DEFAULT_TTL = float(os.environ.get("PCT_ARRAY_TTL", "600"))
+
+HANDLE_RE = re.compile(r"^[\w-]+-[0-9a-f]{12}$")
+
+_segments: dict[str, shared_memory.SharedMemory] = {}  # segments this process created/attached
+_lock = threading.Lock()
+
+
+def _meta_path(handle_id) -> str:
+    # ids come from clients: never let one name a file outside ARRAY_DIR
+    if not isinstance(handle_id, str) or not HANDLE_RE.match(handle_id):
+        raise KeyError(f"invalid array handle '{handle_id}'")
+    return os.path.join(ARRAY_DIR, handle_id + ".json")
+
+
+def _npy_location(record: dict) -> str:
+    """The .npy file of a record, refusing anything outside ARRAY_DIR."""
+    location = os.path.realpath(record["location"])
+    if os.path.dirname(location) != os.path.realpath(ARRAY_DIR):
+        raise KeyError(f"array handle '{record['handle']}' points outside {ARRAY_DIR}")
+    return location
+
+
+def publish(arr: np.ndarray, name: str = "array", ttl: float | None = None, kind: str | None = None) -> dict:
+    """Store `arr` out of band and return its handle."""
+    kind = kind or DEFAULT_KIND
+    ttl = DEFAULT_TTL if ttl is None else ttl
+    arr = np.ascontiguousarray(arr)
+    safe = re.sub(r"[^\w-]", "_", name) or "array"
+    handle_id = f"{safe}-{uuid.uuid4().hex[:12]}"
+    os.makedirs(ARRAY_DIR, exist_ok=True)
+
+    if kind == "npy":
+        location = os.path.abspath(os.path.join(ARRAY_DIR, handle_id + ".npy"))  # usable from any cwd
+        np.save(location, arr)
+    elif kind == "shm":
+        shm = shared_memory.SharedMemory(create=True, size=max(arr.nbytes, 1))
+        np.ndarray(arr.shape, dtype=arr.dtype, buffer=shm.buf)[...] = arr
+        with _lock:
+            _segments[handle_id] = shm
+        location = shm.name
+    else:
+        raise ValueError(f"unknown array channel '{kind}' (use 'npy' or 'shm')")
+
+    handle = {
+        "handle": handle_id,
+        "kind": kind,
+        "location": location,
+        "shape": list(arr.shape),
+        "dtype": arr.dtype.str,
+        "nbytes": int(arr.nbytes),
+        "expires_at": time.time() + ttl
+    }
+    with open(_meta_path(handle_id), "w") as f:
+        json.dump(handle, f)
+    return handle
+
+
+def resolve(handle) -> dict:
+    """Accept a handle dict or just its id; return the stored record."""
+    handle_id = handle["handle"] if isinstance(handle, dict) else handle
+    try:
+        with open(_meta_path(handle_id)) as f:
+            record = json.load(f)
+    except FileNotFoundError:
+        raise KeyError(f"unknown or expired array handle '{handle_id}'")
+    if record["expires_at"] < time.time():
+        raise KeyError(f"array handle '{handle_id}' expired")
+    return record
+
+
+def open_array(handle) -> np.ndarray:
+    """Zero-copy, read-only view of a published array."""
+    record = resolve(handle)
+    if record["kind"] == "npy":
+        return np.load(_npy_location(record), mmap_mode="r")
+    with _lock:
+        shm = _segments.get(record["handle"])
+        if shm is None:
+            shm = shared_memory.SharedMemory(name=record["location"])
+            # attaching must not make this process unlink the segment on exit
+            try:
+                resource_tracker.unregister(shm._name, "shared_memory")
+            except Exception:
+                pass
+            _segments[record["handle"]] = shm
+    arr = np.ndarray(record["shape"], dtype=np.dtype(record["dtype"]), buffer=shm.buf)
+    arr.flags.writeable = False
+    return arr
+
+
+def release(handle) -> bool:
+    """Delete one array now. Returns False if it was already gone."""
+    handle_id = handle["handle"] if isinstance(handle, dict) else handle
+    try:
+        with open(_meta_path(handle_id)) as f:
+            record = json.load(f)
+    except FileNotFoundError:
+        return False
+    if record.get("handle") != handle_id:
+        raise KeyError(f"array record '{handle_id}' does not match its handle")
+    _delete(record)
+    return True
+
+
+def _delete(record: dict) -> None:
+    if record["kind"] == "npy":
+        try:
+            os.remove(_npy_location(record))
+        except FileNotFoundError:
+            pass
+    else:
+        with _lock:
+            shm = _segments.pop(record["handle"], None)
+        try:
+            shm = shm or shared_memory.SharedMemory(name=record["location"])
+            shm.close()
+            shm.unlink()
+        except FileNotFoundError:
+            pass
+    try:
+        os.remove(_meta_path(record["handle"]))
+    except FileNotFoundError:
+        pass
+
+
+def collect_expired(now: float | None = None) -> int:
+    """Delete every array whose TTL has passed. Returns how many were removed."""
+    now = now or time.time()
+    removed = 0
+    for meta in glob.glob(os.path.join(ARRAY_DIR, "*.json")):
+        try:
+            with open(meta) as f:
+                record = json.load(f)
+        except (OSError, ValueError):
+            continue
+        if record.get("expires_at", 0) < now:
+            try:
+                _delete(record)
+            except KeyError as e:
+                print(f"[warn] skipping array record '{meta}': {e}", file=sys.stderr, flush=True)
+                continue
+            removed += 1
+    return removed
+
+
+def start_gc(interval: float = 60.0) -> threading.Thread:
+    """Background thread that calls collect_expired() every `interval` seconds."""
+    def loop():
+        while True:
+            try:
+                n = collect_expired()
+                if n:
+                    print(f"[debug] array gc removed {n} expired arrays", file=sys.stderr, flush=True)
+            except Exception as e:
+                print(f"[warn] array gc failed: {e}", file=sys.stderr, flush=True)
+            time.sleep(interval)
+    t = threading.Thread(target=loop, name="array-gc", daemon=True)
+    t.start()
+    return t
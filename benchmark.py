@@ -0,0 +1,385 @@
+#!/usr/bin/env python3
+"""
+Benchmark harness for pointcloud_tools and the MCP request path
+──────────────────────────────────────────────────────────────
+• Generates synthetic clouds (ASCII and binary PLY) of increasing size.
+• Times every pointcloud_tools function headless (PCT_HEADLESS=1), each call
+  in a fresh process so peak RSS is per call and caches start cold.
+• Measures end-to-end `tools/call` latency through s.py's streamable-http
+  transport, plus the server's peak RSS.
+• `--dispatcher 1,2,4` measures concurrent throughput through dispatcher.py
+  with that many workers, and each worker's cloud cache hit rate.
+• Appends one JSON record per measurement to bench_results/<commit>.jsonl;
+  `--compare old.jsonl new.jsonl` prints the ratios between two runs.
+
+Examples:
+    python benchmark.py --sizes 1e4,1e5,1e6
+    python benchmark.py --sizes 1e8 --formats binary --functions count_points,get_bounding_box
+    python benchmark.py --mcp-only --mcp-calls 50
+    python benchmark.py --dispatcher 1,2,4 --sizes 1e6
+    python benchmark.py --compare bench_results/abc123.jsonl bench_results/def456.jsonl
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import socket
+import argparse
+import tempfile
+import resource
+import subprocess
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import numpy as np
+
+BENCH_DIR = os.environ.get("PCT_BENCH_DIR", "bench_data")
+RESULTS_DIR = "bench_results"
+CHUNK = 5_000_000  # points generated/written per chunk, bounds memory for 1e8 clouds
+
+# Heavy reconstructions are skipped above this many points unless --no-limits.
+SIZE_LIMITS = {
+    "poisson_mesh_reconstruction": 1_000_000,
+    "mesh_poisson_compare": 1_000_000,
+    "ball_pivot_mesh": 1_000_000,
+    "delaunay_mesh": 10_000_000,
+    "detect_iss_keypoints": 1_000_000,
+    "cluster_dbscan": 1_000_000,
+    "register_clouds": 10_000_000,
+    "index_scans": 10_000_000,
+    "find_similar_scans": 10_000_000,
+}
+
+
+# ─── Synthetic data ───────────────────────────────────────────────────────────
+
+def _synthetic_chunk(n: int, seed: int) -> np.ndarray:
+    """A floor plane, a sphere and a box-ish blob: gives planes/clusters/normals something to find."""
+    rng = np.random.default_rng(seed)
+    kind = rng.integers(0, 3, n)
+    pts = np.empty((n, 3), dtype=np.float32)
+    floor = kind == 0
+    pts[floor, :2] = rng.uniform(-5, 5, (floor.sum(), 2))
+    pts[floor, 2] = rng.normal(0, 0.002, floor.sum())
+    sphere = kind == 1
+    v = rng.normal(size=(sphere.sum(), 3))
+    pts[sphere] = v / np.linalg.norm(v, axis=1, keepdims=True) + np.array([1.5, 0, 1.2])
+    box = kind == 2
+    pts[box] = rng.uniform([-3, -2, 0], [-2, -1, 1.5], (box.sum(), 3))
+    return pts
+
+
+def write_ply(path: str, n: int, binary: bool) -> str:
+    if os.path.exists(path):
+        return path
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    header = ("ply\n"
+              f"format {'binary_little_endian' if binary else 'ascii'} 1.0\n"
+              f"element vertex {n}\n"
+              "property float x\nproperty float y\nproperty float z\n"
+              "end_header\n")
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(header.encode("ascii"))
+        for i, start in enumerate(range(0, n, CHUNK)):
+            pts = _synthetic_chunk(min(CHUNK, n - start), seed=i)
+            if binary:
+                f.write(pts.astype("<f4").tobytes())
+            else:
+                np.savetxt(f, pts, fmt="%.6f")
+    os.replace(tmp, path)
+    return path
+
+
+# ─── Function benchmarks ──────────────────────────────────────────────────────
+
+def _function_cases(ply: str) -> dict:
+    """Arguments for every pointcloud_tools function, for one input cloud."""
+    folder = os.path.dirname(ply)
+    return {
+        "scan_room": {},
+        "count_points": {"path": ply},
+        "get_bounding_box": {"path": ply},
+        "find_ply_files": {"path": folder},
+        "list_files": {"path": folder},
+        "visualize_pointcloud": {"path": ply},
+        "color_by_height": {"path": ply},
+        "show_oriented_bounding_box": {"path": ply},
+        "visualize_voxel_grid": {"path": ply},
+        "segment_plane_colormap": {"path": ply},
+        "cluster_dbscan": {"path": ply, "eps": 0.05},
+        "detect_iss_keypoints": {"path": ply, "salient_radius": 0.05, "non_max_radius": 0.05},
+        "animate_view": {"path": ply},
+        "show_hybrid": {"path_pc": ply, "path_mesh": ply},
+        "segment_plane": {"path": ply},
+        "slice_cloud": {"path": ply},
+        "poisson_mesh_reconstruction": {"path": ply},
+        "mesh_poisson_compare": {"path": ply},
+        "ball_pivot_mesh": {"path": ply},
+        "delaunay_mesh": {"path": ply, "tiled": True, "display": False,
+                          "output_path": os.path.join(folder, "bench_delaunay.ply")},
+        "compute_fpfh": {"path": ply},
+        "register_clouds": {"source": ply, "target": ply},
+        "index_scans": {"path": folder},
+        "find_similar_scans": {"path": ply},
+        "voxel_downsample": {"path": ply},
+    }
+
+
+def _timed_call(name: str, kwargs: dict, cache_dir: str) -> dict:
+    """Runs in a fresh child process: import, call, report wall time and peak RSS."""
+    os.environ["PCT_HEADLESS"] = "1"
+    os.environ["PCT_CACHE_DIR"] = cache_dir  # read by cache_store at import
+    t0 = time.perf_counter()
+    import pointcloud_tools as pct
+    t_import = time.perf_counter() - t0
+    record = {"import_seconds": t_import}
+    t0 = time.perf_counter()
+    try:
+        getattr(pct, name)(**kwargs)
+        record["ok"] = True
+    except Exception as e:
+        record["ok"] = False
+        record["error"] = f"{type(e).__name__}: {e}"
+    record["seconds"] = time.perf_counter() - t0
+    record["peak_rss_kb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return record
+
+
+def bench_functions(sizes: list[int], formats: list[str], only: set[str] | None,
+                    no_limits: bool, repeat: int, emit) -> None:
+    ctx = mp.get_context("spawn")
+    for n in sizes:
+        for fmt in formats:
+            ply = write_ply(os.path.join(BENCH_DIR, f"{fmt}_{n}", f"synthetic_{n}.ply"), n, fmt == "binary")
+            for name, kwargs in _function_cases(ply).items():
+                if only and name not in only:
+                    continue
+                if not no_limits and n > SIZE_LIMITS.get(name, float("inf")):
+                    continue
+                for r in range(repeat):
+                    # an empty cache dir per call, so every measurement starts cold
+                    cache_dir = tempfile.mkdtemp(prefix="pct_bench_cache_")
+                    try:
+                        with ProcessPoolExecutor(max_workers=1, mp_context=ctx) as pool:
+                            record = pool.submit(_timed_call, name, kwargs, cache_dir).result()
+                    finally:
+                        shutil.rmtree(cache_dir, ignore_errors=True)
+                    emit({"kind": "function", "name": name, "points": n, "format": fmt,
+                          "file_bytes": os.path.getsize(ply), "repeat": r, **record})
+
+
+# ─── MCP request path ─────────────────────────────────────────────────────────
+
+def _wait_for_port(host: str, port: int, timeout: float) -> None:
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        with socket.socket() as s:
+            if s.connect_ex((host, port)) == 0:
+                return
+        time.sleep(0.1)
+    raise RuntimeError(f"server did not open {host}:{port} within {timeout}s")
+
+
+def _call_tool(url: str, name: str, args: dict, rpc_id: int):
+    import requests
+    rpc = {"jsonrpc": "2.0", "id": rpc_id, "method": "tools/call",
+           "params": {"name": name, "arguments": args}}
+    headers = {"Content-Type": "application/json", "Accept": "application/json, text/event-stream"}
+    resp = requests.post(url, json=rpc, headers=headers, stream=True)
+    resp.raise_for_status()
+    if resp.headers.get("content-type", "").startswith("application/json"):
+        return resp.json()
+    for line in resp.iter_lines(decode_unicode=True):
+        if line and line.startswith("data:"):
+            return json.loads(line[len("data:"):].strip())
+    raise RuntimeError("No result from MCP")
+
+
+def _peak_rss_kb(pid: int) -> int | None:
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def bench_mcp(sizes: list[int], calls: int, emit, host: str = "127.0.0.1", port: int = 8000) -> None:
+    url = f"http://{host}:{port}/mcp/"
+    env = dict(os.environ, PCT_HEADLESS="1")
+    t0 = time.perf_counter()
+    server = subprocess.Popen([sys.executable, "s.py"], env=env,
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        _wait_for_port(host, port, timeout=120)
+        emit({"kind": "mcp_startup", "name": "s.py", "seconds": time.perf_counter() - t0})
+        for n in sizes:
+            ply = write_ply(os.path.join(BENCH_DIR, f"binary_{n}", f"synthetic_{n}.ply"), n, True)
+            for tool, args in (("count_points", {"path": ply}),
+                               ("get_bounding_box", {"path": ply}),
+                               ("find_ply_files", {"path": os.path.dirname(ply)})):
+                lat = []
+                errors = 0
+                for i in range(calls):
+                    t = time.perf_counter()
+                    msg = _call_tool(url, tool, args, i)
+                    lat.append(time.perf_counter() - t)
+                    errors += "error" in msg or bool(msg.get("result", {}).get("isError"))
+                lat = np.array(lat)
+                emit({"kind": "mcp", "name": tool, "points": n, "calls": calls, "errors": int(errors),
+                      "mean_seconds": float(lat.mean()), "p50_seconds": float(np.percentile(lat, 50)),
+                      "p95_seconds": float(np.percentile(lat, 95)), "first_seconds": float(lat[0]),
+                      "server_peak_rss_kb": _peak_rss_kb(server.pid)})
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+
+def _tool_json(msg: dict):
+    """Decode the JSON text a tool returned inside a tools/call response."""
+    content = msg.get("result", {}).get("content") or [{}]
+    try:
+        return json.loads(content[0].get("text", ""))
+    except (ValueError, TypeError):
+        return None
+
+
+def _wait_for_ring(host: str, port: int, workers: int, timeout: float) -> None:
+    """Workers join the hash ring on the dispatcher's next health pass, not when their port opens."""
+    import requests
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if len(requests.get(f"http://{host}:{port}/dispatcher/stats", timeout=2).json()["ring_nodes"]) >= workers:
+                return
+        except (requests.RequestException, ValueError, KeyError):
+            pass
+        time.sleep(0.1)
+    raise RuntimeError(f"dispatcher did not route to all {workers} workers within {timeout}s")
+
+
+def bench_dispatcher(worker_counts: list[int], sizes: list[int], calls: int, concurrency: int, files: int, emit,
+                     host: str = "127.0.0.1", port: int = 8000, base_port: int = 8101) -> None:
+    """Concurrent count_points over `files` clouds through dispatcher.py, once per worker count."""
+    url = f"http://{host}:{port}/mcp/"
+    env = dict(os.environ, PCT_HEADLESS="1")
+    for n in sizes:
+        plys = [write_ply(os.path.join(BENCH_DIR, f"dispatch_{n}", f"synthetic_{n}_{i}.ply"), n, True)
+                for i in range(files)]
+        jobs = [plys[i % files] for i in range(calls)]
+        for workers in worker_counts:
+            proc = subprocess.Popen([sys.executable, "dispatcher.py", "--workers", str(workers),
+                                     "--port", str(port), "--base-port", str(base_port)],
+                                    env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            try:
+                _wait_for_port(host, port, timeout=30)
+                for i in range(workers):
+                    _wait_for_port(host, base_port + i, timeout=120)
+                _wait_for_ring(host, port, workers, timeout=30)
+                t0 = time.perf_counter()
+                with ThreadPoolExecutor(concurrency) as pool:
+                    msgs = list(pool.map(lambda a: _call_tool(url, "count_points", {"path": a[1]}, a[0]),
+                                         enumerate(jobs)))
+                wall = time.perf_counter() - t0
+                errors = sum("error" in m or bool(m.get("result", {}).get("isError")) for m in msgs)
+                hits = misses = 0
+                for i in range(workers):
+                    stats = _tool_json(_call_tool(f"http://{host}:{base_port + i}/mcp/", "server_stats", {}, -1)) or {}
+                    cache = stats.get("cloud_cache", {})
+                    hits += cache.get("hits", 0)
+                    misses += cache.get("misses", 0)
+                emit({"kind": "dispatcher", "name": f"count_points_x{workers}", "points": n, "workers": workers,
+                      "calls": calls, "files": files, "concurrency": concurrency, "errors": int(errors),
+                      "seconds": wall, "calls_per_second": calls / wall,
+                      "cache_hit_rate": hits / (hits + misses) if hits + misses else 0.0})
+            finally:
+                proc.terminate()
+                proc.wait(timeout=30)
+
+
+# ─── Results ──────────────────────────────────────────────────────────────────
+
+def _git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def _record_key(r: dict) -> tuple:
+    return r["kind"], r["name"], r.get("points"), r.get("format")
+
+
+def compare(old_path: str, new_path: str) -> None:
+    def load(p):
+        out = {}
+        with open(p) as f:
+            for line in f:
+                r = json.loads(line)
+                t = r.get("seconds", r.get("mean_seconds"))
+                if t is not None:
+                    out.setdefault(_record_key(r), []).append(t)
+        return {k: min(v) for k, v in out.items()}
+    old, new = load(old_path), load(new_path)
+    print(f"{'kind':<12} {'name':<30} {'points':>10} {'format':<7} {'old s':>9} {'new s':>9} {'ratio':>7}")
+    for k in sorted(set(old) & set(new), key=str):
+        kind, name, n, fmt = k
+        print(f"{kind:<12} {name:<30} {str(n):>10} {str(fmt):<7} {old[k]:>9.4f} {new[k]:>9.4f} {new[k] / old[k]:>7.2f}")
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--sizes", default="1e4,1e5,1e6", help="comma separated point counts, up to 1e8")
+    ap.add_argument("--formats", default="ascii,binary")
+    ap.add_argument("--functions", default=None, help="comma separated subset of pointcloud_tools functions")
+    ap.add_argument("--repeat", type=int, default=1)
+    ap.add_argument("--no-limits", action="store_true", help="also run heavy reconstructions on huge clouds")
+    ap.add_argument("--mcp-calls", type=int, default=20)
+    ap.add_argument("--mcp-only", action="store_true")
+    ap.add_argument("--skip-mcp", action="store_true")
+    ap.add_argument("--dispatcher", default=None, help="comma separated worker counts, e.g. 1,2,4")
+    ap.add_argument("--dispatcher-files", type=int, default=16)
+    ap.add_argument("--dispatcher-concurrency", type=int, default=8)
+    ap.add_argument("--output", default=None)
+    ap.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"))
+    args = ap.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    sizes = [int(float(s)) for s in args.sizes.split(",")]
+    formats = args.formats.split(",")
+    only = set(args.functions.split(",")) if args.functions else None
+    commit = _git_commit()
+    out_path = args.output or os.path.join(RESULTS_DIR, f"{commit}.jsonl")
+    os.makedirs(os.path.dirname(out_path) or ".", exist_ok=True)
+
+    with open(out_path, "a") as out:
+        def emit(record: dict) -> None:
+            record = {"commit": commit, "timestamp": time.time(), **record}
+            out.write(json.dumps(record) + "\n")
+            out.flush()
+            t = record.get("seconds", record.get("mean_seconds"))
+            status = "" if record.get("ok", True) else f"  FAILED {record.get('error')}"
+            print(f"[bench] {record['kind']:<12} {record['name']:<30} {str(record.get('points', '')):>10} "
+                  f"{record.get('format', ''):<7} {t:.4f}s{status}", file=sys.stderr, flush=True)
+
+        if args.dispatcher:
+            bench_dispatcher([int(w) for w in args.dispatcher.split(",")], sizes, max(args.mcp_calls, 64),
+                             args.dispatcher_concurrency, args.dispatcher_files, emit)
+        else:
+            if not args.mcp_only:
+                bench_functions(sizes, formats, only, args.no_limits, args.repeat, emit)
+            if not args.skip_mcp:
+                bench_mcp(sizes, args.mcp_calls, emit)
+    print(f"results appended to {out_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -12,6 +12,7 @@ PointCloudAgent demo client
 
 
 
+import os
 import json
 import re
 import sys
@@ -22,6 +23,11 @@ from fastmcp.exceptions import ToolError
 from llama_cpp import Llama
 from colorama import init, Fore, Style   # pip install colorama
 
+from turn_profiler import TurnProfiler
+from result_compaction import fit_to_budget
+from intent_router import IntentRouter
+from response_cache import ResponseCache
+
 #!/usr/bin/env python3
 from colorama import init, Fore, Style
 
@@ -36,6 +42,10 @@ print(Fore.GREEN + "LLM: Ready to interact with users and MCP’s.\n\n" + Style.
 # ── Configuration ────────────────────────────────────────────────────────────
 MODEL_PATH   = "./models/Meta-Llama-3-8B-Instruct.Q4_0.gguf"
 RPC_ENDPOINT = "http://127.0.0.1:8000/mcp/"
+# Max prompt tokens a single tool result may add to the history
+TOOL_RESULT_BUDGET = int(os.environ.get("PCT_TOOL_BUDGET", "512"))
+# Max tokens of the reply recorded for a fast-path (no LLM) command
+FAST_REPLY_BUDGET = 64
 
 llm = Llama(
     model_path=MODEL_PATH,
@@ -54,11 +64,12 @@ Only call an MCP tool when the user explicitly provides:
 
 Available tools:
   • count_points(path: str)
-  • get_bounding_box(path: str)
-  • find_ply_files(path: str)
-  • list_files(path: str, extension: str | None)
+  • get_bounding_box(path: str, approximate: bool, sample_size: int | None)
+  • find_ply_files(path: str, limit: int | None, cursor: str | None, summarize: bool)
+  • list_files(path: str, extension: str | None, limit: int | None, cursor: str | None, summarize: bool)
   • visualize_pointcloud(path: str)
   • color_by_height(path: str, colormap: str)
+  • describe_scan(path: str)
   • show_oriented_bounding_box(path: str)
   • visualize_voxel_grid(path: str, voxel_size: float)
   • voxel_downsample(path: str, voxel_size: float)
@@ -67,7 +78,10 @@ Available tools:
                            ransac_n: int,
                            num_iterations: int,
                            colormap: str)
-  • cluster_dbscan(path: str, eps: float, min_points: int)
+  • cluster_dbscan(path: str, eps: float, min_points: int, return_labels: bool,
+                   approximate: bool, sample_size: int | None)
+  • describe_array(handle: str)
+  • release_array(handle: str)
   • detect_iss_keypoints(path: str,
                          salient_radius: float,
                          non_max_radius: float)
@@ -77,17 +91,34 @@ Available tools:
   • segment_plane(path: str,
                   distance_threshold: float,
                   ransac_n: int,
-                  num_iterations: int)
+                  num_iterations: int,
+                  approximate: bool,
+                  sample_size: int | None)
+      approximate=True answers from a sample of a huge scan with error estimates;
+      call again with the returned next_sample_size for a more precise answer
   • slice_cloud(path: str, axis: str, num_slices: int)
-  • poisson_mesh_reconstruction(path: str, depth: int)
+  • poisson_mesh_reconstruction(path: str, depth: int | None, voxel_size: float | None)
   • mesh_poisson_compare(path: str, depth1: int, depth2: int)
-  • ball_pivot_mesh(path: str, radii: list[float])
-  • delaunay_mesh(path: str)
-  • scan_room()
+  • ball_pivot_mesh(path: str, radii: list[float] | None, voxel_size: float | None)
+  • delaunay_mesh(path: str, tiled: bool, voxel_size: float | None, output_path: str | None)
+  • run_pipeline(path: str, steps: list[{"op": str, "args": dict}])
+      ops: voxel_downsample, remove_outliers, segment_plane (keep: "outliers"/"inliers"/"all"),
+           cluster_dbscan, compute_fpfh, estimate_normals, get_bounding_box, count_points
+  • scan_room(action: str, source: str, voxel_size: float, output_path: str | None)
+      action: "start" | "status" | "stop" | "save"; afterwards other tools accept path "scan://live"
+  • server_stats(tool: str | None)
   • compute_fpfh(path: str,
                  voxel_size: float,
                  radius_normal: float,
                  radius_feature: float)
+  • register_clouds(source: str,
+                    target: str,
+                    voxel_size: float,
+                    method: str)
+  • detect_changes(path: str, reference: str, voxel_size: float, save_as: str | None)
+      reference is a .ply or "ref:<name>" stored by an earlier call with save_as=<name>
+  • index_scans(path: str)
+  • find_similar_scans(path: str, k: int, library: str | None)
 
 When calling a tool, emit **exactly one** JSON object on its own line:
 {"tool": "tool_name", "args": {"arg": "value"}}
@@ -104,11 +135,18 @@ init(autoreset=True)
 def red(txt: str)   -> str: return f"{Fore.RED}{txt}{Style.RESET_ALL}"
 def green(txt: str) -> str: return f"{Fore.GREEN}{txt}{Style.RESET_ALL}"
 
-def ask_llm(prompt: str, stop=None, max_tokens=256) -> str:
+profiler = TurnProfiler(llm)
+router   = IntentRouter()
+cache    = ResponseCache()
+
+def ask_llm(prompt: str, stop=None, max_tokens=256, stage: str = "llm") -> str:
     params = {"prompt": prompt, "temperature": 0.0, "max_tokens": max_tokens}
     if stop:
         params["stop"] = stop
-    return llm.create_completion(**params)["choices"][0]["text"].strip()
+    return profiler.complete(stage, **params).strip()
+
+def count_tokens(text: str) -> int:
+    return len(llm.tokenize(text.encode("utf-8"), add_bos=False))
 
 def extract_tool_call(text: str):
     decoder = json.JSONDecoder()
@@ -134,57 +172,85 @@ def unwrap(resp):
         return {k: unwrap(v) for k, v in resp.items()}
     return resp
 
+def tool_message(result) -> str:
+    """The 'message' field of a tool result, or the whole result as text."""
+    if isinstance(result, dict) and "message" in result:
+        return result["message"]
+    if isinstance(result, list) and result and isinstance(result[0], dict) and "message" in result[0]:
+        return result[0]["message"]
+    return str(result)
+
 async def main():
     history = SYSTEM_PROMPT
     client  = Client(RPC_ENDPOINT)
 
     async with client:
+        router.set_tools(await client.list_tools())
         while True:
             user = input(">>> ").strip()
+            profiler.start_turn(user)
             history += f"\nUser: {user}\nAssistant:"
 
             # 1) Pure greetings → direct LLM reply
             if GREETING_RE.match(user):
-                reply = ask_llm(history, stop=["\n"])
+                reply = ask_llm(history, stop=["\n"], stage="greeting")
                 print(green(reply))
                 history += " " + reply
+                profiler.end_turn(path="greeting")
+                continue
+
+            # 2) Unambiguous commands → tool call straight from the rules, no LLM
+            call = router.route(user)
+            fast = call is not None
+
+            # 3) Same question and call as before, files unchanged → stored answer, no LLM/MCP
+            cached = cache.lookup(user, call)
+            if cached:
+                print(red(tool_message(cached["result"])))
+                history += f"\n{fit_to_budget(cached['result'], TOOL_RESULT_BUDGET, count_tokens)}\nAssistant: {cached['final']}"
+                profiler.end_turn(path="cache", tool=cached["call"]["tool"], cache_hit_rate=cache.stats()["hit_rate"])
                 continue
 
-            # 2) Ask LLM for draft (may emit JSON tool call)
-            # draft = ask_llm(history, stop=["\n"])
-            draft = ask_llm(history)
-            call  = extract_tool_call(draft)
+            # 3b) Not routed and not cached → ask LLM for draft (may emit JSON tool call)
+            if not fast:
+                # draft = ask_llm(history, stop=["\n"])
+                draft = ask_llm(history, stage="draft")
+                with profiler.stage("extract"):
+                    call = extract_tool_call(draft)
 
             if call:
                 # Perform the tool call
-                try:
-                    raw    = await client.call_tool(call["tool"], call.get("args", {}))
-                    result = unwrap(raw)
-                except ToolError as e:
-                    result = {"error": str(e)}
-                except Exception as e:
-                    result = {"error": f"Unexpected: {e}"}
-
-                # 3) Print only the 'message' field in red
-                message = None
-                if isinstance(result, dict) and "message" in result:
-                    message = result["message"]
-                elif isinstance(result, list) and result and isinstance(result[0], dict) and "message" in result[0]:
-                    message = result[0]["message"]
-                else:
-                    message = str(result)
+                with profiler.stage("tool", tool=call["tool"]):
+                    try:
+                        raw    = await client.call_tool(call["tool"], call.get("args", {}))
+                        result = unwrap(raw)
+                    except ToolError as e:
+                        result = {"error": str(e)}
+                    except Exception as e:
+                        result = {"error": f"Unexpected: {e}"}
+
+                # 4) Print only the 'message' field in red
+                message = tool_message(result)
                 print(red(message))
 
-                # 4) Feed full result back to LLM for wrap-up
-                history += f"\n{json.dumps(result, ensure_ascii=False)}\nAssistant:"
-                final = ask_llm(history, stop=["\n"])
+                # 5) Feed full result back to LLM for wrap-up
+                history += f"\n{fit_to_budget(result, TOOL_RESULT_BUDGET, count_tokens)}\nAssistant:"
+                if fast:
+                    # the result is already in the history above; keep only a short echo of it
+                    final = fit_to_budget(message, FAST_REPLY_BUDGET, count_tokens)
+                else:
+                    final = ask_llm(history, stop=["\n"], stage="wrapup")
                 # print(green(final))
                 history += " " + final
+                cache.store(user, call, result, final)
+                profiler.end_turn(path="fast" if fast else "tool", tool=call["tool"],
+                                  fast_path_hit_rate=router.stats()["hit_rate"])
 
             else:
-                # 5) Direct plain-text reply
+                # 6) Direct plain-text reply
                 # print(green(draft))
                 history += " " + draft
+                profiler.end_turn(path="reply")
 
 if __name__ == "__main__":
     try:
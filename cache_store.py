@@ -0,0 +1,33 @@
+import os
+import hashlib
+
+# Root folder for everything we persist between tool calls (features, meshes, ...).
+CACHE_DIR = os.environ.get("PCT_CACHE_DIR", ".pct_cache")
+
+
+def cache_path(kind: str, key: str, suffix: str) -> str:
+    """
+    Path of a cache entry, e.g. cache_path("fpfh", key, ".npz") → .pct_cache/fpfh/<key>.npz
+    The sub-folder is created on demand.
+    """
+    folder = os.path.join(CACHE_DIR, kind)
+    os.makedirs(folder, exist_ok=True)
+    return os.path.join(folder, key + suffix)
+
+
+def file_fingerprint(path: str) -> str:
+    """
+    Cheap identity of a file on disk: absolute path + size + mtime.
+    Changes whenever the file is rewritten, so it is safe to key caches on it.
+    """
+    st = os.stat(path)
+    return f"{os.path.abspath(path)}|{st.st_size}|{st.st_mtime_ns}"
+
+
+def cache_key(*parts) -> str:
+    """Stable short hash of the given parts (fingerprints, parameters, ...)."""
+    h = hashlib.sha1()
+    for p in parts:
+        h.update(repr(p).encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()[:24]
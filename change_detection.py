@@ -0,0 +1,197 @@
+import os
+import sys
+import glob
+import numpy as np
+
+import sampling
+import room_scanner
+import scan_metadata
+from cache_store import cache_path, cache_key, file_fingerprint, CACHE_DIR
+from tracing import span
+from lazy_import import lazy_import
+
+o3d = lazy_import("open3d")
+csgraph = lazy_import("scipy.sparse.csgraph")
+sparse = lazy_import("scipy.sparse")
+
+# Change detection between scans of the same space, on voxel occupancy sets.
+#
+# Every scan is reduced once to the sorted int64 keys of the voxels it occupies
+# (plus a point count per voxel) on a fixed world grid, so scans taken on
+# different days line up voxel for voxel. Comparing two scans is then a pair of
+# sorted-array set differences, and the changed voxels are grouped into regions
+# by 26-connectivity.
+#
+#   .pct_cache/occupancy/<key>.npz          per file version and voxel size
+#   .pct_cache/occupancy/ref_<name>.npz     named references (save_as=...), which
+#                                           survive the scan file being overwritten
+#
+# Both scans must already be in the same coordinate frame (see register_clouds).
+
+OCC_DIR = os.path.join(CACHE_DIR, "occupancy")
+BITS = 21                       # per axis, packed into one int64
+BIAS = 1 << (BITS - 1)          # voxel indices must lie in [-BIAS + 1, BIAS - 1)
+MASK = (1 << BITS) - 1
+CHUNK = 5_000_000               # points per chunk when streaming binary PLY
+REF_PREFIX = "ref:"
+
+
+# ─── Occupancy sets ───────────────────────────────────────────────────────────
+
+def pack(ijk: np.ndarray) -> np.ndarray:
+    # one spare cell at each end of every axis, so a ±1 neighbour offset added to a
+    # packed key (see regions) can never carry or borrow into the next field
+    if len(ijk) and (ijk.min() < -BIAS + 1 or ijk.max() >= BIAS - 1):
+        raise ValueError(f"scan spans more than {(1 << BITS) - 2} voxels per axis; use a larger voxel_size")
+    u = (ijk + BIAS).astype(np.int64)
+    return (u[:, 0] << (2 * BITS)) | (u[:, 1] << BITS) | u[:, 2]
+
+
+def unpack(keys: np.ndarray) -> np.ndarray:
+    return np.stack([(keys >> (2 * BITS)) & MASK, (keys >> BITS) & MASK, keys & MASK], axis=1) - BIAS
+
+
+def _voxelize(points: np.ndarray, voxel_size: float) -> tuple[np.ndarray, np.ndarray]:
+    keys = pack(np.floor(points / voxel_size).astype(np.int64))
+    return np.unique(keys, return_counts=True)
+
+
+def _merge(parts: list[tuple[np.ndarray, np.ndarray]]) -> tuple[np.ndarray, np.ndarray]:
+    if len(parts) == 1:
+        return parts[0]
+    keys, inverse = np.unique(np.concatenate([k for k, _ in parts]), return_inverse=True)
+    counts = np.bincount(inverse, weights=np.concatenate([c for _, c in parts]))
+    return keys, counts.astype(np.int64)
+
+
+def compute_occupancy(path: str, voxel_size: float) -> tuple[np.ndarray, np.ndarray]:
+    """(sorted voxel keys, points per voxel) of a scan file."""
+    header = sampling.ply_header(path)
+    if header is not None and header["dtype"] is not None:
+        # binary PLY: stream the vertex block, never holding the whole cloud
+        rows = np.memmap(path, dtype=header["dtype"], mode="r", offset=header["offset"], shape=(header["count"],))
+        parts = []
+        with span("load", bytes_read=os.path.getsize(path), streamed=True) as attrs:
+            for start in range(0, len(rows), CHUNK):
+                block = rows[start:start + CHUNK]
+                pts = np.stack([block["x"], block["y"], block["z"]], axis=1).astype(np.float64)
+                parts.append(_voxelize(pts, voxel_size))
+            attrs["points"] = len(rows)
+        return _merge(parts) if parts else (np.empty(0, np.int64), np.empty(0, np.int64))
+    pc = scan_metadata.load_sidecar(path)
+    if pc is None:
+        with span("load", bytes_read=os.path.getsize(path)) as attrs:
+            pc = o3d.io.read_point_cloud(path)
+            attrs["points"] = len(pc.points)
+    return _voxelize(np.asarray(pc.points), voxel_size)
+
+
+def _store_path(path: str, voxel_size: float) -> str:
+    return cache_path("occupancy", cache_key(file_fingerprint(path), float(voxel_size)), ".npz")
+
+
+def _ref_path(name: str) -> str:
+    safe = "".join(ch if ch.isalnum() or ch in "-_." else "_" for ch in name)
+    return cache_path("occupancy", f"ref_{safe}", ".npz")
+
+
+def _load(store: str, voxel_size: float | None = None):
+    try:
+        with np.load(store) as data:
+            if voxel_size is not None and not np.isclose(float(data["voxel_size"]), voxel_size):
+                return None
+            return data["keys"], data["counts"], float(data["voxel_size"])
+    except (OSError, KeyError, ValueError) as e:
+        print(f"[warn] corrupt occupancy store '{store}': {e}", file=sys.stderr, flush=True)
+        return None
+
+
+def _save(store: str, keys: np.ndarray, counts: np.ndarray, voxel_size: float, source: str) -> None:
+    tmp = store + ".tmp.npz"
+    np.savez(tmp, keys=keys, counts=counts.astype(np.int32), voxel_size=voxel_size, source=source)
+    os.replace(tmp, store)
+
+
+def get_occupancy(path: str, voxel_size: float) -> tuple[np.ndarray, np.ndarray, bool]:
+    """Cached occupancy of a scan file (the live scan is never cached). Returns (keys, counts, cached)."""
+    if path == room_scanner.LIVE_PATH:
+        keys, counts = _voxelize(np.asarray(room_scanner.current_cloud().points), voxel_size)
+        return keys, counts, False
+    store = _store_path(path, voxel_size)
+    if os.path.exists(store):
+        hit = _load(store, voxel_size)
+        if hit is not None:
+            return hit[0], hit[1], True
+    keys, counts = compute_occupancy(path, voxel_size)
+    _save(store, keys, counts, voxel_size, os.path.abspath(path))
+    return keys, counts, False
+
+
+def get_reference(name: str) -> tuple[np.ndarray, np.ndarray, float]:
+    store = _ref_path(name)
+    hit = _load(store) if os.path.exists(store) else None
+    if hit is None:
+        known = sorted(os.path.basename(p)[4:-4] for p in glob.glob(os.path.join(OCC_DIR, "ref_*.npz")))
+        raise FileNotFoundError(f"no stored reference '{name}' (known: {', '.join(known) or 'none'})")
+    return hit
+
+
+def save_reference(name: str, path: str, voxel_size: float) -> str:
+    """Keep the occupancy of `path` under `name`, independent of the file."""
+    keys, counts, _ = get_occupancy(path, voxel_size)
+    store = _ref_path(name)
+    _save(store, keys, counts, voxel_size, path if path == room_scanner.LIVE_PATH else os.path.abspath(path))
+    return store
+
+
+# ─── Diff ─────────────────────────────────────────────────────────────────────
+
+# half of the 26 neighbour offsets; the other half is covered by symmetry
+_OFFSETS = np.array([(di, dj, dk) for di in (-1, 0, 1) for dj in (-1, 0, 1) for dk in (-1, 0, 1)
+                     if (di, dj, dk) > (0, 0, 0)], dtype=np.int64)
+
+
+def regions(keys: np.ndarray, voxel_size: float, min_voxels: int = 1, limit: int = 20) -> tuple[list[dict], int]:
+    """
+    26-connected groups of the (sorted) voxel `keys` with at least `min_voxels`
+    voxels: (the `limit` largest, total number of such groups).
+    """
+    n = len(keys)
+    if n == 0:
+        return [], 0
+    rows, cols = [], []
+    for off in _OFFSETS:
+        # offsets are added field-wise in the packed key; pack() keeps every field in
+        # [1, MASK - 1], so ±1 never crosses into the neighbouring field
+        neighbour = keys + ((off[0] << (2 * BITS)) + (off[1] << BITS) + off[2])
+        pos = np.searchsorted(keys, neighbour)
+        pos[pos == n] = 0
+        hit = keys[pos] == neighbour
+        rows.append(np.nonzero(hit)[0])
+        cols.append(pos[hit])
+    rows, cols = np.concatenate(rows), np.concatenate(cols)
+    graph = sparse.coo_matrix((np.ones(len(rows), dtype=np.int8), (rows, cols)), shape=(n, n))
+    n_comp, labels = csgraph.connected_components(graph, directed=False)
+
+    sizes = np.bincount(labels, minlength=n_comp)
+    kept = [c for c in np.argsort(-sizes, kind="stable") if sizes[c] >= min_voxels]
+    ijk = unpack(keys)
+    out = []
+    for c in kept[:limit]:
+        cells = ijk[labels == c]
+        lo, hi = cells.min(axis=0), cells.max(axis=0) + 1
+        out.append({
+            "voxels": int(sizes[c]),
+            "volume": float(sizes[c] * voxel_size ** 3),
+            "min": (lo * voxel_size).tolist(),
+            "max": (hi * voxel_size).tolist(),
+            "center": ((cells.mean(axis=0) + 0.5) * voxel_size).tolist()
+        })
+    return out, len(kept)
+
+
+def diff(current: np.ndarray, reference: np.ndarray) -> tuple[np.ndarray, np.ndarray, int]:
+    """(added keys, removed keys, unchanged count) of two sorted unique key arrays."""
+    added = np.setdiff1d(current, reference, assume_unique=True)
+    removed = np.setdiff1d(reference, current, assume_unique=True)
+    return added, removed, len(current) - len(added)
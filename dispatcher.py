@@ -0,0 +1,299 @@
+#!/usr/bin/env python3
+"""
+Multi-worker front for s.py
+───────────────────────────
+• Starts N s.py worker processes on consecutive ports.
+• Serves the same streamable-http MCP endpoint (/mcp/) and forwards each
+  request to a worker; tools/call requests are routed by consistent hashing
+  on the file they touch, so each cloud stays hot in one worker's cache;
+  scan_room and scan:// paths always go to the same worker.
+• Health-checks workers, drops dead ones from the hash ring (only their
+  share of paths moves) and restarts them.
+
+    python dispatcher.py --workers 4 --port 8000 --base-port 8101
+
+GET /dispatcher/stats reports workers, health and routed request counts; every
+forwarded response carries an X-PCT-Worker header naming the worker that served it.
+"""
+
+import os
+import sys
+import json
+import time
+import bisect
+import socket
+import asyncio
+import hashlib
+import argparse
+import itertools
+import subprocess
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+
+import httpx
+import uvicorn
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Route
+
+import pointcloud_tools as pct  # cheap: heavy modules load lazily, only _resolve_path is used
+
+# argument names that carry the file a tool works on, in priority order
+PATH_ARGS = ("path", "source", "path_pc", "mesh_path")
+FORWARD_HEADERS = ("content-type", "accept", "mcp-session-id", "mcp-protocol-version")
+
+
+# ─── Consistent hashing ───────────────────────────────────────────────────────
+
+def _hash(key: str) -> int:
+    return int.from_bytes(hashlib.md5(key.encode("utf-8")).digest()[:8], "big")
+
+
+class HashRing:
+    """Each node gets `vnodes` points on the ring; removing a node only moves the keys it owned."""
+
+    def __init__(self, vnodes: int = 64):
+        self.vnodes = vnodes
+        self._points: list[int] = []
+        self._owners: list[str] = []
+
+    def add(self, node: str) -> None:
+        for v in range(self.vnodes):
+            h = _hash(f"{node}#{v}")
+            i = bisect.bisect(self._points, h)
+            self._points.insert(i, h)
+            self._owners.insert(i, node)
+
+    def remove(self, node: str) -> None:
+        keep = [(p, o) for p, o in zip(self._points, self._owners) if o != node]
+        self._points = [p for p, _ in keep]
+        self._owners = [o for _, o in keep]
+
+    def nodes(self) -> set[str]:
+        return set(self._owners)
+
+    def get(self, key: str) -> str | None:
+        if not self._points:
+            return None
+        i = bisect.bisect(self._points, _hash(key)) % len(self._points)
+        return self._owners[i]
+
+
+# every request touching the live scan goes to one worker, which owns the session
+LIVE_KEY = "scan://"
+STATEFUL_TOOLS = {"scan_room"}
+RESOLVE_CACHE = int(os.environ.get("PCT_DISPATCH_RESOLVE_CACHE", "4096"))  # bare names remembered
+_resolved: OrderedDict = OrderedDict()  # bare name → canonical path, LRU
+
+
+def _canonical(value: str) -> str:
+    """Resolve a path argument exactly like the workers do, then make it canonical."""
+    if os.path.exists(value):
+        return os.path.realpath(value)  # no search needed
+    hit = _resolved.get(value)
+    if hit is not None and os.path.exists(hit):
+        _resolved.move_to_end(value)
+        return hit
+    try:
+        hit = os.path.realpath(pct._resolve_path(value))
+    except FileNotFoundError:
+        return os.path.basename(value).lower()  # the worker will report the error
+    _resolved[value] = hit
+    while len(_resolved) > RESOLVE_CACHE:
+        _resolved.popitem(last=False)
+    return hit
+
+
+def routing_key(tool: str | None, arguments: dict) -> str | None:
+    """
+    The routing key of a tool call: the canonical file it touches (so
+    "data/bunny.ply" and "bunny.ply" agree), LIVE_KEY for the live scan, or
+    None when it touches no file.
+    """
+    if tool in STATEFUL_TOOLS:
+        return LIVE_KEY
+    for name in PATH_ARGS:
+        value = arguments.get(name)
+        if isinstance(value, str) and value:
+            if value.startswith(LIVE_KEY):
+                return LIVE_KEY
+            return _canonical(value)
+    return None
+
+
+# ─── Workers ──────────────────────────────────────────────────────────────────
+
+class Worker:
+    def __init__(self, index: int, host: str, port: int):
+        self.name = f"worker-{index}"
+        self.host = host
+        self.port = port
+        self.url = f"http://{host}:{port}/mcp/"
+        self.proc: subprocess.Popen | None = None
+        self.healthy = False
+        self.routed = 0
+        self.failures = 0
+        self.restarts = 0
+
+    def start(self) -> None:
+        env = dict(os.environ, PCT_HOST=self.host, PCT_PORT=str(self.port))
+        self.proc = subprocess.Popen([sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "s.py")],
+                                     env=env)
+        self.healthy = False
+
+    def alive(self) -> bool:
+        if self.proc is None or self.proc.poll() is not None:
+            return False
+        with socket.socket() as s:
+            s.settimeout(0.5)
+            return s.connect_ex((self.host, self.port)) == 0
+
+    def stop(self) -> None:
+        if self.proc is not None and self.proc.poll() is None:
+            self.proc.terminate()
+            try:
+                self.proc.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                self.proc.kill()
+
+    def info(self) -> dict:
+        return {"name": self.name, "url": self.url, "healthy": self.healthy, "routed": self.routed,
+                "failures": self.failures, "restarts": self.restarts,
+                "pid": self.proc.pid if self.proc else None}
+
+
+class Dispatcher:
+    def __init__(self, n_workers: int, host: str, base_port: int, health_interval: float = 2.0):
+        self.workers = {w.name: w for w in (Worker(i, host, base_port + i) for i in range(n_workers))}
+        self.ring = HashRing()
+        self.health_interval = health_interval
+        self._rr = itertools.cycle(list(self.workers))
+        # newer FastMCP serves /mcp and redirects /mcp/ there (307 keeps method and body)
+        self.client = httpx.AsyncClient(timeout=None, follow_redirects=True)
+        self.started = time.time()
+        self.requests = 0
+
+    # -- lifecycle ------------------------------------------------------------
+
+    async def startup(self) -> None:
+        for w in self.workers.values():
+            w.start()
+        asyncio.get_running_loop().create_task(self._health_loop())
+
+    async def shutdown(self) -> None:
+        await self.client.aclose()
+        for w in self.workers.values():
+            w.stop()
+
+    def _mark(self, w: Worker, healthy: bool) -> None:
+        if healthy and not w.healthy:
+            self.ring.add(w.name)
+            print(f"[dispatcher] {w.name} up on {w.url}", file=sys.stderr, flush=True)
+        elif not healthy and w.healthy:
+            self.ring.remove(w.name)
+            print(f"[dispatcher] {w.name} down, rebalancing its paths", file=sys.stderr, flush=True)
+        w.healthy = healthy
+
+    async def _health_loop(self) -> None:
+        while True:
+            for w in self.workers.values():
+                ok = await asyncio.to_thread(w.alive)
+                self._mark(w, ok)
+                if not ok and w.proc is not None and w.proc.poll() is not None:
+                    w.restarts += 1
+                    print(f"[dispatcher] restarting {w.name} (exit code {w.proc.returncode})", file=sys.stderr, flush=True)
+                    w.start()
+            await asyncio.sleep(self.health_interval)
+
+    # -- routing --------------------------------------------------------------
+
+    @staticmethod
+    def request_key(payload) -> str | None:
+        if isinstance(payload, dict) and payload.get("method") == "tools/call":
+            params = payload.get("params") or {}
+            return routing_key(params.get("name"), params.get("arguments") or {})
+        return None
+
+    def pick(self, key: str | None) -> Worker | None:
+        if key is not None:
+            name = self.ring.get(key)
+            return self.workers[name] if name else None
+        healthy = [n for n in self.workers if self.workers[n].healthy]
+        if not healthy:
+            return None
+        for name in self._rr:
+            if self.workers[name].healthy:
+                return self.workers[name]
+
+    async def handle(self, request: Request) -> Response:
+        body = await request.body()
+        try:
+            payload = json.loads(body) if body else None
+        except json.JSONDecodeError:
+            payload = None
+        headers = {k: v for k, v in request.headers.items() if k.lower() in FORWARD_HEADERS}
+        self.requests += 1
+
+        # path resolution may walk the tree, keep it off the event loop
+        key = await asyncio.to_thread(self.request_key, payload)
+        for _ in range(2):  # one retry on another worker if the chosen one just died
+            worker = self.pick(key)
+            if worker is None:
+                return JSONResponse({"jsonrpc": "2.0", "id": (payload or {}).get("id") if isinstance(payload, dict) else None,
+                                     "error": {"code": -32000, "message": "no healthy workers"}}, status_code=503)
+            try:
+                resp = await self.client.request(request.method, worker.url, content=body, headers=headers)
+            except httpx.TransportError:
+                worker.failures += 1
+                self._mark(worker, False)
+                continue
+            worker.routed += 1
+            out_headers = {k: v for k, v in resp.headers.items() if k.lower() in FORWARD_HEADERS}
+            out_headers["x-pct-worker"] = worker.name
+            return Response(resp.content, status_code=resp.status_code, headers=out_headers)
+        return JSONResponse({"error": "workers unavailable"}, status_code=503)
+
+    async def stats(self, request: Request) -> Response:
+        return JSONResponse({
+            "uptime_seconds": time.time() - self.started,
+            "requests": self.requests,
+            "ring_nodes": sorted(self.ring.nodes()),
+            "workers": [w.info() for w in self.workers.values()]
+        })
+
+
+def build_app(dispatcher: Dispatcher) -> Starlette:
+    @asynccontextmanager
+    async def lifespan(app):
+        await dispatcher.startup()
+        try:
+            yield
+        finally:
+            await dispatcher.shutdown()
+
+    return Starlette(
+        routes=[
+            Route("/mcp", dispatcher.handle, methods=["GET", "POST", "DELETE"]),
+            Route("/mcp/", dispatcher.handle, methods=["GET", "POST", "DELETE"]),
+            Route("/dispatcher/stats", dispatcher.stats, methods=["GET"]),
+        ],
+        lifespan=lifespan,
+    )
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--workers", type=int, default=os.cpu_count() or 2)
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8000)
+    ap.add_argument("--base-port", type=int, default=8101)
+    ap.add_argument("--health-interval", type=float, default=2.0)
+    args = ap.parse_args()
+
+    dispatcher = Dispatcher(args.workers, "127.0.0.1", args.base_port, args.health_interval)
+    uvicorn.run(build_app(dispatcher), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+import os
+import sys
+import numpy as np
+
+from cache_store import cache_path, cache_key, file_fingerprint
+from tracing import span
+import room_scanner
+from lazy_import import lazy_import
+
+o3d = lazy_import("open3d")
+
+# FPFH descriptors are persisted per (file, voxel_size, radii) as one .npz holding
+# float32 arrays:
+#   points   (N, 3)   voxel-downsampled points
+#   normals  (N, 3)   normals estimated with radius_normal
+#   features (N, 33)  FPFH histograms (one row per point)
+
+
+def _store_path(path: str, voxel_size: float, radius_normal: float, radius_feature: float) -> str:
+    key = cache_key(file_fingerprint(path), float(voxel_size), float(radius_normal), float(radius_feature))
+    return cache_path("fpfh", key, ".npz")
+
+
+def load_features(path: str, voxel_size: float, radius_normal: float, radius_feature: float):
+    """Return (points, normals, features) from the store, or None if not cached yet."""
+    store = _store_path(path, voxel_size, radius_normal, radius_feature)
+    if not os.path.exists(store):
+        return None
+    try:
+        with np.load(store) as data:
+            return data["points"], data["normals"], data["features"]
+    except (OSError, KeyError, ValueError) as e:
+        print(f"[warn] corrupt feature store '{store}': {e}", file=sys.stderr, flush=True)
+        return None
+
+
+def save_features(path: str, voxel_size: float, radius_normal: float, radius_feature: float,
+                  points: np.ndarray, normals: np.ndarray, features: np.ndarray) -> str:
+    store = _store_path(path, voxel_size, radius_normal, radius_feature)
+    tmp = store + ".tmp.npz"
+    np.savez(tmp,
+             points=np.asarray(points, dtype=np.float32),
+             normals=np.asarray(normals, dtype=np.float32),
+             features=np.asarray(features, dtype=np.float32))
+    os.replace(tmp, store)  # atomic, so concurrent readers never see half a file
+    return store
+
+
+def compute_features(pc: "o3d.geometry.PointCloud", voxel_size: float, radius_normal: float, radius_feature: float):
+    """Downsample + normals + FPFH on an in-memory cloud. Returns (points, normals, features)."""
+    down = pc.voxel_down_sample(voxel_size)
+    down.estimate_normals(o3d.geometry.KDTreeSearchParamHybrid(radius=radius_normal, max_nn=30))
+    fpfh = o3d.pipelines.registration.compute_fpfh_feature(
+        down,
+        o3d.geometry.KDTreeSearchParamHybrid(radius=radius_feature, max_nn=100)
+    )
+    return np.asarray(down.points), np.asarray(down.normals), np.asarray(fpfh.data).T
+
+
+def get_features(path: str, voxel_size: float, radius_normal: float, radius_feature: float,
+                 pc: "o3d.geometry.PointCloud | None" = None):
+    """
+    Cached FPFH lookup. `path` must already be resolved; pass `pc` when the
+    caller already holds the cloud so a store miss does not read the file again.
+    Returns (points, normals, features, cached) where cached tells whether the store was hit.
+    """
+    if path == room_scanner.LIVE_PATH:
+        # the live scan changes every frame: compute, never store
+        points, normals, features = compute_features(room_scanner.current_cloud(), voxel_size,
+                                                     radius_normal, radius_feature)
+        return points.astype(np.float32), normals.astype(np.float32), features.astype(np.float32), False
+    hit = load_features(path, voxel_size, radius_normal, radius_feature)
+    if hit is not None:
+        print(f"[debug] fpfh store hit for '{path}'", file=sys.stderr, flush=True)
+        return (*hit, True)
+    if pc is None:
+        with span("load", bytes_read=os.path.getsize(path)) as attrs:
+            pc = o3d.io.read_point_cloud(path)
+            attrs["points"] = len(pc.points)
+    points, normals, features = compute_features(pc, voxel_size, radius_normal, radius_feature)
+    save_features(path, voxel_size, radius_normal, radius_feature, points, normals, features)
+    return points.astype(np.float32), normals.astype(np.float32), features.astype(np.float32), False
+
+
+def to_open3d(points: np.ndarray, normals: np.ndarray, features: np.ndarray):
+    """Rebuild the Open3D cloud + Feature objects the registration pipelines expect."""
+    pc = o3d.geometry.PointCloud()
+    pc.points = o3d.utility.Vector3dVector(points.astype(np.float64))
+    pc.normals = o3d.utility.Vector3dVector(normals.astype(np.float64))
+    feat = o3d.pipelines.registration.Feature()
+    feat.data = features.T.astype(np.float64)
+    return pc, feat
@@ -0,0 +1,137 @@
+import re
+
+# Deterministic fast path for the chat clients: clearly parametrized commands
+# ("move forward 2 meters", "count points in data/bunny.ply") are mapped
+# straight to a tool call without asking the LLM.
+#
+# A rule fires only if
+#   • exactly one rule matches the whole (normalized) input,
+#   • its tool exists in the server's tool schemas, and
+#   • every extracted argument is a property of that tool and coerces to its type.
+# Anything else returns None and the caller falls back to the LLM.
+
+NUM = r"(?:\d+(?:\.\d+)?|\.\d+)"
+PATH = r"(?P<path>[\w./\\~-]+\.(?:ply|pcd|xyz|obj))"
+DIR = r"(?P<path>[\w./\\~-]+)"
+
+# (pattern, candidate tool names — first one present on the server wins)
+ROBOT_RULES = [
+    (rf"(?:move|go|drive)\s+forwards?(?:\s+(?:by\s+)?(?P<distance>{NUM})\s*(?:m|meters?|metres?|units?)?)?", ["move_forward"]),
+    (rf"(?:move|go|drive)\s+backwards?(?:\s+(?:by\s+)?(?P<distance>{NUM})\s*(?:m|meters?|metres?|units?)?)?", ["move_backward"]),
+    (r"(?:move|step)\s+left(?:\s+(?:by\s+)?(?P<steps>\d+)\s*(?:steps?)?)?", ["move_left"]),
+    (r"(?:move|step)\s+right(?:\s+(?:by\s+)?(?P<steps>\d+)\s*(?:steps?)?)?", ["move_right"]),
+    (rf"turn\s+left(?:\s+(?:by\s+)?(?P<degrees>{NUM})\s*(?:deg|degrees?|°)?)?", ["turn_left"]),
+    (rf"turn\s+right(?:\s+(?:by\s+)?(?P<degrees>{NUM})\s*(?:deg|degrees?|°)?)?", ["turn_right"]),
+    (r"(?:check|get|show|what(?:'s| is))?\s*(?:the\s+)?(?:robot(?:'s)?\s+)?status", ["get_status"]),
+    (r"stop(?:\s+(?:the\s+)?robot)?", ["stop"]),
+    (r"reset(?:\s+(?:the\s+)?robot)?", ["reset_robot", "reset"]),
+    (rf"charge(?:\s+the)?\s+battery(?:\s+by\s+(?P<amount>{NUM})\s*%?)?", ["charge_battery"]),
+]
+
+POINTCLOUD_RULES = [
+    (rf"(?:count\s+(?:the\s+)?points|how\s+many\s+points(?:\s+are)?)\s+(?:in|of)\s+{PATH}", ["count_points"]),
+    (rf"(?:get\s+|show\s+|what(?:'s| is)\s+)?(?:the\s+)?bounding\s+box\s+(?:of|for)\s+{PATH}", ["get_bounding_box"]),
+    (rf"(?:find|list)\s+(?:all\s+)?(?:the\s+)?ply\s+files(?:\s+(?:in|under)\s+{DIR})?", ["find_ply_files"]),
+    (rf"list\s+(?:the\s+)?files\s+(?:in|under)\s+{DIR}", ["list_files"]),
+    (rf"(?:show|visuali[sz]e|display|open)\s+{PATH}", ["visualize_pointcloud"]),
+    (rf"(?:voxel\s+)?downsample\s+{PATH}(?:\s+(?:with|at|using))?\s+(?:voxel(?:\s+size)?\s+)?(?P<voxel_size>{NUM})", ["voxel_downsample"]),
+]
+
+# tools execute_sequence accepts (jetsonsrv.MOTIONS); anything else in a
+# multi-clause command sends it to the LLM
+SEQUENCE_TOOLS = {"move_forward", "move_backward", "move_left", "move_right", "turn_left", "turn_right", "reset"}
+
+# split "move forward 2 then turn left" into clauses for execute_sequence
+SEQUENCE_SPLIT = re.compile(r"\s*(?:,\s*)?(?:\band then\b|\bthen\b|\band\b|,|;)\s*")
+ADDRESS = re.compile(r"^\s*(?:hey\s+|ok\s+)?v\s*[,:]\s*", re.IGNORECASE)
+
+
+def normalize(text: str) -> str:
+    text = ADDRESS.sub("", text.strip())
+    text = re.sub(r"^(?:please\s+|can you\s+|could you\s+)", "", text, flags=re.IGNORECASE)
+    text = re.sub(r"(?:\s+please)?[\s.!?]*$", "", text, flags=re.IGNORECASE)
+    return re.sub(r"\s+", " ", text)
+
+
+def _types(prop: dict) -> set[str]:
+    if "type" in prop:
+        return set(prop["type"]) if isinstance(prop["type"], list) else {prop["type"]}
+    return {t for alt in prop.get("anyOf", []) for t in _types(alt)}
+
+
+def _coerce(value: str, prop: dict):
+    types = _types(prop)
+    if "integer" in types:
+        f = float(value)
+        if f.is_integer():
+            return int(f)
+        if "number" not in types:
+            raise ValueError(value)
+    if "number" in types:
+        return float(value)
+    if "string" in types or not types:
+        return value
+    raise ValueError(value)
+
+
+class IntentRouter:
+    def __init__(self, rules: list | None = None):
+        rules = rules if rules is not None else ROBOT_RULES + POINTCLOUD_RULES
+        self.rules = [(re.compile(rf"^{p}$", re.IGNORECASE), tools) for p, tools in rules]
+        self.schemas: dict[str, dict] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def set_tools(self, tools) -> None:
+        """Tool list from client.list_tools() (objects with .name/.inputSchema, or dicts)."""
+        self.schemas = {}
+        for t in tools:
+            name = t["name"] if isinstance(t, dict) else t.name
+            schema = t.get("inputSchema", {}) if isinstance(t, dict) else (t.inputSchema or {})
+            self.schemas[name] = schema
+
+    def _match_clause(self, clause: str) -> dict | None:
+        found = []
+        for regex, candidates in self.rules:
+            m = regex.match(clause)
+            if not m:
+                continue
+            tool = next((c for c in candidates if c in self.schemas), None)
+            if tool is None:
+                continue
+            props = self.schemas[tool].get("properties", {})
+            args = {}
+            try:
+                for key, value in m.groupdict().items():
+                    if value is None:
+                        continue
+                    if key not in props:
+                        raise ValueError(key)
+                    args[key] = _coerce(value, props[key])
+            except ValueError:
+                continue
+            found.append({"tool": tool, "args": args})
+        # ambiguous (several different readings) or nothing → let the LLM decide
+        if len({f["tool"] for f in found}) != 1:
+            return None
+        return found[0]
+
+    def route(self, text: str) -> dict | None:
+        """Tool call for `text`, or None to fall back to the LLM."""
+        clause = normalize(text)
+        call = self._match_clause(clause) if clause else None
+        if call is None and "execute_sequence" in self.schemas:
+            parts = [p for p in SEQUENCE_SPLIT.split(clause) if p]
+            if len(parts) > 1:
+                steps = [self._match_clause(p) for p in parts]
+                if all(steps) and all(step["tool"] in SEQUENCE_TOOLS for step in steps):
+                    call = {"tool": "execute_sequence", "args": {"commands": steps}}
+        if call is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return call
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "hit_rate": self.hits / total if total else 0.0}
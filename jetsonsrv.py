@@ -1,6 +1,9 @@
 #!/usr/bin/env python3
 
+import inspect
 import logging
+import threading
+from collections import deque
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -16,65 +19,184 @@ except ImportError as e:
 robot_state = {
     "x": 0,
     "y": 0,
+    "heading": 0,
     "connected": True
 }
 
+# Every mutation of robot_state goes through _commit() under _state_lock and bumps
+# state_version; the last changes are kept so clients can poll for deltas.
+_state_lock = threading.RLock()
+state_version = 0
+_changes: deque = deque(maxlen=256)  # (version, {key: new value})
+
 # Initialize FastMCP server
 mcp = FastMCP("Robot Server")
 
+
+def _commit(**changes) -> None:
+    global state_version
+    robot_state.update(changes)
+    state_version += 1
+    _changes.append((state_version, changes))
+
+
+def _position() -> str:
+    return f"({robot_state['x']}, {robot_state['y']})"
+
+# ─── Motion primitives (call with _state_lock held) ──────────────────────────
+
+def _move_forward(distance: float = 1.0) -> str:
+    _commit(y=robot_state["y"] + distance)
+    return f"Moved forward {distance} units. Position: {_position()}"
+
+def _move_backward(distance: float = 1.0) -> str:
+    _commit(y=robot_state["y"] - distance)
+    return f"Moved backward {distance} units. Position: {_position()}"
+
+def _move_left(steps: int = 1) -> str:
+    _commit(x=robot_state["x"] - steps)
+    return f"Moved left {steps} steps. Position: {_position()}"
+
+def _move_right(steps: int = 1) -> str:
+    _commit(x=robot_state["x"] + steps)
+    return f"Moved right {steps} steps. Position: {_position()}"
+
+def _turn_left(degrees: float = 90) -> str:
+    _commit(heading=(robot_state["heading"] + degrees) % 360)
+    return f"Turned left {degrees} degrees"
+
+def _turn_right(degrees: float = 90) -> str:
+    _commit(heading=(robot_state["heading"] - degrees) % 360)
+    return f"Turned right {degrees} degrees"
+
+def _reset() -> str:
+    _commit(x=0, y=0, heading=0)
+    return "Robot reset to position (0, 0)"
+
+MOTIONS = {
+    "move_forward": _move_forward,
+    "move_backward": _move_backward,
+    "move_left": _move_left,
+    "move_right": _move_right,
+    "turn_left": _turn_left,
+    "turn_right": _turn_right,
+    "reset": _reset,
+}
+
+# ─── Tools ────────────────────────────────────────────────────────────────────
+
 @mcp.tool()
 def move_forward(distance: float = 1.0) -> str:
     """Move robot forward by distance"""
-    global robot_state
-    robot_state["y"] += distance
-    return f"Moved forward {distance} units. Position: ({robot_state['x']}, {robot_state['y']})"
+    with _state_lock:
+        return _move_forward(distance)
 
 @mcp.tool()
 def move_backward(distance: float = 1.0) -> str:
     """Move robot backward by distance"""
-    global robot_state
-    robot_state["y"] -= distance
-    return f"Moved backward {distance} units. Position: ({robot_state['x']}, {robot_state['y']})"
+    with _state_lock:
+        return _move_backward(distance)
 
 @mcp.tool()
 def move_left(steps: int = 1) -> str:
     """Move robot left by steps"""
-    global robot_state
-    robot_state["x"] -= steps
-    return f"Moved left {steps} steps. Position: ({robot_state['x']}, {robot_state['y']})"
+    with _state_lock:
+        return _move_left(steps)
 
 @mcp.tool()
 def move_right(steps: int = 1) -> str:
     """Move robot right by steps"""
-    global robot_state
-    robot_state["x"] += steps
-    return f"Moved right {steps} steps. Position: ({robot_state['x']}, {robot_state['y']})"
+    with _state_lock:
+        return _move_right(steps)
 
 @mcp.tool()
 def turn_left(degrees: float = 90) -> str:
     """Turn robot left by degrees"""
-    global robot_state
-    return f"Turned left {degrees} degrees"
+    with _state_lock:
+        return _turn_left(degrees)
 
 @mcp.tool()
 def turn_right(degrees: float = 90) -> str:
     """Turn robot right by degrees"""
-    global robot_state
-    return f"Turned right {degrees} degrees"
+    with _state_lock:
+        return _turn_right(degrees)
 
 @mcp.tool()
 def get_status() -> str:
     """Get robot status"""
-    status = "connected" if robot_state["connected"] else "disconnected"
-    return f"Robot status: {status}, Position: ({robot_state['x']}, {robot_state['y']})"
+    with _state_lock:
+        status = "connected" if robot_state["connected"] else "disconnected"
+        return f"Robot status: {status}, Position: {_position()}"
 
 @mcp.tool()
 def reset() -> str:
     """Reset robot to origin"""
-    global robot_state
-    robot_state["x"] = 0
-    robot_state["y"] = 0
-    return "Robot reset to position (0, 0)"
+    with _state_lock:
+        return _reset()
+
+@mcp.tool()
+def execute_sequence(commands: list[dict]) -> dict:
+    """
+    Run several motion commands atomically in one call, e.g.
+    [{"tool": "move_forward", "args": {"distance": 2}}, {"tool": "turn_left", "args": {}}]
+    Either every command is applied or, if one fails, none is.
+    Returns the trajectory as [x, y, heading] after each command.
+    """
+    if not isinstance(commands, list):
+        raise ValueError(f"commands must be a list, got {type(commands).__name__}")
+    for i, cmd in enumerate(commands):
+        if not isinstance(cmd, dict):
+            raise ValueError(f"command {i}: expected an object with 'tool' and 'args', got {type(cmd).__name__}")
+        if cmd.get("tool") not in MOTIONS:
+            raise ValueError(f"command {i}: unknown motion '{cmd.get('tool')}' (available: {', '.join(MOTIONS)})")
+        args = cmd.get("args", {})
+        if not isinstance(args, dict):
+            raise ValueError(f"command {i}: args must be an object, got {type(args).__name__}")
+        try:
+            inspect.signature(MOTIONS[cmd["tool"]]).bind(**args)
+        except TypeError as e:
+            raise ValueError(f"command {i} ({cmd['tool']}): {e}") from None
+    global state_version
+    with _state_lock:
+        saved_state, saved_version, saved_changes = dict(robot_state), state_version, list(_changes)
+        trajectory = [[robot_state["x"], robot_state["y"], robot_state["heading"]]]
+        try:
+            for cmd in commands:
+                MOTIONS[cmd["tool"]](**cmd.get("args", {}))
+                trajectory.append([robot_state["x"], robot_state["y"], robot_state["heading"]])
+        except Exception:
+            robot_state.clear()
+            robot_state.update(saved_state)
+            state_version = saved_version
+            # the deque is usually full, so appends evicted old entries: restore it wholesale
+            _changes.clear()
+            _changes.extend(saved_changes)
+            raise
+        return {
+            "executed": len(commands),
+            "trajectory": trajectory,
+            "state": dict(robot_state),
+            "version": state_version
+        }
+
+@mcp.tool()
+def get_state(since_version: int | None = None) -> dict:
+    """
+    Versioned state snapshot. With since_version, returns only the keys that
+    changed after that version (or {"changed": false} if nothing did); falls
+    back to a full snapshot if that version is too old to diff against.
+    """
+    with _state_lock:
+        if since_version is not None:
+            if since_version == state_version:
+                return {"version": state_version, "changed": False}
+            if _changes and since_version >= _changes[0][0] - 1 and since_version < state_version:
+                delta = {}
+                for version, changes in _changes:
+                    if version > since_version:
+                        delta.update(changes)
+                return {"version": state_version, "changed": True, "delta": delta}
+        return {"version": state_version, "changed": True, "state": dict(robot_state)}
 
 if __name__ == "__main__":
     logger.info("Starting Robot MCP Server...")
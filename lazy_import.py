@@ -0,0 +1,83 @@
+import sys
+import time
+import socket
+import importlib
+import threading
+import types
+
+# Heavy dependencies (open3d, matplotlib.pyplot, scipy.spatial) are bound to
+# LazyModule proxies and only imported the first time an attribute is used, so
+# a server that only ever answers find_ply_files/list_files never pays for them.
+#
+#   o3d = lazy_import("open3d")      # cheap
+#   o3d.io.read_point_cloud(path)    # first use imports open3d
+#
+# IMPORT_TIMES records how long each real import took, for startup reports.
+
+IMPORT_TIMES: dict[str, float] = {}
+_lock = threading.RLock()
+
+
+class LazyModule(types.ModuleType):
+    def __init__(self, name: str):
+        super().__init__(name)
+        self.__dict__["_lazy_module"] = None
+
+    def _load(self):
+        module = self.__dict__["_lazy_module"]
+        if module is None:
+            with _lock:
+                module = self.__dict__["_lazy_module"]
+                if module is None:
+                    t0 = time.perf_counter()
+                    module = importlib.import_module(self.__name__)
+                    IMPORT_TIMES[self.__name__] = time.perf_counter() - t0
+                    print(f"[debug] lazy import of {self.__name__} took {IMPORT_TIMES[self.__name__]:.2f}s",
+                          file=sys.stderr, flush=True)
+                    self.__dict__["_lazy_module"] = module
+        return module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __dir__(self):
+        return dir(self._load())
+
+
+_proxies: dict[str, LazyModule] = {}
+
+
+def lazy_import(name: str) -> LazyModule:
+    """One shared proxy per module name, so every importer sees the same load state."""
+    with _lock:
+        if name not in _proxies:
+            _proxies[name] = LazyModule(name)
+        return _proxies[name]
+
+
+def is_loaded(module) -> bool:
+    return not isinstance(module, LazyModule) or module.__dict__["_lazy_module"] is not None
+
+
+def prewarm(modules: list, wait_for: tuple[str, int] | None = None, timeout: float = 60.0) -> threading.Thread:
+    """
+    Import `modules` (LazyModule proxies) in a background thread. With
+    `wait_for=(host, port)` it first waits until the server accepts
+    connections, so warming never delays the server coming up.
+    """
+    def run():
+        if wait_for is not None:
+            deadline = time.time() + timeout
+            while time.time() < deadline:
+                with socket.socket() as s:
+                    if s.connect_ex(wait_for) == 0:
+                        break
+                time.sleep(0.05)
+        for m in modules:
+            try:
+                m._load()
+            except Exception as e:
+                print(f"[warn] prewarm of {m.__name__} failed: {e}", file=sys.stderr, flush=True)
+    t = threading.Thread(target=run, name="prewarm", daemon=True)
+    t.start()
+    return t
@@ -10,6 +10,7 @@ Robot MCP Client demo
 • Gracefully handles tool errors without crashing.
 """
 
+import os
 import json
 import re
 import sys
@@ -20,6 +21,10 @@ from fastmcp.exceptions import ToolError
 from llama_cpp import Llama
 from colorama import init, Fore, Style   # pip install colorama
 
+from turn_profiler import TurnProfiler
+from result_compaction import fit_to_budget
+from intent_router import IntentRouter
+
 #!/usr/bin/env python3
 from colorama import init, Fore, Style
 
@@ -33,6 +38,10 @@ print(Fore.GREEN + "LLM: Ready to interact with users and control robots via MCP
 # ── Configuration ────────────────────────────────────────────────────────────
 MODEL_PATH   = "./models/Meta-Llama-3-8B-Instruct.Q4_0.gguf"
 RPC_ENDPOINT = "stdio+ssh://user@jetson-ip:python /path/to/simplemcp.py"  # Adjust this for your setup
+# Max prompt tokens a single tool result may add to the history
+TOOL_RESULT_BUDGET = int(os.environ.get("PCT_TOOL_BUDGET", "512"))
+# Max tokens of the reply recorded for a fast-path (no LLM) command
+FAST_REPLY_BUDGET = 64
 
 llm = Llama(
     model_path=MODEL_PATH,
@@ -56,12 +65,16 @@ Available robot tools:
   • stop() - Stop all robot movement
   • charge_battery(amount: float = 25) - Charge robot battery by amount (1-100)
   • reset_robot() - Reset robot to initial state
+  • execute_sequence(commands: list) - Run several motions in one call, e.g.
+      [{"tool": "move_forward", "args": {"distance": 2}}, {"tool": "turn_left", "args": {}}]
+  • get_state(since_version: int | None) - Versioned state; only changed keys if since_version is given
 
 Examples of when to call tools:
 - "move forward 2 meters" → {"tool": "move_forward", "args": {"distance": 2.0}}
 - "turn left" → {"tool": "turn_left", "args": {}}
 - "check robot status" → {"tool": "get_status", "args": {}}
 - "charge the battery" → {"tool": "charge_battery", "args": {}}
+- "go forward 2 then turn left" → {"tool": "execute_sequence", "args": {"commands": [{"tool": "move_forward", "args": {"distance": 2.0}}, {"tool": "turn_left", "args": {}}]}}
 
 When calling a tool, emit **exactly one** JSON object on its own line:
 {"tool": "tool_name", "args": {"arg": "value"}}
@@ -78,11 +91,17 @@ init(autoreset=True)
 def red(txt: str)   -> str: return f"{Fore.RED}{txt}{Style.RESET_ALL}"
 def green(txt: str) -> str: return f"{Fore.GREEN}{txt}{Style.RESET_ALL}"
 
-def ask_llm(prompt: str, stop=None, max_tokens=256) -> str:
+profiler = TurnProfiler(llm)
+router   = IntentRouter()
+
+def ask_llm(prompt: str, stop=None, max_tokens=256, stage: str = "llm") -> str:
     params = {"prompt": prompt, "temperature": 0.0, "max_tokens": max_tokens}
     if stop:
         params["stop"] = stop
-    return llm.create_completion(**params)["choices"][0]["text"].strip()
+    return profiler.complete(stage, **params).strip()
+
+def count_tokens(text: str) -> int:
+    return len(llm.tokenize(text.encode("utf-8"), add_bos=False))
 
 def extract_tool_call(text: str):
     decoder = json.JSONDecoder()
@@ -123,30 +142,40 @@ async def main():
     print(green("   • 'stop robot'\n"))
 
     async with client:
+        router.set_tools(await client.list_tools())
         while True:
             user = input(">>> ").strip()
             if not user:
                 continue
-                
+
+            profiler.start_turn(user)
             history += f"\nUser: {user}\nAssistant:"
 
             # 1) Pure greetings → direct LLM reply
             if GREETING_RE.match(user):
-                reply = ask_llm(history, stop=["\n"])
+                reply = ask_llm(history, stop=["\n"], stage="greeting")
                 print(green(reply))
                 history += " " + reply
+                profiler.end_turn(path="greeting")
                 continue
 
-            # 2) Ask LLM for draft (may emit JSON tool call)
-            draft = ask_llm(history)
-            call  = extract_tool_call(draft)
+            # 2) Unambiguous robot commands → tool call straight from the rules, no LLM
+            call = router.route(user)
+            fast = call is not None
+
+            # 2b) Otherwise ask LLM for draft (may emit JSON tool call)
+            if not fast:
+                draft = ask_llm(history, stage="draft")
+                with profiler.stage("extract"):
+                    call = extract_tool_call(draft)
 
             if call:
                 # Perform the robot tool call
                 try:
                     print(f"🔧 Calling tool: {call['tool']} with args: {call.get('args', {})}")
-                    raw    = await client.call_tool(call["tool"], call.get("args", {}))
-                    result = unwrap(raw)
+                    with profiler.stage("tool", tool=call["tool"]):
+                        raw    = await client.call_tool(call["tool"], call.get("args", {}))
+                        result = unwrap(raw)
                     
                     # Print robot response in red
                     if isinstance(result, str):
@@ -158,10 +187,12 @@ async def main():
                         
                     print(red(message))
 
-                    # 3) Feed result back to LLM for wrap-up
-                    history += f"\nTool result: {message}\nAssistant:"
-                    final = ask_llm(history, stop=["\n"])
-                    if final.strip():
+                    # 3) Feed result back to LLM for wrap-up (fast-path commands are answered by the tool message)
+                    history += f"\nTool result: {fit_to_budget(message, TOOL_RESULT_BUDGET, count_tokens)}\nAssistant:"
+                    # fast path: the result is already in the history, keep only a short echo of it
+                    final = (fit_to_budget(message, FAST_REPLY_BUDGET, count_tokens) if fast
+                             else ask_llm(history, stop=["\n"], stage="wrapup"))
+                    if final.strip() and not fast:
                         print(green(final))
                     history += " " + final
 
@@ -169,7 +200,7 @@ async def main():
                     error_msg = f"❌ Tool error: {str(e)}"
                     print(red(error_msg))
                     history += f"\nTool error: {error_msg}\nAssistant:"
-                    final = ask_llm(history, stop=["\n"])
+                    final = ask_llm(history, stop=["\n"], stage="wrapup")
                     if final.strip():
                         print(green(final))
                     history += " " + final
@@ -178,7 +209,7 @@ async def main():
                     error_msg = f"❌ Unexpected error: {str(e)}"
                     print(red(error_msg))
                     history += f"\nUnexpected error: {error_msg}\nAssistant:"
-                    final = ask_llm(history, stop=["\n"])
+                    final = ask_llm(history, stop=["\n"], stage="wrapup")
                     if final.strip():
                         print(green(final))
                     history += " " + final
@@ -188,6 +219,9 @@ async def main():
                 print(green(draft))
                 history += " " + draft
 
+            profiler.end_turn(path="fast" if fast else "tool" if call else "reply",
+                              fast_path_hit_rate=router.stats()["hit_rate"])
+
 if __name__ == "__main__":
     try:
         asyncio.run(main())
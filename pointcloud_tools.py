@@ -1,11 +1,101 @@
 import os
 import sys
+import json
+import time
+import inspect
+import threading
 import numpy as np
-import open3d as o3d
-import matplotlib.pyplot as plt
-from scipy.spatial import Delaunay
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+import array_channel
+import feature_store
+import room_scanner
+from tracing import span
+from result_compaction import compact_listing
+from cache_store import cache_path, cache_key, file_fingerprint, CACHE_DIR
+import scan_index
+import scan_metadata
+import sampling
+import change_detection
+from lazy_import import lazy_import
+
+# heavy dependencies load on first use (see lazy_import.py)
+o3d = lazy_import("open3d")
+plt = lazy_import("matplotlib.pyplot")
+spatial = lazy_import("scipy.spatial")
+
+# Set PCT_HEADLESS=1 to skip every viewer window (benchmarks, servers without a display).
+HEADLESS = os.environ.get("PCT_HEADLESS", "") not in ("", "0")
+
+def _show(geometries: list) -> None:
+    if HEADLESS:
+        return
+    with span("render", geometries=len(geometries)):
+        o3d.visualization.draw_geometries(geometries)
+
+# Recently loaded clouds, keyed by file fingerprint (path+size+mtime) and bounded
+# by total point count. PCT_CLOUD_CACHE_POINTS=0 disables the cache.
+CLOUD_CACHE_POINTS = int(os.environ.get("PCT_CLOUD_CACHE_POINTS", "20000000"))
+_cloud_cache: OrderedDict = OrderedDict()
+_cloud_cache_lock = threading.Lock()
+_cloud_cache_stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+def _read_point_cloud(path: str) -> "o3d.geometry.PointCloud":
+    if path == room_scanner.LIVE_PATH:
+        # the cloud fused so far by scan_room, no PLY round-trip
+        with span("load", live=True) as attrs:
+            pc = room_scanner.current_cloud()
+            attrs["points"] = len(pc.points)
+        return pc
+    key = file_fingerprint(path)
+    with _cloud_cache_lock:
+        cached = _cloud_cache.get(key)
+        if cached is not None:
+            _cloud_cache.move_to_end(key)
+            _cloud_cache_stats["hits"] += 1
+        else:
+            _cloud_cache_stats["misses"] += 1
+    if cached is not None:
+        # tools paint/estimate normals in place, so hand out a copy
+        with span("load", cached=True, points=len(cached.points)):
+            return o3d.geometry.PointCloud(cached)
+    # the precompute daemon's binary sidecar is much faster to read than the PLY
+    pc = scan_metadata.load_sidecar(path)
+    if pc is None:
+        with span("load", bytes_read=os.path.getsize(path)) as attrs:
+            pc = o3d.io.read_point_cloud(path)
+            attrs["points"] = len(pc.points)
+    if CLOUD_CACHE_POINTS > 0 and len(pc.points) <= CLOUD_CACHE_POINTS:
+        with _cloud_cache_lock:
+            # an older version of the same file can never hit again
+            stale = [k for k in _cloud_cache if k.rsplit("|", 2)[0] == key.rsplit("|", 2)[0]]
+            for k in stale:
+                del _cloud_cache[k]
+            _cloud_cache[key] = o3d.geometry.PointCloud(pc)
+            while sum(len(c.points) for c in _cloud_cache.values()) > CLOUD_CACHE_POINTS:
+                _cloud_cache.popitem(last=False)
+                _cloud_cache_stats["evictions"] += 1
+    return pc
+
+def cloud_cache_stats() -> dict:
+    with _cloud_cache_lock:
+        total = _cloud_cache_stats["hits"] + _cloud_cache_stats["misses"]
+        return {**_cloud_cache_stats, "entries": len(_cloud_cache),
+                "points": sum(len(c.points) for c in _cloud_cache.values()),
+                "hit_rate": _cloud_cache_stats["hits"] / total if total else 0.0}
+
+def _vec3(arr) -> "o3d.utility.Vector3dVector":
+    with span("convert", points=len(arr)):
+        return o3d.utility.Vector3dVector(arr)
 
 def _ensure_exists(path: str) -> str:
+    if path == room_scanner.LIVE_PATH:
+        return path
+    with span("resolve"):
+        return _resolve_path(path)
+
+def _resolve_path(path: str) -> str:
     """
     1) Try the given path.
     2) Otherwise, search the entire tree for any file whose name contains the basename.
@@ -30,38 +120,135 @@ def _ensure_exists(path: str) -> str:
     print(f"[error] no matches found for '{path}' → raising FileNotFoundError", file=sys.stderr, flush=True)
     raise FileNotFoundError(f"File not found: {path}")
 
+# ─── Approximate mode ─────────────────────────────────────────────────────────────
+
+DEFAULT_SAMPLE_SIZE = int(os.environ.get("PCT_SAMPLE_SIZE", "100000"))
+Z95 = 1.96
+
+def _sample(path: str, sample_size: int | None) -> tuple[np.ndarray, int]:
+    """(uniform sample of points, total points). Falls back to a full load for non-PLY inputs."""
+    n = sample_size or DEFAULT_SAMPLE_SIZE
+    if path != room_scanner.LIVE_PATH:
+        got = sampling.sample_points(path, n)
+        if got is not None:
+            return got
+    pts = np.asarray(_read_point_cloud(path).points)
+    if len(pts) <= n:
+        return pts, len(pts)
+    idx = np.random.default_rng(0).choice(len(pts), n, replace=False)
+    return pts[idx], len(pts)
+
+def _approx_info(n: int, total: int, **estimates) -> dict:
+    """Sample bookkeeping returned with every approximate answer."""
+    exact = n >= total
+    return {"sample_size": n, "total_points": total, "fraction": n / total if total else 1.0,
+            "exact": exact, "next_sample_size": None if exact else min(total, 4 * n), **estimates}
+
 # ─── Core tools ───────────────────────────────────────────────────────────────────
 
-def scan_room() -> dict:
+def scan_room(action: str = "start",
+              source: str = "scan_frames",
+              voxel_size: float = 0.02,
+              max_voxels: int = 2_000_000,
+              output_path: str | None = None) -> dict:
     """
-    Placeholder for a “scan the room” tool.
-    TODO: replace this stub with your real room-scanning logic.
+    Live room scan. action:
+      "start"  ingest frames from `source` (a folder being filled with frames,
+               or tcp://host:port) and fuse them into a voxel map in the background
+      "status" frames, voxels and ingest rate of the running scan
+      "stop"   stop ingesting (the fused cloud stays available)
+      "save"   write the fused cloud to `output_path`
+    While a scan exists, other tools can use the path "scan://live" to work on
+    the fused cloud directly.
     """
-    return {
-        "status": "scan_room executed",
-        "message": "I can’t scan the room just yet, but I’ll be able to soon!"
-    }
+    action = action.lower()
+    if action == "start":
+        status = room_scanner.start(source, voxel_size, max_voxels)
+        return {"status": "scan_room started", "message": f"fusing frames from {source}", **status}
+    if action == "status":
+        return {"status": "scan_room status", **room_scanner.status()}
+    if action == "stop":
+        return {"status": "scan_room stopped", **room_scanner.stop()}
+    if action == "save":
+        if not output_path:
+            raise ValueError("scan_room(action='save') needs an output_path")
+        pc = room_scanner.current_cloud()
+        o3d.io.write_point_cloud(output_path, pc)
+        return {"status": "scan_room saved", "output_path": output_path, "points": len(pc.points)}
+    raise ValueError(f"unknown scan_room action '{action}' (start, status, stop, save)")
 
 def count_points(path: str) -> int:
     path = _ensure_exists(path)
-    pc = o3d.io.read_point_cloud(path)
+    record = scan_metadata.load_metadata(path)
+    if record is not None:
+        return record["points"]
+    pc = _read_point_cloud(path)
     return len(pc.points)
 
-def get_bounding_box(path: str) -> dict:
+def get_bounding_box(path: str, approximate: bool = False, sample_size: int | None = None) -> dict:
+    """
+    Axis-aligned bounds. With `approximate`, computed on a uniform sample of
+    `sample_size` points; call again with the returned next_sample_size to refine.
+    """
     path = _ensure_exists(path)
-    pc = o3d.io.read_point_cloud(path)
+    record = scan_metadata.load_metadata(path)
+    if record is not None and "aabb" in record:
+        return dict(record["aabb"])
+    if approximate:
+        pts, total = _sample(path, sample_size)
+        part = np.partition(pts, (1, len(pts) - 2), axis=0) if len(pts) > 3 else np.sort(pts, axis=0)
+        return {
+            "min": part[0].tolist(),
+            "max": part[-1].tolist(),
+            "approximate": _approx_info(
+                len(pts), total,
+                # gap between the two outermost sampled values on each side: the
+                # true bound usually lies within a few of these beyond the sampled one
+                margin={"min": (part[1] - part[0]).tolist(), "max": (part[-1] - part[-2]).tolist()},
+                # rule of three: with 95% confidence at most this share of points lies
+                # beyond each sampled face
+                outside_fraction_95=min(1.0, 3.0 / len(pts)) if len(pts) < total else 0.0)
+        }
+    pc = _read_point_cloud(path)
     bbox = pc.get_axis_aligned_bounding_box()
     return {"min": bbox.min_bound.tolist(), "max": bbox.max_bound.tolist()}
 
-def find_ply_files(path: str = ".") -> list[str]:
+def describe_scan(path: str) -> dict:
+    """
+    Precomputed facts about a scan: point count, AABB, OBB, height histogram,
+    preview size. Served from the precompute daemon's record when present.
+    """
+    path = _ensure_exists(path)
+    if path == room_scanner.LIVE_PATH:
+        record = scan_metadata.compute_metadata(path, _read_point_cloud(path), store=False)
+    else:
+        record = scan_metadata.get_metadata(path)
+    return {k: v for k, v in record.items() if k not in ("fingerprint", "sidecar")}
+
+def find_ply_files(path: str = ".",
+                   limit: int | None = None,
+                   cursor: str | None = None,
+                   summarize: bool = False) -> list[str] | dict:
+    """
+    All .ply files under `path`. With `limit`/`cursor` returns one page
+    ({"items", "total", "next_cursor"}); with `summarize` returns counts per
+    directory instead of the full list.
+    """
+    cache = os.path.abspath(CACHE_DIR)
     matches = []
-    for root, _, files in os.walk(path):
+    for root, dirs, files in os.walk(path):
+        # meshes and sidecars under .pct_cache are our outputs, not scans
+        dirs[:] = [d for d in dirs if os.path.abspath(os.path.join(root, d)) != cache]
         for name in files:
             if name.lower().endswith(".ply"):
                 matches.append(os.path.join(root, name))
-    return matches
+    return compact_listing(matches, limit, cursor, summarize)
 
-def list_files(path: str = ".", extension: str | None = None) -> list[str]:
+def list_files(path: str = ".",
+               extension: str | None = None,
+               limit: int | None = None,
+               cursor: str | None = None,
+               summarize: bool = False) -> list[str] | dict:
     if not os.path.isdir(path):
         path = _ensure_exists(path)
     entries = []
@@ -71,40 +258,40 @@ def list_files(path: str = ".", extension: str | None = None) -> list[str]:
                 entries.append(os.path.join(path, name))
         else:
             entries.append(os.path.join(path, name))
-    return entries
+    return compact_listing(entries, limit, cursor, summarize)
 
 def visualize_pointcloud(path: str) -> dict:
     path = _ensure_exists(path)
-    pc = o3d.io.read_point_cloud(path)
-    o3d.visualization.draw_geometries([pc])
+    pc = _read_point_cloud(path)
+    _show([pc])
     return {"status": "point cloud displayed"}
 
 # ─── Nice visuals ────────────────────────────────────────────────────────────────
 
 def color_by_height(path: str, colormap: str = "viridis") -> dict:
     path = _ensure_exists(path)
-    pc = o3d.io.read_point_cloud(path)
+    pc = _read_point_cloud(path)
     pts = np.asarray(pc.points)
     z = pts[:, 2]
     norm = (z - z.min()) / (z.max() - z.min())
     cmap = plt.get_cmap(colormap)
-    pc.colors = o3d.utility.Vector3dVector(cmap(norm)[:, :3])
-    o3d.visualization.draw_geometries([pc])
+    pc.colors = _vec3(cmap(norm)[:, :3])
+    _show([pc])
     return {"status": "colored by height", "colormap": colormap}
 
 def show_oriented_bounding_box(path: str) -> dict:
     path = _ensure_exists(path)
-    pc = o3d.io.read_point_cloud(path)
+    pc = _read_point_cloud(path)
     obb = pc.get_oriented_bounding_box()
     obb.color = (1, 0, 0)
-    o3d.visualization.draw_geometries([pc, obb])
+    _show([pc, obb])
     return {"status": "oriented bounding box displayed"}
 
 def visualize_voxel_grid(path: str, voxel_size: float = 0.05) -> dict:
     path = _ensure_exists(path)
-    pc = o3d.io.read_point_cloud(path)
+    pc = _read_point_cloud(path)
     vg = o3d.geometry.VoxelGrid.create_from_point_cloud(pc, voxel_size=voxel_size)
-    o3d.visualization.draw_geometries([vg])
+    _show([vg])
     return {"status": "voxel grid displayed", "voxel_size": voxel_size}
 
 def segment_plane_colormap(
@@ -112,10 +299,11 @@ def segment_plane_colormap(
     distance_threshold: float = 0.01,
     ransac_n: int = 3,
     num_iterations: int = 1000,
-    colormap: str = "plasma"
+    colormap: str = "plasma",
+    return_distances: bool = False
 ) -> dict:
     path = _ensure_exists(path)
-    pc = o3d.io.read_point_cloud(path)
+    pc = _read_point_cloud(path)
     model, inliers = pc.segment_plane(distance_threshold, ransac_n, num_iterations)
     inlier_cloud  = pc.select_by_index(inliers)             # points on the plane
     outlier_cloud = pc.select_by_index(inliers, invert=True)  # everything else
@@ -126,27 +314,84 @@ def segment_plane_colormap(
     dist = np.abs((pts @ np.array([a, b, c]) + d)) / np.linalg.norm([a, b, c])
     norm = (dist - dist.min()) / (dist.max() - dist.min())
     cmap = plt.get_cmap(colormap)
-    pc.colors = o3d.utility.Vector3dVector(cmap(norm)[:, :3])
-    o3d.visualization.draw_geometries([pc])
-    o3d.visualization.draw_geometries([inlier_cloud])
-    o3d.visualization.draw_geometries([outlier_cloud])
-    return {"status": "plane segmented & heatmapped", "plane_model": model}
+    pc.colors = _vec3(cmap(norm)[:, :3])
+    _show([pc])
+    _show([inlier_cloud])
+    _show([outlier_cloud])
+    result = {"status": "plane segmented & heatmapped", "plane_model": model}
+    if return_distances:
+        result["distances"] = array_channel.publish(dist.astype(np.float32), "plane_distances")
+    return result
 
-def cluster_dbscan(path: str, eps: float = 0.02, min_points: int = 10) -> dict:
+def _dbscan_on_sample(pts: np.ndarray, total: int, eps: float, min_points: int):
+    """
+    DBSCAN on a sample with the density thresholds scaled to the sampling rate:
+    a neighbourhood holds `fraction` times fewer sampled points, so min_points
+    shrinks with it; below 3 the radius grows instead (surface scans: ~eps²).
+    """
+    fraction = len(pts) / total
+    scaled = min_points * fraction
+    if scaled >= 3:
+        eps_s, min_s = eps, int(round(scaled))
+    else:
+        eps_s, min_s = eps * np.sqrt(3 / max(scaled, 1e-9)), 3
+    pc = o3d.geometry.PointCloud(_vec3(pts))
+    labels = np.array(pc.cluster_dbscan(eps=eps_s, min_points=min_s))
+    return labels, eps_s, min_s
+
+def _cluster_dbscan_approx(path: str, eps: float, min_points: int, sample_size: int | None) -> dict:
+    pts, total = _sample(path, sample_size)
+    labels, eps_s, min_s = _dbscan_on_sample(pts, total, eps, min_points)
+    count = int(labels.max() + 1)
+    # stability check: the same estimate from half the sample
+    half_labels, _, _ = _dbscan_on_sample(pts[:len(pts) // 2], total, eps, min_points)
+    half_count = int(half_labels.max() + 1)
+    sizes = np.bincount(labels[labels >= 0]) * (total / len(pts)) if count else np.zeros(0)
+    colors = plt.get_cmap("tab20")(labels / (count - 1 if count > 1 else 1))
+    colors[labels < 0] = (0, 0, 0, 1)
+    preview = o3d.geometry.PointCloud(_vec3(pts))
+    preview.colors = _vec3(colors[:, :3])
+    _show([preview])
+    return {
+        "status": "DBSCAN clustering on a sample displayed",
+        "clusters": count,
+        "estimated_cluster_points": sorted((int(v) for v in sizes), reverse=True)[:20],
+        "noise_fraction": float(np.mean(labels < 0)),
+        "approximate": _approx_info(
+            len(pts), total,
+            sample_eps=float(eps_s), sample_min_points=min_s,
+            cluster_count_range=[min(count, half_count), max(count, half_count)],
+            # clusters smaller than this are unlikely to be seen in the sample
+            min_detectable_points=int(np.ceil(min_s * total / len(pts))))
+    }
+
+def cluster_dbscan(path: str, eps: float = 0.02, min_points: int = 10, return_labels: bool = False,
+                   approximate: bool = False, sample_size: int | None = None) -> dict:
+    """
+    DBSCAN clusters. With `approximate`, runs on a uniform sample with
+    density-scaled parameters and reports the cluster-count spread.
+    """
     path = _ensure_exists(path)
-    pc = o3d.io.read_point_cloud(path)
+    if approximate:
+        if return_labels:
+            raise ValueError("return_labels needs approximate=False (labels cover every point)")
+        return _cluster_dbscan_approx(path, eps, min_points, sample_size)
+    pc = _read_point_cloud(path)
     # eps - radius, min_point - minimum number of point to form core
     labels = np.array(pc.cluster_dbscan(eps=eps, min_points=min_points))
     max_label = labels.max()
     colors = plt.get_cmap("tab20")(labels / (max_label if max_label > 0 else 1))
     colors[labels < 0] = (0, 0, 0, 1)
-    pc.colors = o3d.utility.Vector3dVector(colors[:, :3])
-    o3d.visualization.draw_geometries([pc])
-    return {"status": "DBSCAN clustering displayed", "clusters": int(max_label + 1)}
+    pc.colors = _vec3(colors[:, :3])
+    _show([pc])
+    result = {"status": "DBSCAN clustering displayed", "clusters": int(max_label + 1)}
+    if return_labels:
+        result["labels"] = array_channel.publish(labels.astype(np.int32), "dbscan_labels")
+    return result
 
 def detect_iss_keypoints(path: str, salient_radius: float = 0.005, non_max_radius: float = 0.005) -> dict:
     path = _ensure_exists(path)
-    pc = o3d.io.read_point_cloud(path)
+    pc = _read_point_cloud(path)
     #Intrinsic Shape Signature (more in lectures) looks how anisotropic (difference) the neightbor within a salient radius by checking the eigenvalues of the covariance matrix of those neighbors
     keypts = o3d.geometry.keypoint.compute_iss_keypoints(
         pc, salient_radius=salient_radius, non_max_radius=non_max_radius
@@ -158,7 +403,7 @@ def detect_iss_keypoints(path: str, salient_radius: float = 0.005, non_max_radiu
         s.paint_uniform_color((1, 0, 0))
         spheres.append(s)
     pc.paint_uniform_color((0.5, 0.7, 1.0))
-    o3d.visualization.draw_geometries([pc, *spheres])
+    _show([pc, *spheres])
     return {"status": "ISS keypoints detected", "num_keypoints": len(keypts.points)}
 
 #Not functional yet working on this:
@@ -167,11 +412,10 @@ def show_mesh_with_texture(mesh_path: str, texture_path: str) -> dict:
     texture_path = _ensure_exists(texture_path)
     mesh = o3d.io.read_triangle_mesh(mesh_path)
     mesh.textures = [o3d.io.read_image(texture_path)]
-    o3d.visualization.draw_geometries([mesh])
+    _show([mesh])
     return {"status": "textured mesh displayed"}
 
 import time
-import open3d as o3d
 import os
 
 
@@ -182,9 +426,12 @@ def animate_view(path: str, axis: str = "x", duration_sec: float = 10.0) -> dict
     path = _ensure_exists(path)
     if path.lower().endswith((".ply", ".obj")):
         geom = o3d.io.read_triangle_mesh(path) if path.lower().endswith((".obj",)) \
-               else o3d.io.read_point_cloud(path)
+               else _read_point_cloud(path)
     else:
-        geom = o3d.io.read_point_cloud(path)
+        geom = _read_point_cloud(path)
+
+    if HEADLESS:
+        return {"status": f"headless: skipped rotating {os.path.basename(path)}"}
 
     vis = o3d.visualization.Visualizer()
     vis.create_window()
@@ -209,26 +456,65 @@ def animate_view(path: str, axis: str = "x", duration_sec: float = 10.0) -> dict
 def show_hybrid(path_pc: str, path_mesh: str) -> dict:
     path_pc = _ensure_exists(path_pc)
     path_mesh = _ensure_exists(path_mesh)
-    pc = o3d.io.read_point_cloud(path_pc)
+    pc = _read_point_cloud(path_pc)
     mesh = o3d.io.read_triangle_mesh(path_mesh)
     mesh.compute_vertex_normals()
-    o3d.visualization.draw_geometries([pc, mesh])
+    _show([pc, mesh])
     return {"status": "hybrid scene displayed"}
 
 # ─── Reconstruction & Segmentation ────────────────────────────────────────────────
 
+def _segment_plane_approx(path: str, distance_threshold: float, ransac_n: int,
+                          num_iterations: int, sample_size: int | None) -> dict:
+    pts, total = _sample(path, sample_size)
+    pc = o3d.geometry.PointCloud(_vec3(pts))
+    model, inliers = pc.segment_plane(distance_threshold, ransac_n, num_iterations)
+    n = len(pts)
+    p = len(inliers) / n
+    stderr = np.sqrt(p * (1 - p) / n)
+    # normal uncertainty from the spread of the sampled inliers: residual
+    # thickness over the smaller in-plane extent, shrinking with √inliers
+    on_plane = pts[inliers]
+    sv = np.linalg.svd(on_plane - on_plane.mean(axis=0), compute_uv=False) if len(on_plane) >= 3 else None
+    normal_stderr = (float(np.degrees(np.arctan2(sv[2], sv[1] * np.sqrt(len(on_plane)))))
+                     if sv is not None and sv[1] > 0 else None)
+    inlier_cloud = pc.select_by_index(inliers)
+    outlier_cloud = pc.select_by_index(inliers, invert=True)
+    inlier_cloud.paint_uniform_color((0, 1, 0))
+    outlier_cloud.paint_uniform_color((1, 0, 0))
+    _show([inlier_cloud, outlier_cloud])
+    return {
+        "status": "plane segmented on a sample (inliers green, outliers red)",
+        "plane_model": model,
+        "inliers": int(round(p * total)),
+        "outliers": int(round((1 - p) * total)),
+        "approximate": _approx_info(
+            n, total,
+            inlier_fraction=p,
+            inlier_fraction_ci95=[max(0.0, p - Z95 * stderr), min(1.0, p + Z95 * stderr)],
+            normal_stderr_degrees=normal_stderr)
+    }
+
 def segment_plane(path: str,
                   distance_threshold: float = 0.01,
                   ransac_n: int = 3,
-                  num_iterations: int = 1000) -> dict:
+                  num_iterations: int = 1000,
+                  approximate: bool = False,
+                  sample_size: int | None = None) -> dict:
+    """
+    Dominant plane by RANSAC. With `approximate`, fits on a uniform sample and
+    extrapolates the inlier count with a 95% interval.
+    """
     path = _ensure_exists(path)
-    pc = o3d.io.read_point_cloud(path)
+    if approximate:
+        return _segment_plane_approx(path, distance_threshold, ransac_n, num_iterations, sample_size)
+    pc = _read_point_cloud(path)
     model, inliers = pc.segment_plane(distance_threshold, ransac_n, num_iterations)
     inlier_cloud = pc.select_by_index(inliers)
     outlier_cloud = pc.select_by_index(inliers, invert=True)
     inlier_cloud.paint_uniform_color((0, 1, 0))
     outlier_cloud.paint_uniform_color((1, 0, 0))
-    o3d.visualization.draw_geometries([inlier_cloud, outlier_cloud])
+    _show([inlier_cloud, outlier_cloud])
     return {
         "status": "plane segmented (inliers green, outliers red)",
         "plane_model": model,
@@ -240,7 +526,7 @@ def slice_cloud(path: str,
                 axis: str = "z",
                 num_slices: int = 5) -> dict:
     path = _ensure_exists(path)
-    pc = o3d.io.read_point_cloud(path)
+    pc = _read_point_cloud(path)
     pts = np.asarray(pc.points)
     idx = {"x": 0, "y": 1, "z": 2}.get(axis.lower(), 2)
     vals = pts[:, idx]
@@ -251,80 +537,671 @@ def slice_cloud(path: str,
     for i in range(num_slices):
         mask = (vals >= thresholds[i]) & (vals < thresholds[i + 1])
         colors[mask] = cmap(i / num_slices)[:3]
-    pc.colors = o3d.utility.Vector3dVector(colors)
-    o3d.visualization.draw_geometries([pc])
+    pc.colors = _vec3(colors)
+    _show([pc])
     return {"status": f"cloud sliced into {num_slices} along {axis}-axis", "num_slices": num_slices}
 
-def poisson_mesh_reconstruction(path: str, depth: int = 9) -> dict:
-    path = _ensure_exists(path)
-    pc = o3d.io.read_point_cloud(path)
-    pc.estimate_normals(o3d.geometry.KDTreeSearchParamHybrid(radius=1.0, max_nn=30))
-    mesh, _ = o3d.geometry.TriangleMesh.create_from_point_cloud_poisson(pc, depth=depth)
+def _auto_poisson_depth(pc: "o3d.geometry.PointCloud", voxel_size: float | None = None) -> int:
+    """
+    Octree depth whose leaf size roughly matches the point spacing:
+    spacing ~ extent / sqrt(n) for a surface scan (or the voxel size if
+    larger), depth = log2(extent / spacing), clamped to 6..12.
+    """
+    n = max(len(pc.points), 1)
+    extent = float(pc.get_axis_aligned_bounding_box().get_extent().max()) or 1.0
+    spacing = max(extent / np.sqrt(n), voxel_size or 0.0)
+    return int(np.clip(np.ceil(np.log2(extent / spacing)), 6, 12))
+
+def _poisson_reconstruct(pc: "o3d.geometry.PointCloud", depth: int, density_quantile: float):
+    mesh, densities = o3d.geometry.TriangleMesh.create_from_point_cloud_poisson(pc, depth=depth)
+    if density_quantile > 0:
+        # low density = vertex extrapolated far from any input point (the "bubble" around the scan)
+        densities = np.asarray(densities)
+        mesh.remove_vertices_by_mask(densities < np.quantile(densities, density_quantile))
     mesh.compute_vertex_normals()
-    o3d.visualization.draw_geometries([mesh])
-    return {"status": "poisson mesh reconstructed", "vertices": len(mesh.vertices), "triangles": len(mesh.triangles), "depth": depth}
+    return mesh
+
+def _poisson_pipeline(path: str,
+                      depths: list[int | None],
+                      voxel_size: float | None,
+                      density_quantile: float) -> list[tuple]:
+    """
+    Shared Poisson pipeline: mesh cache lookup → load → optional voxel downsample
+    → normals → reconstruction (one shared load for all depths) → density trim → cache.
+    Meshes are cached under .pct_cache/mesh keyed by file fingerprint + parameters.
+    Returns [(mesh, depth_used, cached), ...] in the order of `depths`.
+    """
+    live = path == room_scanner.LIVE_PATH  # the live scan changes every frame: never cached
+    fingerprint = None if live else file_fingerprint(path)
+    keys = [None if live else cache_key(fingerprint, "poisson", d, voxel_size, density_quantile) for d in depths]
+    results: list = [None] * len(depths)
+    for i, key in enumerate(keys):
+        if key is None:
+            continue
+        cached = cache_path("mesh", key, ".ply")
+        meta = cache_path("mesh", key, ".json")
+        if os.path.exists(cached) and os.path.exists(meta):
+            with open(meta) as f:
+                used = json.load(f)["depth"]
+            results[i] = (o3d.io.read_triangle_mesh(cached), used, True)
+    todo = [i for i, r in enumerate(results) if r is None]
+    if not todo:
+        return results
+
+    pc = _read_point_cloud(path)
+    if voxel_size:
+        pc = pc.voxel_down_sample(voxel_size)
+    pc.estimate_normals(o3d.geometry.KDTreeSearchParamHybrid(radius=1.0, max_nn=30))
+    used_depths = [depths[i] if depths[i] is not None else _auto_poisson_depth(pc, voxel_size) for i in todo]
+    # one depth at a time: Open3D's Poisson already spreads each solve over all cores
+    meshes = [_poisson_reconstruct(pc, d, density_quantile) for d in used_depths]
+    for i, mesh, used in zip(todo, meshes, used_depths):
+        if keys[i] is not None:
+            o3d.io.write_triangle_mesh(cache_path("mesh", keys[i], ".ply"), mesh)
+            with open(cache_path("mesh", keys[i], ".json"), "w") as f:
+                json.dump({"source": fingerprint, "depth": used}, f)
+        results[i] = (mesh, used, False)
+    return results
+
+def poisson_mesh_reconstruction(path: str,
+                                depth: int | None = None,
+                                voxel_size: float | None = None,
+                                density_quantile: float = 0.01,
+                                display: bool = True) -> dict:
+    """
+    Poisson surface reconstruction. `depth=None` picks the octree depth from
+    the point count and extent; `voxel_size` downsamples first; vertices in the
+    lowest `density_quantile` of Poisson densities are trimmed. Results are
+    cached on disk, so repeating a request on the same scan is instant.
+    """
+    path = _ensure_exists(path)
+    [(mesh, used_depth, cached)] = _poisson_pipeline(path, [depth], voxel_size, density_quantile)
+    if display:
+        _show([mesh])
+    return {"status": "poisson mesh reconstructed", "vertices": len(mesh.vertices), "triangles": len(mesh.triangles),
+            "depth": used_depth, "cached": cached}
 
-#not functional. 
 def mesh_poisson_compare(path: str,
                          depth1: int = 8,
-                         depth2: int = 12) -> dict:
+                         depth2: int = 12,
+                         voxel_size: float | None = None,
+                         density_quantile: float = 0.01,
+                         display: bool = True) -> dict:
     path = _ensure_exists(path)
-    pc = o3d.io.read_point_cloud(path)
-    pc.estimate_normals(o3d.geometry.KDTreeSearchParamHybrid(radius=1.0, max_nn=30))
-    m1, _ = o3d.geometry.TriangleMesh.create_from_point_cloud_poisson(pc, depth=depth1)
-    m2, _ = o3d.geometry.TriangleMesh.create_from_point_cloud_poisson(pc, depth=depth2)
+    (m1, d1, c1), (m2, d2, c2) = _poisson_pipeline(path, [depth1, depth2], voxel_size, density_quantile)
     m1.paint_uniform_color((1, 0, 0))
     m2.paint_uniform_color((0, 0, 1))
-    o3d.visualization.draw_geometries([m1, m2])
-    return {"status": "poisson compare displayed (red=depth1, blue=depth2)", "depths": [depth1, depth2], "counts": [len(m1.triangles), len(m2.triangles)]}
+    if display:
+        _show([m1, m2])
+    return {"status": "poisson compare displayed (red=depth1, blue=depth2)", "depths": [d1, d2],
+            "counts": [len(m1.triangles), len(m2.triangles)], "cached": [c1, c2]}
+
+_spacing_cache: dict[str, dict] = {}
+
+def _estimate_spacing(path: str, pc: "o3d.geometry.PointCloud", key_extra=None, sample: int = 2000) -> dict:
+    """
+    Nearest-neighbour distance distribution of the cloud, from a random sample
+    of `sample` points. Computed once per (file fingerprint, key_extra) and kept
+    both in memory and under .pct_cache/spacing.
+    """
+    live = path == room_scanner.LIVE_PATH
+    key = None if live else cache_key(file_fingerprint(path), "spacing", key_extra, sample)
+    if key in _spacing_cache:
+        return _spacing_cache[key]
+    store = None if live else cache_path("spacing", key, ".json")
+    if store is not None and os.path.exists(store):
+        with open(store) as f:
+            _spacing_cache[key] = json.load(f)
+        return _spacing_cache[key]
+    pts = np.asarray(pc.points)
+    rng = np.random.default_rng(0)
+    idx = rng.choice(len(pts), min(sample, len(pts)), replace=False)
+    d, _ = spatial.cKDTree(pts).query(pts[idx], k=2, workers=-1)
+    nn = d[:, 1]
+    stats = {"median": float(np.median(nn)), "mean": float(nn.mean()),
+             "p10": float(np.percentile(nn, 10)), "p90": float(np.percentile(nn, 90))}
+    if store is not None:
+        with open(store, "w") as f:
+            json.dump(stats, f)
+        _spacing_cache[key] = stats
+    return stats
+
+def _cached_normals(path: str, pc: "o3d.geometry.PointCloud", radius: float, key_extra=None) -> None:
+    """Estimate normals once per (file, key_extra, radius) and reuse them from .pct_cache/normals."""
+    if pc.has_normals():
+        return
+    if path == room_scanner.LIVE_PATH:
+        pc.estimate_normals(o3d.geometry.KDTreeSearchParamHybrid(radius=radius, max_nn=30))
+        return
+    store = cache_path("normals", cache_key(file_fingerprint(path), "normals", key_extra, radius), ".npy")
+    if os.path.exists(store):
+        normals = np.load(store)
+        if len(normals) == len(pc.points):
+            pc.normals = _vec3(normals.astype(np.float64))
+            return
+    pc.estimate_normals(o3d.geometry.KDTreeSearchParamHybrid(radius=radius, max_nn=30))
+    np.save(store, np.asarray(pc.normals, dtype=np.float32))
+
+# Clouds above this many points are ball-pivoted chunk by chunk in worker
+# processes; PCT_BALL_PIVOT_CHUNK=0 always meshes in one piece.
+BALL_PIVOT_CHUNK = int(os.environ.get("PCT_BALL_PIVOT_CHUNK", "500000"))
+
+def _ball_pivot_tile(job):
+    """
+    Worker for chunked ball pivoting: mesh one chunk (core + padding) and keep
+    only triangles whose centroid falls inside the chunk's core.
+    """
+    pts, nrm, radii, core_min, core_max = job
+    chunk = o3d.geometry.PointCloud()
+    chunk.points = _vec3(pts)
+    chunk.normals = _vec3(nrm)
+    mesh = o3d.geometry.TriangleMesh.create_from_point_cloud_ball_pivoting(chunk, o3d.utility.DoubleVector(radii))
+    tris = np.asarray(mesh.triangles)
+    if not len(tris):
+        return np.empty((0, 3), dtype=np.int64)
+    centroids = pts[tris].mean(axis=1)[:, :2]
+    keep = np.all((centroids >= core_min) & (centroids < core_max), axis=1)
+    return tris[keep]
+
+def _ball_pivot_chunked(pc: "o3d.geometry.PointCloud", radii: list[float],
+                        chunk_points: int, workers: int | None) -> np.ndarray:
+    """
+    Ball pivoting on an XY grid of chunks (each padded by 2x the largest radius),
+    keeping a triangle only in the chunk that owns its centroid. Chunks run in
+    worker processes, like tiled Delaunay. Returns triangles indexed into `pc`.
+    """
+    pts = np.asarray(pc.points)
+    nrm = np.asarray(pc.normals)
+    lo, hi = pts[:, :2].min(axis=0), pts[:, :2].max(axis=0)
+    n_side = max(1, int(np.ceil(np.sqrt(len(pts) / chunk_points))))
+    size = (hi - lo) / n_side + 1e-12
+    pad = 2.0 * max(radii)
 
-def ball_pivot_mesh(path: str, radii: list[float] = [0.005, 0.01, 0.02]) -> dict:
+    jobs, index_maps = [], []
+    for ix, iy, idx in _grid_members(pts[:, :2], lo, size, (n_side, n_side), pad):
+        if len(idx) < 3:
+            continue
+        core_min = lo + np.array([ix, iy]) * size
+        core_max = np.where([ix == n_side - 1, iy == n_side - 1], np.inf, core_min + size)
+        jobs.append((pts[idx], nrm[idx], radii, core_min, core_max))
+        index_maps.append(idx)
+    print(f"[debug] chunked ball pivoting: {len(jobs)} chunks, pad {pad:.4g}", file=sys.stderr, flush=True)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        parts = [idx[tris] for idx, tris in zip(index_maps, pool.map(_ball_pivot_tile, jobs))]
+    return np.concatenate(parts) if parts else np.empty((0, 3), dtype=np.int64)
+
+def ball_pivot_mesh(path: str,
+                    radii: list[float] | None = None,
+                    voxel_size: float | None = None,
+                    chunk_points: int | None = None,
+                    workers: int | None = None,
+                    display: bool = True) -> dict:
     """
     Ball-pivoting mesh reconstruction (watertight).
+    Without `radii`, the radii are derived from the sampled nearest-neighbour
+    spacing (1.5x, 3x and 6x the median). `voxel_size` downsamples first;
+    clouds larger than `chunk_points` (default BALL_PIVOT_CHUNK, 0 = never)
+    are meshed chunk by chunk in `workers` processes.
     """
     path = _ensure_exists(path)
-    pc = o3d.io.read_point_cloud(path)
-    pc.estimate_normals(o3d.geometry.KDTreeSearchParamHybrid(radius=0.05, max_nn=30))
-    mesh = o3d.geometry.TriangleMesh.create_from_point_cloud_ball_pivoting(
-        pc, o3d.utility.DoubleVector(radii)
-    )
+    pc = _read_point_cloud(path)
+    if voxel_size:
+        pc = pc.voxel_down_sample(voxel_size)
+    spacing = _estimate_spacing(path, pc, voxel_size)
+    if not radii:
+        radii = [spacing["median"] * f for f in (1.5, 3.0, 6.0)]
+    _cached_normals(path, pc, radius=3.0 * max(radii), key_extra=voxel_size)
+    if chunk_points is None:
+        chunk_points = BALL_PIVOT_CHUNK
+    if chunk_points and len(pc.points) > chunk_points:
+        tris = _ball_pivot_chunked(pc, radii, chunk_points, workers)
+        mesh = o3d.geometry.TriangleMesh(
+            vertices=_vec3(np.asarray(pc.points)),
+            triangles=o3d.utility.Vector3iVector(tris)
+        )
+        mesh.remove_unreferenced_vertices()
+    else:
+        mesh = o3d.geometry.TriangleMesh.create_from_point_cloud_ball_pivoting(
+            pc, o3d.utility.DoubleVector(radii)
+        )
     mesh.compute_vertex_normals()
-    o3d.visualization.draw_geometries([mesh])
-    return {"status": "ball-pivot mesh displayed", "radii": radii}
+    if display:
+        _show([mesh])
+    return {"status": "ball-pivot mesh displayed" if display else "ball-pivot mesh built",
+            "radii": radii, "spacing": spacing, "triangles": len(mesh.triangles)}
 
-def delaunay_mesh(path: str) -> dict:
+def _grid_members(xy: np.ndarray, lo: np.ndarray, size, shape: tuple[int, int], pad: float):
+    """
+    Yield (ix, iy, indices) for every cell of an XY grid (origin `lo`, cell
+    `size`, `shape` cells per axis): the points inside the cell grown by `pad`,
+    the last row/column open-ended. Points are binned once and each cell only
+    tests the points of the cells its padding reaches, so the cost stays
+    O(N log N) instead of one pass over the whole cloud per cell.
+    """
+    nx, ny = shape
+    size = np.broadcast_to(np.asarray(size, dtype=np.float64), (2,))
+    cell = np.clip(np.floor((xy - lo) / size).astype(np.int64), 0, [nx - 1, ny - 1])
+    flat = cell[:, 0] * ny + cell[:, 1]
+    order = np.argsort(flat, kind="stable")
+    starts = np.searchsorted(flat[order], np.arange(nx * ny + 1))
+    rx, ry = np.ceil(pad / size).astype(np.int64)
+    for ix in range(nx):
+        for iy in range(ny):
+            y0, y1 = max(iy - ry, 0), min(iy + ry, ny - 1)
+            cand = np.concatenate([order[starts[x * ny + y0]:starts[x * ny + y1 + 1]]
+                                   for x in range(max(ix - rx, 0), min(ix + rx, nx - 1) + 1)])
+            core_min = lo + np.array([ix, iy]) * size
+            upper = np.where([ix == nx - 1, iy == ny - 1], np.inf, core_min + size + pad)
+            sub = xy[cand]
+            inside = np.all((sub >= core_min - pad) & (sub < upper), axis=1)
+            yield ix, iy, np.sort(cand[inside])
+
+def _triangulate_tile(job):
+    """
+    Worker for tiled Delaunay: triangulate one tile (core + overlap margin) and
+    keep only triangles whose centroid falls inside the tile's core, so each
+    triangle is owned by exactly one tile when the tiles are stitched back.
+    """
+    pts2d, core_min, core_max = job
+    if len(pts2d) < 3:
+        return np.empty((0, 3), dtype=np.int64)
+    try:
+        simplices = spatial.Delaunay(pts2d).simplices
+    except Exception:  # degenerate tile (collinear points etc.)
+        return np.empty((0, 3), dtype=np.int64)
+    centroids = pts2d[simplices].mean(axis=1)
+    keep = np.all((centroids >= core_min) & (centroids < core_max), axis=1)
+    return simplices[keep]
+
+def _tiled_delaunay(pts2d: np.ndarray, tile_size: float, overlap: float, workers: int | None) -> np.ndarray:
+    lo = pts2d.min(axis=0)
+    nx, ny = np.floor((pts2d.max(axis=0) - lo) / tile_size).astype(np.int64) + 1
+    jobs, index_maps = [], []
+    for ix, iy, idx in _grid_members(pts2d, lo, tile_size, (nx, ny), overlap):
+        if len(idx) < 3:
+            continue
+        core_min = lo + np.array([ix, iy]) * tile_size
+        # the last row/column of tiles owns the upper boundary too
+        core_max = np.where([ix == nx - 1, iy == ny - 1], np.inf, core_min + tile_size)
+        jobs.append((pts2d[idx], core_min, core_max))
+        index_maps.append(idx)
+    print(f"[debug] tiled delaunay: {len(jobs)} tiles of {tile_size:.4g} (+{overlap:.4g} overlap)", file=sys.stderr, flush=True)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        parts = [idx[simp] for idx, simp in zip(index_maps, pool.map(_triangulate_tile, jobs))]
+    return np.concatenate(parts) if parts else np.empty((0, 3), dtype=np.int64)
+
+def delaunay_mesh(path: str,
+                  tiled: bool = False,
+                  tile_size: float | None = None,
+                  overlap: float | None = None,
+                  voxel_size: float | None = None,
+                  workers: int | None = None,
+                  output_path: str | None = None,
+                  display: bool = True) -> dict:
     """
     Project to XY, do 2D Delaunay, and build a mesh.
+    With `tiled=True` the XY plane is cut into a grid of tiles that are
+    triangulated in parallel worker processes and stitched back together;
+    `voxel_size` pre-decimates the cloud. The mesh is written to `output_path`
+    (default: .pct_cache/delaunay/<input>_<hash>_delaunay.ply, out of the way
+    of find_ply_files and the scan index).
     """
     path = _ensure_exists(path)
-    pc = o3d.io.read_point_cloud(path)
+    pc = _read_point_cloud(path)
+    if voxel_size:
+        pc = pc.voxel_down_sample(voxel_size)
     pts = np.asarray(pc.points)
     pts2d = pts[:, :2]
-    tri = Delaunay(pts2d)
+    if tiled:
+        if tile_size is None:
+            # aim for ~200k points per tile
+            extent = float((pts2d.max(axis=0) - pts2d.min(axis=0)).max()) or 1.0
+            tile_size = extent / max(1, int(np.ceil(np.sqrt(len(pts2d) / 200_000))))
+        if overlap is None:
+            overlap = 0.1 * tile_size
+        simplices = _tiled_delaunay(pts2d, tile_size, overlap, workers)
+    else:
+        simplices = spatial.Delaunay(pts2d).simplices
     mesh = o3d.geometry.TriangleMesh(
-        vertices=o3d.utility.Vector3dVector(pts),
-        triangles=o3d.utility.Vector3iVector(tri.simplices)
+        vertices=_vec3(pts),
+        triangles=o3d.utility.Vector3iVector(simplices)
     )
     mesh.compute_vertex_normals()
-    o3d.visualization.draw_geometries([mesh])
-    return {"status": "delaunay mesh displayed", "triangles": len(tri.simplices)}
+    if output_path is None:
+        if path == room_scanner.LIVE_PATH:
+            name = "live_scan_delaunay"
+        else:
+            stem = os.path.splitext(os.path.basename(path))[0]
+            name = f"{stem}_{cache_key(os.path.abspath(path))[:8]}_delaunay"
+        output_path = cache_path("delaunay", name, ".ply")
+    o3d.io.write_triangle_mesh(output_path, mesh)
+    if display:
+        _show([mesh])
+    return {
+        "status": "delaunay mesh written" + (" and displayed" if display else ""),
+        "triangles": len(simplices),
+        "vertices": len(pts),
+        "tiled": tiled,
+        "output_path": output_path
+    }
 
 def compute_fpfh(path: str,
                  voxel_size: float = 0.05,
                  radius_normal: float = 0.1,
-                 radius_feature: float = 0.25) -> dict:
+                 radius_feature: float = 0.25,
+                 return_features: bool = False) -> dict:
     #Fast Point Feature Histogram feature dimention tell how many histogram bins
     #num point how many point survived the voxel downsample
+    #features are persisted per (file, voxel_size, radii) so registration can reuse them
     path = _ensure_exists(path)
-    pc = o3d.io.read_point_cloud(path)
+    points, _, features, cached = feature_store.get_features(path, voxel_size, radius_normal, radius_feature)
+    result = {
+        "status": "fpfh computed",
+        "feature_dimension": features.shape[1],
+        "num_points": features.shape[0],
+        "cached": cached
+    }
+    if return_features:
+        result["points"] = array_channel.publish(points, "fpfh_points")
+        result["features"] = array_channel.publish(features, "fpfh_features")
+    return result
+
+def _match_features(src_feat: np.ndarray, tgt_feat: np.ndarray,
+                    mutual_filter: bool = True, workers: int = -1) -> np.ndarray:
+    """
+    Nearest neighbour search in FPFH space (both directions run on `workers` threads).
+    Returns an (K, 2) int32 array of (source_idx, target_idx) correspondences.
+    """
+    _, s2t = spatial.cKDTree(tgt_feat).query(src_feat, k=1, workers=workers)
+    corres = np.stack([np.arange(len(src_feat)), s2t], axis=1)
+    if mutual_filter:
+        _, t2s = spatial.cKDTree(src_feat).query(tgt_feat, k=1, workers=workers)
+        corres = corres[t2s[s2t] == corres[:, 0]]
+    return corres.astype(np.int32)
+
+def register_clouds(source: str,
+                    target: str,
+                    voxel_size: float = 0.05,
+                    radius_normal: float = 0.1,
+                    radius_feature: float = 0.25,
+                    method: str = "ransac",
+                    mutual_filter: bool = True,
+                    workers: int = -1,
+                    icp_refine: bool = True) -> dict:
+    """
+    Global registration of `source` onto `target` over cached FPFH features
+    (method "ransac" or "fgr"), optionally refined with point-to-plane ICP.
+    """
+    source = _ensure_exists(source)
+    target = _ensure_exists(target)
+    reg = o3d.pipelines.registration
+    src_pts, src_nrm, src_feat, src_cached = feature_store.get_features(source, voxel_size, radius_normal, radius_feature)
+    tgt_pts, tgt_nrm, tgt_feat, tgt_cached = feature_store.get_features(target, voxel_size, radius_normal, radius_feature)
+    src_down, _ = feature_store.to_open3d(src_pts, src_nrm, src_feat)
+    tgt_down, _ = feature_store.to_open3d(tgt_pts, tgt_nrm, tgt_feat)
+
+    corres = _match_features(src_feat, tgt_feat, mutual_filter, workers)
+    if len(corres) < 3:
+        raise ValueError(f"only {len(corres)} feature correspondences between '{source}' and '{target}'")
+    corres_o3d = o3d.utility.Vector2iVector(corres)
+    max_dist = voxel_size * 1.5
+
+    if method.lower() == "fgr":
+        result = reg.registration_fgr_based_on_correspondence(
+            src_down, tgt_down, corres_o3d,
+            reg.FastGlobalRegistrationOption(maximum_correspondence_distance=voxel_size * 0.5)
+        )
+    elif method.lower() == "ransac":
+        result = reg.registration_ransac_based_on_correspondence(
+            src_down, tgt_down, corres_o3d, max_dist,
+            reg.TransformationEstimationPointToPoint(False), 3,
+            [reg.CorrespondenceCheckerBasedOnEdgeLength(0.9),
+             reg.CorrespondenceCheckerBasedOnDistance(max_dist)],
+            reg.RANSACConvergenceCriteria(100000, 0.999)
+        )
+    else:
+        raise ValueError(f"unknown registration method '{method}' (use 'ransac' or 'fgr')")
+
+    if icp_refine:
+        result = reg.registration_icp(
+            src_down, tgt_down, voxel_size * 0.4, result.transformation,
+            reg.TransformationEstimationPointToPlane()
+        )
+
+    return {
+        "status": f"registered with {method.lower()}" + (" + icp" if icp_refine else ""),
+        "transformation": np.asarray(result.transformation).tolist(),
+        "fitness": float(result.fitness),
+        "inlier_rmse": float(result.inlier_rmse),
+        "correspondences": int(len(corres)),
+        "features_cached": [src_cached, tgt_cached]
+    }
+
+# ─── Pipelines ───────────────────────────────────────────────────────────────────
+# In-memory steps for run_pipeline: each takes the current cloud plus the step's
+# args and returns (next_cloud, result_dict). Nothing is displayed or re-read.
+
+def _step_voxel_downsample(pc, voxel_size: float = 0.05):
     down = pc.voxel_down_sample(voxel_size)
-    down.estimate_normals(o3d.geometry.KDTreeSearchParamHybrid(radius=radius_normal, max_nn=30))
-    fpfh = o3d.pipelines.registration.compute_fpfh_feature(
-        down,
-        o3d.geometry.KDTreeSearchParamHybrid(radius=radius_feature, max_nn=100)
-    )
-    data = np.asarray(fpfh.data)
-    return {"status": "fpfh computed", "feature_dimension": data.shape[0], "num_points": data.shape[1]}
+    return down, {"voxel_size": voxel_size, "before": len(pc.points), "after": len(down.points)}
+
+def _step_remove_outliers(pc, nb_neighbors: int = 20, std_ratio: float = 2.0):
+    kept, idx = pc.remove_statistical_outlier(nb_neighbors=nb_neighbors, std_ratio=std_ratio)
+    return kept, {"removed": len(pc.points) - len(idx), "remaining": len(idx)}
+
+SEGMENT_KEEP = ("outliers", "inliers", "all")
+
+def _step_segment_plane(pc, distance_threshold: float = 0.01, ransac_n: int = 3,
+                        num_iterations: int = 1000, keep: str = "outliers"):
+    """keep="outliers" drops the plane (e.g. the floor), "inliers" keeps only the plane, "all" keeps both."""
+    if keep not in SEGMENT_KEEP:
+        raise ValueError(f"keep must be one of {', '.join(SEGMENT_KEEP)}, got '{keep}'")
+    model, inliers = pc.segment_plane(distance_threshold, ransac_n, num_iterations)
+    result = {"plane_model": [float(v) for v in model], "inliers": len(inliers),
+              "outliers": len(pc.points) - len(inliers), "keep": keep}
+    if keep == "outliers":
+        return pc.select_by_index(inliers, invert=True), result
+    if keep == "inliers":
+        return pc.select_by_index(inliers), result
+    return pc, result
+
+def _step_cluster_dbscan(pc, eps: float = 0.02, min_points: int = 10, return_labels: bool = False):
+    labels = np.array(pc.cluster_dbscan(eps=eps, min_points=min_points))
+    sizes = np.bincount(labels[labels >= 0]) if (labels >= 0).any() else np.array([], dtype=int)
+    result = {"clusters": int(len(sizes)), "noise": int((labels < 0).sum()),
+              "largest": sorted(sizes.tolist(), reverse=True)[:10]}
+    if return_labels:
+        result["labels"] = array_channel.publish(labels.astype(np.int32), "dbscan_labels")
+    return pc, result
+
+def _step_compute_fpfh(pc, voxel_size: float = 0.05, radius_normal: float = 0.1,
+                       radius_feature: float = 0.25, return_features: bool = False):
+    points, _, features = feature_store.compute_features(pc, voxel_size, radius_normal, radius_feature)
+    result = {"feature_dimension": features.shape[1], "num_points": features.shape[0]}
+    if return_features:
+        result["points"] = array_channel.publish(points.astype(np.float32), "fpfh_points")
+        result["features"] = array_channel.publish(features.astype(np.float32), "fpfh_features")
+    return pc, result
+
+def _step_estimate_normals(pc, radius: float = 0.1, max_nn: int = 30):
+    pc.estimate_normals(o3d.geometry.KDTreeSearchParamHybrid(radius=radius, max_nn=max_nn))
+    return pc, {"radius": radius, "max_nn": max_nn}
+
+def _step_get_bounding_box(pc):
+    bbox = pc.get_axis_aligned_bounding_box()
+    return pc, {"min": bbox.min_bound.tolist(), "max": bbox.max_bound.tolist()}
+
+def _step_count_points(pc):
+    return pc, {"points": len(pc.points)}
+
+PIPELINE_STEPS = {
+    "voxel_downsample": _step_voxel_downsample,
+    "remove_outliers": _step_remove_outliers,
+    "segment_plane": _step_segment_plane,
+    "cluster_dbscan": _step_cluster_dbscan,
+    "compute_fpfh": _step_compute_fpfh,
+    "estimate_normals": _step_estimate_normals,
+    "get_bounding_box": _step_get_bounding_box,
+    "count_points": _step_count_points,
+}
+
+# argument values checked before anything is loaded, beyond the op's signature
+STEP_CHOICES = {("segment_plane", "keep"): SEGMENT_KEEP}
+
+def _check_step(i: int, step) -> None:
+    """Raise ValueError for an unknown op or args its function would not accept."""
+    if not isinstance(step, dict) or step.get("op") not in PIPELINE_STEPS:
+        op = step.get("op") if isinstance(step, dict) else step
+        raise ValueError(f"step {i}: unknown op '{op}' (available: {', '.join(PIPELINE_STEPS)})")
+    op, args = step["op"], step.get("args", {})
+    if not isinstance(args, dict):
+        raise ValueError(f"step {i} ({op}): args must be an object, got {type(args).__name__}")
+    try:
+        inspect.signature(PIPELINE_STEPS[op]).bind(None, **args)
+    except TypeError as e:
+        raise ValueError(f"step {i} ({op}): {e}") from None
+    for (choice_op, name), allowed in STEP_CHOICES.items():
+        if op == choice_op and name in args and args[name] not in allowed:
+            raise ValueError(f"step {i} ({op}): {name} must be one of {', '.join(allowed)}, got '{args[name]}'")
+
+def run_pipeline(path: str, steps: list[dict], output_path: str | None = None) -> dict:
+    """
+    Load `path` once and apply `steps` in order, e.g.
+      [{"op": "voxel_downsample", "args": {"voxel_size": 0.02}},
+       {"op": "segment_plane", "args": {"keep": "outliers"}},
+       {"op": "cluster_dbscan", "args": {"eps": 0.05}}]
+    Returns each step's result and timing; `output_path` saves the final cloud.
+    """
+    for i, step in enumerate(steps):
+        _check_step(i, step)
+    path = _ensure_exists(path)
+    t0 = time.perf_counter()
+    pc = _read_point_cloud(path)
+    load_seconds = time.perf_counter() - t0
+    results = []
+    for step in steps:
+        t = time.perf_counter()
+        with span("step", op=step["op"]):
+            pc, result = PIPELINE_STEPS[step["op"]](pc, **step.get("args", {}))
+        results.append({"op": step["op"], "seconds": time.perf_counter() - t,
+                        "points_after": len(pc.points), **result})
+    if output_path:
+        o3d.io.write_point_cloud(output_path, pc)
+    return {
+        "status": f"pipeline of {len(steps)} steps completed",
+        "load_seconds": load_seconds,
+        "total_seconds": time.perf_counter() - t0,
+        "steps": results,
+        "output_path": output_path
+    }
+
+# ─── Change detection ─────────────────────────────────────────────────────────────
+
+def detect_changes(path: str,
+                   reference: str,
+                   voxel_size: float = 0.05,
+                   min_points: int = 1,
+                   min_region_voxels: int = 3,
+                   max_regions: int = 20,
+                   save_as: str | None = None,
+                   display: bool = False) -> dict:
+    """
+    What changed between `reference` and `path` (same space, same coordinate
+    frame): added/removed regions with volumes and bounding boxes.
+    `reference` is a scan file or "ref:<name>" for an occupancy stored earlier
+    with save_as=<name>; a stored reference keeps its own voxel size.
+    Voxels holding fewer than `min_points` points count as empty.
+    """
+    t0 = time.perf_counter()
+    path = _ensure_exists(path)
+    if reference.startswith(change_detection.REF_PREFIX):
+        ref_keys, ref_counts, voxel_size = change_detection.get_reference(reference[len(change_detection.REF_PREFIX):])
+        ref_cached = True
+    else:
+        reference = _ensure_exists(reference)
+        ref_keys, ref_counts, ref_cached = change_detection.get_occupancy(reference, voxel_size)
+    cur_keys, cur_counts, cur_cached = change_detection.get_occupancy(path, voxel_size)
+    if min_points > 1:
+        ref_keys, cur_keys = ref_keys[ref_counts >= min_points], cur_keys[cur_counts >= min_points]
+
+    with span("diff", voxels=len(cur_keys) + len(ref_keys)):
+        added, removed, unchanged = change_detection.diff(cur_keys, ref_keys)
+        added_regions, n_added = change_detection.regions(added, voxel_size, min_region_voxels, max_regions)
+        removed_regions, n_removed = change_detection.regions(removed, voxel_size, min_region_voxels, max_regions)
+    cell = voxel_size ** 3
+    result = {
+        "status": "changes detected" if len(added) or len(removed) else "no changes",
+        "voxel_size": voxel_size,
+        "voxels": {"reference": len(ref_keys), "current": len(cur_keys), "unchanged": unchanged,
+                   "added": len(added), "removed": len(removed)},
+        "added_volume": len(added) * cell,
+        "removed_volume": len(removed) * cell,
+        "changed_fraction": (len(added) + len(removed)) / max(1, len(np.union1d(cur_keys, ref_keys))),
+        "added_regions": added_regions,
+        "removed_regions": removed_regions,
+        "region_counts": {"added": n_added, "removed": n_removed},
+        "cached": {"reference": ref_cached, "current": cur_cached},
+    }
+    if save_as:
+        result["saved_reference"] = change_detection.REF_PREFIX + save_as
+        change_detection.save_reference(save_as, path, voxel_size)
+    if display:
+        geoms = []
+        for keys, color in ((added, (0, 0.8, 0)), (removed, (0.9, 0, 0))):
+            if len(keys):
+                pc = o3d.geometry.PointCloud(_vec3((change_detection.unpack(keys) + 0.5) * voxel_size))
+                pc.paint_uniform_color(color)
+                geoms.append(pc)
+        if geoms:
+            _show(geoms)
+    result["seconds"] = time.perf_counter() - t0
+    return result
+
+# ─── Array results ───────────────────────────────────────────────────────────────
+
+def describe_array(handle: str) -> dict:
+    """Summary of a published array (from a *_labels / distances / features handle) without copying it."""
+    arr = array_channel.open_array(handle)
+    out = {"handle": handle, "shape": list(arr.shape), "dtype": arr.dtype.str}
+    if arr.size and np.issubdtype(arr.dtype, np.number):
+        out.update({"min": float(arr.min()), "max": float(arr.max()), "mean": float(arr.mean())})
+        if np.issubdtype(arr.dtype, np.integer) and arr.ndim == 1:
+            values, counts = np.unique(arr, return_counts=True)
+            out["counts"] = {int(v): int(c) for v, c in zip(values[:50], counts[:50])}
+    return out
+
+def release_array(handle: str) -> dict:
+    return {"status": "released" if array_channel.release(handle) else "unknown handle", "handle": handle}
+
+def collect_arrays() -> dict:
+    return {"status": "expired arrays collected", "removed": array_channel.collect_expired()}
+
+# ─── Scan library retrieval ──────────────────────────────────────────────────────
+
+def index_scans(path: str = ".", workers: int | None = None) -> dict:
+    """
+    Add/refresh every .ply under `path` in the on-disk scan index.
+    Only new or modified files (by size/mtime) get a descriptor computed.
+    """
+    result = scan_index.update_index(find_ply_files(path), workers, root=path)
+    return {"status": "scan index updated", **result}
+
+def find_similar_scans(path: str,
+                       k: int = 5,
+                       nprobe: int = 4,
+                       library: str | None = None) -> dict:
+    """
+    Approximate kNN over the scan index: the k stored scans whose global
+    descriptor is closest to `path`. If `library` is given, it is indexed
+    incrementally first so freshly added files are searchable.
+    """
+    if path == room_scanner.LIVE_PATH:
+        raise ValueError("find_similar_scans needs a scan file; write the live scan with scan_room(action='save') first")
+    path = _ensure_exists(path)
+    if library is not None:
+        index_scans(library)
+    matches = scan_index.query_index(path, k, nprobe)
+    return {"status": f"{len(matches)} similar scans found", "query": path, "matches": matches}
 
 def voxel_downsample(path: str, voxel_size: float = 0.05) -> dict:
     """
@@ -332,11 +1209,11 @@ def voxel_downsample(path: str, voxel_size: float = 0.05) -> dict:
     and display the reduced cloud.
     """
     path = _ensure_exists(path)
-    pc = o3d.io.read_point_cloud(path)
+    pc = _read_point_cloud(path)
     before = len(pc.points)
     down = pc.voxel_down_sample(voxel_size)
     after = len(down.points)
-    o3d.visualization.draw_geometries([down])
+    _show([down])
     return {
         "status": "point cloud voxel-downsampled and displayed",
         "voxel_size": voxel_size,
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Background precompute for newly arrived scans
+─────────────────────────────────────────────
+• Polls the given folders with the same discovery as find_ply_files.
+• For every new or rewritten .ply, computes the metadata record and binary
+  sidecar (scan_metadata.py) in a low-priority process pool.
+• count_points, get_bounding_box and describe_scan then answer from the
+  record, and every other tool loads the sidecar instead of parsing the PLY,
+  so the first question about a fresh scan is as fast as a repeat one.
+
+    python precompute_daemon.py data scans --interval 5 --workers 2
+    python precompute_daemon.py data --once
+"""
+
+import os
+import sys
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+import pointcloud_tools as pct
+import scan_metadata
+from cache_store import CACHE_DIR, file_fingerprint
+
+
+def _low_priority() -> None:
+    try:
+        os.nice(int(os.environ.get("PCT_PRECOMPUTE_NICE", "10")))
+    except (AttributeError, OSError):
+        pass
+
+
+def _stable(path: str, settle: float) -> bool:
+    """A file still being copied in keeps changing; wait until it has been quiet for `settle` s."""
+    try:
+        return time.time() - os.stat(path).st_mtime >= settle
+    except OSError:
+        return False
+
+
+def discover(roots: list[str]) -> list[str]:
+    cache = os.path.abspath(CACHE_DIR) + os.sep
+    found = []
+    for root in roots:
+        # cached meshes under .pct_cache are ours, not scans
+        found.extend(p for p in pct.find_ply_files(root) if not os.path.abspath(p).startswith(cache))
+    return found
+
+
+def run(roots: list[str], interval: float = 5.0, workers: int | None = None,
+        settle: float = 2.0, once: bool = False) -> dict:
+    seen: dict[str, str] = {}        # path → fingerprint already covered
+    pending: dict = {}               # future → (path, fingerprint)
+    done = failed = 0
+    with ProcessPoolExecutor(max_workers=workers, initializer=_low_priority) as pool:
+        while True:
+            queued = {p for p, _ in pending.values()}
+            for path in discover(roots):
+                if path in queued or not _stable(path, 0 if once else settle):
+                    continue
+                try:
+                    fp = file_fingerprint(path)
+                except OSError:
+                    continue
+                if seen.get(path) == fp:
+                    continue
+                if scan_metadata.load_metadata(path) is not None:
+                    seen[path] = fp
+                    continue
+                pending[pool.submit(scan_metadata.metadata_job, path)] = (path, fp)
+
+            if pending:
+                finished, _ = wait(list(pending), timeout=None if once else interval,
+                                   return_when=FIRST_COMPLETED)
+                for fut in finished:
+                    path, fp = pending.pop(fut)
+                    _, record, err = fut.result()
+                    seen[path] = fp  # failures are retried only after the file changes
+                    if record is None:
+                        failed += 1
+                        print(f"[warn] precompute failed for '{path}': {err}", file=sys.stderr, flush=True)
+                    else:
+                        done += 1
+                        print(f"[precompute] {path}: {record['points']} points in {record['seconds']:.2f}s",
+                              file=sys.stderr, flush=True)
+                continue
+            if once:
+                return {"computed": done, "failed": failed, "known": len(seen)}
+            time.sleep(interval)
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("roots", nargs="*", default=["."])
+    ap.add_argument("--interval", type=float, default=5.0, help="seconds between directory scans")
+    ap.add_argument("--workers", type=int, default=None)
+    ap.add_argument("--settle", type=float, default=2.0, help="skip files modified less than this many seconds ago")
+    ap.add_argument("--once", action="store_true", help="process what is there now and exit")
+    args = ap.parse_args()
+    try:
+        result = run(args.roots, args.interval, args.workers, args.settle, args.once)
+        print(f"[precompute] {result}", file=sys.stderr, flush=True)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+import os
+import json
+from collections import OrderedDict
+
+from intent_router import normalize
+
+# Client-side cache of whole answers, keyed by the normalized question plus the
+# tool call it produced (tool + canonical args), and checked against the
+# fingerprint of the files the call names. A repeated question is answered from
+# here with no LLM or MCP call, as long as those files have not changed
+# (size/mtime); otherwise the entry is dropped.
+#
+# When the fast-path router yields the call, lookups use the full key. A
+# question that needs the LLM to find its call can only be looked up by its
+# text, so such entries are kept only when the text names every file of the
+# call ("count points in bunny.ply", not "how many points in it?").
+#
+# Only read-only tools whose answer depends on nothing but the files they name
+# are cached: tools that open a viewer, change state, publish arrays or read the
+# scan index (compute_fpfh, run_pipeline, find_similar_scans) run every time.
+# Only paths that exist where the client runs are fingerprinted; anything the
+# server would have to resolve on its own side is never cached.
+
+CACHEABLE_TOOLS = {
+    "count_points",
+    "get_bounding_box",
+    "describe_scan",
+    "find_ply_files",
+    "list_files",
+}
+DEFAULT_SIZE = int(os.environ.get("PCT_RESPONSE_CACHE_SIZE", "256"))
+
+
+def _path_fingerprint(path: str) -> str:
+    st = os.stat(path)
+    if not os.path.isdir(path):
+        return f"{st.st_size}:{st.st_mtime_ns}"
+    # a directory changes when entries are added/removed anywhere below it
+    stamps = [st.st_mtime_ns]
+    for root, dirs, _ in os.walk(path):
+        for d in dirs:
+            try:
+                stamps.append(os.stat(os.path.join(root, d)).st_mtime_ns)
+            except OSError:
+                pass
+    return f"dir:{len(stamps)}:{max(stamps)}:{sum(stamps)}"
+
+
+def call_fingerprint(call: dict) -> str | None:
+    """
+    Fingerprint of every local file/folder the call's arguments point at, or
+    None if the call is not cacheable (write/display tool, or no local path).
+    """
+    if call.get("tool") not in CACHEABLE_TOOLS:
+        return None
+    parts = []
+    for key, value in sorted(call.get("args", {}).items()):
+        if isinstance(value, str) and os.path.exists(value):
+            parts.append(f"{key}={_path_fingerprint(value)}")
+    return "|".join(parts) or None
+
+
+def _local_paths(call: dict) -> list[str]:
+    return [v for v in call.get("args", {}).values() if isinstance(v, str) and os.path.exists(v)]
+
+
+def _canonical_args(call: dict) -> str:
+    args = {k: os.path.realpath(v) if isinstance(v, str) and os.path.exists(v) else v
+            for k, v in call.get("args", {}).items()}
+    return json.dumps(args, sort_keys=True, default=str)
+
+
+def intent_key(text: str, call: dict | None = None) -> str:
+    """Normalized question, plus the tool and canonical args when the call is known."""
+    intent = normalize(text).lower()
+    if call is None:
+        return intent
+    return f"{intent}\x00{call.get('tool')}\x00{_canonical_args(call)}"
+
+
+def names_files(text: str, call: dict) -> bool:
+    """Whether the question itself names every file the call works on."""
+    lowered = text.lower()
+    paths = _local_paths(call)
+    return bool(paths) and all(os.path.basename(os.path.normpath(p)).lower() in lowered for p in paths)
+
+
+class ResponseCache:
+    def __init__(self, max_entries: int = DEFAULT_SIZE):
+        self.max_entries = max_entries
+        self.entries: OrderedDict[str, dict] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def lookup(self, text: str, call: dict | None = None) -> dict | None:
+        """
+        {"call", "result", "final"} for a repeated question whose inputs are
+        unchanged, else None. Pass the routed `call` when it is known.
+        """
+        key = intent_key(text, call)
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        try:
+            fingerprint = call_fingerprint(entry["call"])
+        except OSError:
+            fingerprint = None
+        if fingerprint != entry["fingerprint"]:
+            del self.entries[key]
+            self.invalidations += 1
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return entry
+
+    def store(self, text: str, call: dict, result, final: str) -> bool:
+        """Remember the answer if the call is cacheable. Returns whether it was stored."""
+        try:
+            fingerprint = call_fingerprint(call)
+        except OSError:
+            return False
+        if fingerprint is None or (isinstance(result, dict) and "error" in result):
+            return False
+        entry = {
+            "call": json.loads(json.dumps(call)),
+            "fingerprint": fingerprint,
+            "result": result,
+            "final": final
+        }
+        keys = [intent_key(text, call)]
+        if names_files(text, call):
+            keys.append(intent_key(text))  # safe to answer from the text alone
+        for key in keys:
+            self.entries[key] = entry
+            self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+        return True
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {"entries": len(self.entries), "hits": self.hits, "misses": self.misses,
+                "invalidations": self.invalidations, "hit_rate": self.hits / total if total else 0.0}
@@ -0,0 +1,122 @@
+import os
+import json
+from collections import Counter
+
+# Keeping tool results small enough to feed back into the LLM.
+#
+# Server side: list-returning tools can page (limit + opaque cursor) or
+# summarize (counts grouped by directory + a few examples) instead of
+# returning every entry.
+# Client side: fit_to_budget() shrinks any tool result to a token budget
+# before it is appended to the prompt history.
+
+# ─── Server side ──────────────────────────────────────────────────────────────
+
+def paginate(items: list, limit: int, cursor: str | None = None) -> dict:
+    """
+    One page of `items`. The cursor is the offset of the next page as a string;
+    items are sorted first so pages are stable between calls.
+    """
+    if limit < 1:
+        raise ValueError(f"limit must be at least 1, got {limit}")
+    items = sorted(items)
+    try:
+        offset = max(int(cursor), 0) if cursor else 0
+    except ValueError:
+        raise ValueError(f"invalid cursor '{cursor}'")
+    page = items[offset:offset + limit]
+    end = offset + len(page)
+    return {
+        "items": page,
+        "total": len(items),
+        "offset": offset,
+        "next_cursor": str(end) if end < len(items) else None
+    }
+
+
+def summarize_paths(paths: list[str], top_n: int = 10) -> dict:
+    """Counts per parent directory (largest first) plus the first `top_n` paths."""
+    by_dir = Counter(os.path.dirname(p) or "." for p in paths)
+    top = by_dir.most_common(top_n)
+    summary = {
+        "total": len(paths),
+        "directories": len(by_dir),
+        "by_directory": dict(top),
+        "examples": sorted(paths)[:top_n]
+    }
+    if len(by_dir) > top_n:
+        summary["other_directories"] = sum(by_dir.values()) - sum(c for _, c in top)
+    return summary
+
+
+def compact_listing(items: list[str], limit: int | None = None, cursor: str | None = None,
+                    summarize: bool = False, top_n: int = 10) -> list[str] | dict:
+    """Plain list when no option is given (backwards compatible), else a summary or a page."""
+    if summarize:
+        return summarize_paths(items, top_n)
+    if limit is not None or cursor is not None:
+        return paginate(items, limit if limit is not None else max(1, len(items)), cursor)
+    return items
+
+
+# ─── Client side ──────────────────────────────────────────────────────────────
+
+def _approx_tokens(text: str) -> int:
+    return len(text) // 4 + 1
+
+
+def _dump(obj) -> str:
+    return obj if isinstance(obj, str) else json.dumps(obj, ensure_ascii=False)
+
+
+def _fit_list(items: list, budget: int, count, wrap) -> str:
+    """Largest prefix of `items` whose wrapped form fits the budget (binary search)."""
+    lo, hi = 0, len(items)
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if count(_dump(wrap(items[:mid]))) <= budget:
+            lo = mid
+        else:
+            hi = mid - 1
+    return _dump(wrap(items[:lo]))
+
+
+def fit_to_budget(result, budget: int, count_tokens=None) -> str:
+    """
+    Serialize a tool result for the prompt, using at most `budget` tokens
+    (`count_tokens(text) -> int`, default ≈ chars/4). Lists are cut to the
+    longest prefix that fits, in the sorted order `paginate` uses, and annotated
+    with the total and the cursor that resumes right after the prefix; anything
+    else is truncated as text.
+    """
+    count = count_tokens or _approx_tokens
+    text = _dump(result)
+    if count(text) <= budget:
+        return text
+
+    hint = "truncated; call again with limit/cursor or summarize=true"
+    page_hint = "truncated; call again with cursor=next_cursor (and a limit) or summarize=true"
+    if isinstance(result, list):
+        try:
+            items = sorted(result)  # same order as paginate, so next_cursor continues this prefix
+        except TypeError:
+            items = result
+        return _fit_list(items, budget, count,
+                         lambda part: {"items": part, "shown": len(part), "total": len(items),
+                                       "next_cursor": str(len(part)), "note": page_hint})
+    if isinstance(result, dict) and isinstance(result.get("items"), list):
+        items = result["items"]
+        offset = result.get("offset", 0)
+        return _fit_list(items, budget, count,
+                         lambda part: {**result, "items": part, "shown": len(part),
+                                       "next_cursor": str(offset + len(part)), "note": page_hint})
+
+    # plain text / arbitrary dict: keep the head of the serialized form
+    lo, hi = 0, len(text)
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if count(text[:mid]) <= budget:
+            lo = mid
+        else:
+            hi = mid - 1
+    return text[:lo] + f" …[{hint}]"
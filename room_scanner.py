@@ -0,0 +1,360 @@
+import os
+import sys
+import json
+import glob
+import time
+import socket
+import struct
+import threading
+import numpy as np
+
+from lazy_import import lazy_import
+
+o3d = lazy_import("open3d")
+
+# Live room scanning: frames (partial clouds or depth images) arrive from a
+# local source and are fused incrementally into a bounded voxel map.
+#
+# Sources
+#   DirectorySource  polls a folder that is being filled with frames:
+#                    .ply/.pcd/.xyz clouds, .npy arrays (N,3) or (N,6) xyz+rgb,
+#                    or 16-bit depth .png with an intrinsics.json next to them.
+#                    An optional "<frame>.pose.txt" (4x4) maps a frame to world.
+#   SocketSource     TCP stand-in for the sensor; each message is
+#                    struct "<II" (n_points, channels) followed by
+#                    n_points*channels little-endian float32 (xyz or xyz+rgb).
+#
+# The fused cloud is exposed to the other tools as the path LIVE_PATH.
+
+LIVE_PATH = "scan://live"
+_VOXEL_BITS = 21
+_VOXEL_OFFSET = 1 << (_VOXEL_BITS - 1)
+
+
+# ─── Fusion ───────────────────────────────────────────────────────────────────
+
+class VoxelFusion:
+    """
+    Running per-voxel mean of every point seen, with at most `max_voxels` voxels
+    (least recently observed voxels are evicted first).
+
+    Voxels live in a large sorted "main" table plus a small sorted "tail" that
+    absorbs new voxels. Lookups are binary searches, O(m log N) for a frame of
+    m points; new voxels are spliced into the tail at their sorted positions,
+    which copies the tail (O(T + m), no re-sort). The tail is merged into main
+    once it grows past ~10% of main.
+    """
+
+    def __init__(self, voxel_size: float = 0.02, max_voxels: int = 2_000_000):
+        if voxel_size <= 0:
+            raise ValueError(f"voxel_size must be positive, got {voxel_size}")
+        if max_voxels < 1:
+            raise ValueError(f"max_voxels must be at least 1, got {max_voxels}")
+        self.voxel_size = voxel_size
+        self.max_voxels = max_voxels
+        self.frame = 0
+        self.evicted = 0
+        self._main = self._empty()
+        self._tail = self._empty()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _empty() -> dict:
+        return {"keys": np.empty(0, np.int64), "sums": np.empty((0, 3), np.float64),
+                "colors": np.empty((0, 3), np.float64), "counts": np.empty(0, np.uint32),
+                "seen": np.empty(0, np.uint32)}
+
+    def _keys(self, pts: np.ndarray) -> np.ndarray:
+        ijk = np.floor(pts / self.voxel_size).astype(np.int64) + _VOXEL_OFFSET
+        ijk &= (1 << _VOXEL_BITS) - 1
+        return (ijk[:, 0] << (2 * _VOXEL_BITS)) | (ijk[:, 1] << _VOXEL_BITS) | ijk[:, 2]
+
+    @staticmethod
+    def _update(table: dict, ukeys, sums, colors, counts, frame) -> np.ndarray:
+        """Accumulate into voxels already in `table`; returns the mask of keys that were found."""
+        pos = np.searchsorted(table["keys"], ukeys)
+        pos_c = np.minimum(pos, max(len(table["keys"]) - 1, 0))
+        hit = (pos < len(table["keys"])) & (table["keys"][pos_c] == ukeys) if len(table["keys"]) else np.zeros(len(ukeys), bool)
+        idx = pos[hit]
+        table["sums"][idx] += sums[hit]
+        table["colors"][idx] += colors[hit]
+        table["counts"][idx] += counts[hit].astype(np.uint32)
+        table["seen"][idx] = frame
+        return hit
+
+    def integrate(self, points: np.ndarray, colors: np.ndarray | None = None) -> dict:
+        """Fuse one frame (world-frame points). Returns per-frame stats."""
+        t0 = time.perf_counter()
+        points = np.asarray(points, dtype=np.float64)
+        points = points[np.isfinite(points).all(axis=1)]
+        if colors is None:
+            colors = np.zeros_like(points)
+        keys = self._keys(points)
+        ukeys, inv = np.unique(keys, return_inverse=True)
+        counts = np.bincount(inv, minlength=len(ukeys))
+        sums = np.stack([np.bincount(inv, points[:, i], len(ukeys)) for i in range(3)], axis=1)
+        csum = np.stack([np.bincount(inv, colors[:, i], len(ukeys)) for i in range(3)], axis=1)
+
+        with self._lock:
+            self.frame += 1
+            found = self._update(self._main, ukeys, sums, csum, counts, self.frame)
+            rest = ~found
+            found_tail = self._update(self._tail, ukeys[rest], sums[rest], csum[rest], counts[rest], self.frame)
+            new = np.flatnonzero(rest)[~found_tail]
+            if len(new):
+                self._insert_tail(ukeys[new], sums[new], csum[new], counts[new])
+            if len(self._tail["keys"]) > max(4096, len(self._main["keys"]) // 10):
+                self._merge()
+            voxels = len(self._main["keys"]) + len(self._tail["keys"])
+        return {"points": len(points), "new_voxels": int(len(new)), "voxels": voxels,
+                "frame_ms": (time.perf_counter() - t0) * 1000.0}
+
+    def _insert_tail(self, keys, sums, colors, counts) -> None:
+        """Splice new voxels (`keys` sorted, none present yet) into the sorted tail."""
+        t = self._tail
+        pos = np.searchsorted(t["keys"], keys)
+        self._tail = {
+            "keys": np.insert(t["keys"], pos, keys),
+            "sums": np.insert(t["sums"], pos, sums, axis=0),
+            "colors": np.insert(t["colors"], pos, colors, axis=0),
+            "counts": np.insert(t["counts"], pos, counts.astype(np.uint32)),
+            "seen": np.insert(t["seen"], pos, np.full(len(keys), self.frame, np.uint32)),
+        }
+
+    def _merge(self) -> None:
+        m, t = self._main, self._tail
+        merged = {k: np.concatenate([m[k], t[k]]) for k in m}
+        if len(merged["keys"]) > self.max_voxels:
+            # bounded memory: drop the voxels that were observed longest ago
+            drop = len(merged["keys"]) - self.max_voxels
+            keep = np.argpartition(merged["seen"], drop)[drop:]
+            merged = {k: v[keep] for k, v in merged.items()}
+            self.evicted += drop
+        order = np.argsort(merged["keys"], kind="stable")
+        self._main = {k: v[order] for k, v in merged.items()}
+        self._tail = self._empty()
+
+    def to_point_cloud(self) -> "o3d.geometry.PointCloud":
+        with self._lock:
+            counts = np.concatenate([self._main["counts"], self._tail["counts"]]).astype(np.float64)[:, None]
+            pts = np.concatenate([self._main["sums"], self._tail["sums"]]) / np.maximum(counts, 1)
+            cols = np.concatenate([self._main["colors"], self._tail["colors"]]) / np.maximum(counts, 1)
+        pc = o3d.geometry.PointCloud()
+        pc.points = o3d.utility.Vector3dVector(pts)
+        if cols.any():
+            pc.colors = o3d.utility.Vector3dVector(np.clip(cols, 0.0, 1.0))
+        return pc
+
+    def __len__(self) -> int:
+        return len(self._main["keys"]) + len(self._tail["keys"])
+
+
+# ─── Sources ──────────────────────────────────────────────────────────────────
+
+def _split_xyz_rgb(arr: np.ndarray):
+    arr = np.asarray(arr, dtype=np.float64)
+    colors = arr[:, 3:6] if arr.shape[1] >= 6 else None
+    if colors is not None and colors.max() > 1.0:
+        colors = colors / 255.0
+    return arr[:, :3], colors
+
+
+class DirectorySource:
+    CLOUD_EXT = (".ply", ".pcd", ".xyz", ".npy", ".png")
+
+    def __init__(self, folder: str):
+        self.folder = folder
+        self.seen: set[str] = set()
+        self.intrinsic = None
+        intr = os.path.join(folder, "intrinsics.json")
+        if os.path.exists(intr):
+            with open(intr) as f:
+                k = json.load(f)
+            self.intrinsic = o3d.camera.PinholeCameraIntrinsic(
+                k["width"], k["height"], k["fx"], k["fy"], k["cx"], k["cy"])
+            self.depth_scale = float(k.get("depth_scale", 1000.0))
+            self.depth_trunc = float(k.get("depth_trunc", 5.0))
+
+    def poll(self) -> list[tuple]:
+        """New frames since the last poll, oldest (by name) first, as (points, colors)."""
+        frames = []
+        for path in sorted(glob.glob(os.path.join(self.folder, "*"))):
+            if path in self.seen or not path.lower().endswith(self.CLOUD_EXT):
+                continue
+            if time.time() - os.path.getmtime(path) < 0.05:
+                continue  # probably still being written
+            self.seen.add(path)
+            try:
+                frames.append(self._load(path))
+            except Exception as e:
+                print(f"[warn] skipping frame '{path}': {e}", file=sys.stderr, flush=True)
+        return frames
+
+    def _load(self, path: str):
+        ext = os.path.splitext(path)[1].lower()
+        if ext == ".npy":
+            points, colors = _split_xyz_rgb(np.load(path))
+        elif ext == ".png":
+            if self.intrinsic is None:
+                raise ValueError("depth frame without intrinsics.json")
+            depth = o3d.io.read_image(path)
+            pc = o3d.geometry.PointCloud.create_from_depth_image(
+                depth, self.intrinsic, depth_scale=self.depth_scale, depth_trunc=self.depth_trunc)
+            points, colors = np.asarray(pc.points), None
+        else:
+            pc = o3d.io.read_point_cloud(path)
+            points = np.asarray(pc.points)
+            colors = np.asarray(pc.colors) if pc.has_colors() else None
+        pose = os.path.splitext(path)[0] + ".pose.txt"
+        if os.path.exists(pose):
+            T = np.loadtxt(pose).reshape(4, 4)
+            points = points @ T[:3, :3].T + T[:3, 3]
+        return points, colors
+
+    def close(self) -> None:
+        pass
+
+
+class SocketSource:
+    HEADER = struct.Struct("<II")
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 9100):
+        self.server = socket.create_server((host, port))
+        self.server.settimeout(0.2)
+        self.conn = None
+        self.buf = b""
+
+    def poll(self) -> list[tuple]:
+        if self.conn is None:
+            try:
+                self.conn, _ = self.server.accept()
+                self.conn.settimeout(0.2)
+            except socket.timeout:
+                return []
+        try:
+            data = self.conn.recv(1 << 20)
+            if not data:
+                self.conn.close()
+                self.conn = None
+                return []
+            self.buf += data
+        except socket.timeout:
+            pass
+        frames = []
+        while len(self.buf) >= self.HEADER.size:
+            n, ch = self.HEADER.unpack_from(self.buf)
+            size = self.HEADER.size + n * ch * 4
+            if len(self.buf) < size:
+                break
+            arr = np.frombuffer(self.buf, "<f4", n * ch, self.HEADER.size).reshape(n, ch)
+            frames.append(_split_xyz_rgb(arr))
+            self.buf = self.buf[size:]
+        return frames
+
+    def close(self) -> None:
+        if self.conn is not None:
+            self.conn.close()
+        self.server.close()
+
+
+def open_source(source: str):
+    """'tcp://host:port' → SocketSource, anything else is a folder to watch."""
+    if source.startswith("tcp://"):
+        host, _, port = source[len("tcp://"):].rpartition(":")
+        return SocketSource(host or "127.0.0.1", int(port))
+    os.makedirs(source, exist_ok=True)
+    return DirectorySource(source)
+
+
+# ─── Session ──────────────────────────────────────────────────────────────────
+
+class ScanSession:
+    def __init__(self, source: str, voxel_size: float, max_voxels: int, poll_interval: float = 0.01):
+        self.source_name = source
+        self.source = open_source(source)
+        self.fusion = VoxelFusion(voxel_size, max_voxels)
+        self.poll_interval = poll_interval
+        self.started = time.time()
+        self.frames = 0
+        self.points_in = 0
+        self.last: dict = {}
+        self.frame_ms: list[float] = []
+        self.error: str | None = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="scan-room", daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        try:
+            while not self._stop.is_set():
+                frames = self.source.poll()
+                for points, colors in frames:
+                    self.last = self.fusion.integrate(points, colors)
+                    self.frames += 1
+                    self.points_in += self.last["points"]
+                    self.frame_ms = (self.frame_ms + [self.last["frame_ms"]])[-100:]
+                if not frames:
+                    time.sleep(self.poll_interval)
+        except Exception as e:
+            # keep the voxels fused so far, but report the session as stopped
+            self.error = f"{type(e).__name__}: {e}"
+            print(f"[warn] scan session on '{self.source_name}' stopped: {self.error}", file=sys.stderr, flush=True)
+            self._stop.set()
+        finally:
+            self.source.close()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join(timeout=5)
+
+    def status(self) -> dict:
+        elapsed = time.time() - self.started
+        return {
+            "source": self.source_name,
+            "running": not self._stop.is_set(),
+            "error": self.error,
+            "frames": self.frames,
+            "points_in": self.points_in,
+            "voxels": len(self.fusion),
+            "evicted_voxels": self.fusion.evicted,
+            "voxel_size": self.fusion.voxel_size,
+            "frames_per_sec": self.frames / elapsed if elapsed > 0 else 0.0,
+            "mean_frame_ms": float(np.mean(self.frame_ms)) if self.frame_ms else None,
+            "live_path": LIVE_PATH
+        }
+
+
+_session: ScanSession | None = None
+_session_lock = threading.Lock()
+
+
+def start(source: str, voxel_size: float = 0.02, max_voxels: int = 2_000_000) -> dict:
+    global _session
+    with _session_lock:
+        if _session is not None:
+            _session.stop()
+        _session = ScanSession(source, voxel_size, max_voxels)
+        return _session.status()
+
+
+def stop() -> dict:
+    global _session
+    with _session_lock:
+        if _session is None:
+            return {"running": False}
+        _session.stop()
+        status = _session.status()
+        return status
+
+
+def status() -> dict:
+    with _session_lock:
+        return _session.status() if _session is not None else {"running": False}
+
+
+def current_cloud() -> "o3d.geometry.PointCloud":
+    """The fused cloud so far (also available after stop() until the next start())."""
+    with _session_lock:
+        if _session is None:
+            raise FileNotFoundError("no room scan has been started (call scan_room first)")
+        return _session.fusion.to_point_cloud()
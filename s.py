@@ -1,13 +1,28 @@
 #!/usr/bin/env python3
+import time
+_t_start = time.perf_counter()
 import os
+import sys
 import pointcloud_tools as pct
+import tracing
+import array_channel
+import lazy_import
+from tracing import traced
+_t_tools_imported = time.perf_counter()
 from fastmcp import FastMCP
+_t_fastmcp_imported = time.perf_counter()
+
+HOST = os.environ.get("PCT_HOST", "127.0.0.1")
+PORT = int(os.environ.get("PCT_PORT", "8000"))
+# PCT_PREWARM=0 disables importing open3d/matplotlib/scipy in the background after startup
+PREWARM = os.environ.get("PCT_PREWARM", "1") not in ("", "0")
 
 mcp = FastMCP(
     "PointCloudDemo",
     stateless_http=True,
-    host="127.0.0.1",
-    port=8000,
+    host=HOST,
+    port=PORT,
+    tool_serializer=tracing.serialize,  # reuse the JSON text @traced already produced
 )
 
 # default file for point‐cloud tools
@@ -16,123 +31,297 @@ DEFAULT_PLY = "data/bunny.ply"
 # ─── Core tools ────────────────────────────────────────────────────────────────
 
 @mcp.tool()
+@traced
 def count_points(path: str = DEFAULT_PLY) -> int:
     return pct.count_points(path)
 
 
 @mcp.tool()
-def scan_room() -> dict:
-    return pct.scan_room()
+@traced
+def scan_room(action: str = "start",
+              source: str = "scan_frames",
+              voxel_size: float = 0.02,
+              max_voxels: int = 2_000_000,
+              output_path: str | None = None) -> dict:
+    """
+    Live room scan fused into a voxel map. action: start | status | stop | save.
+    source: folder receiving frames, or tcp://host:port. Other tools can then use path="scan://live".
+    """
+    return pct.scan_room(action, source, voxel_size, max_voxels, output_path)
+
+@mcp.tool()
+@traced
+def get_bounding_box(path: str = DEFAULT_PLY, approximate: bool = False,
+                     sample_size: int | None = None) -> dict:
+    """Axis-aligned bounds; approximate=True samples the file and reports error margins."""
+    return pct.get_bounding_box(path, approximate, sample_size)
 
 @mcp.tool()
-def get_bounding_box(path: str = DEFAULT_PLY) -> dict:
-    return pct.get_bounding_box(path)
+@traced
+def describe_scan(path: str = DEFAULT_PLY) -> dict:
+    """Point count, bounding boxes and height histogram of a scan (precomputed when available)."""
+    return pct.describe_scan(path)
 
 @mcp.tool()
-def find_ply_files(path: str = ".") -> list[str]:
-    return pct.find_ply_files(path)
+@traced
+def find_ply_files(path: str = ".",
+                   limit: int | None = None,
+                   cursor: str | None = None,
+                   summarize: bool = False) -> list[str] | dict:
+    return pct.find_ply_files(path, limit, cursor, summarize)
 
 @mcp.tool()
-def list_files(path: str = ".", extension: str | None = None) -> list[str]:
-    return pct.list_files(path, extension)
+@traced
+def list_files(path: str = ".",
+               extension: str | None = None,
+               limit: int | None = None,
+               cursor: str | None = None,
+               summarize: bool = False) -> list[str] | dict:
+    return pct.list_files(path, extension, limit, cursor, summarize)
 
 @mcp.tool()
+@traced
 def visualize_pointcloud(path: str = DEFAULT_PLY) -> dict:
     return pct.visualize_pointcloud(path)
 
 # ─── Nice visuals ─────────────────────────────────────────────────────────────
 
 @mcp.tool()
+@traced
 def color_by_height(path: str = DEFAULT_PLY, colormap: str = "viridis") -> dict:
     return pct.color_by_height(path, colormap)
 
 @mcp.tool()
+@traced
 def show_oriented_bounding_box(path: str = DEFAULT_PLY) -> dict:
     return pct.show_oriented_bounding_box(path)
 
 @mcp.tool()
+@traced
 def visualize_voxel_grid(path: str = DEFAULT_PLY, voxel_size: float = 0.05) -> dict:
     return pct.visualize_voxel_grid(path, voxel_size)
 
 @mcp.tool()
+@traced
 def segment_plane_colormap(
     path: str = DEFAULT_PLY,
     distance_threshold: float = 0.01,
     ransac_n: int = 3,
     num_iterations: int = 1000,
-    colormap: str = "plasma"
+    colormap: str = "plasma",
+    return_distances: bool = False
 ) -> dict:
-    return pct.segment_plane_colormap(path, distance_threshold, ransac_n, num_iterations, colormap)
+    return pct.segment_plane_colormap(path, distance_threshold, ransac_n, num_iterations, colormap, return_distances)
 
 @mcp.tool()
-def cluster_dbscan(path: str = DEFAULT_PLY, eps: float = 0.02, min_points: int = 10) -> dict:
-    return pct.cluster_dbscan(path, eps, min_points)
+@traced
+def cluster_dbscan(path: str = DEFAULT_PLY, eps: float = 0.02, min_points: int = 10,
+                   return_labels: bool = False, approximate: bool = False,
+                   sample_size: int | None = None) -> dict:
+    return pct.cluster_dbscan(path, eps, min_points, return_labels, approximate, sample_size)
 
 @mcp.tool()
+@traced
 def detect_iss_keypoints(path: str = DEFAULT_PLY,
                          salient_radius: float = 0.005,
                          non_max_radius: float = 0.005) -> dict:
     return pct.detect_iss_keypoints(path, salient_radius, non_max_radius)
 
 @mcp.tool()
+@traced
 def show_mesh_with_texture(mesh_path: str, texture_path: str) -> dict:
     return pct.show_mesh_with_texture(mesh_path, texture_path)
 
 @mcp.tool()
+@traced
 def animate_view(path: str = DEFAULT_PLY, axis: str = "x", duration_sec: float = 10.0) -> dict:
     return pct.animate_view(path, axis, duration_sec)
 
 @mcp.tool()
+@traced
 def show_hybrid(path_pc: str = DEFAULT_PLY, path_mesh: str = DEFAULT_PLY) -> dict:
     return pct.show_hybrid(path_pc, path_mesh)
 
 # ─── Reconstruction & Segmentation ────────────────────────────────────────────
 
 @mcp.tool()
+@traced
 def segment_plane(path: str = DEFAULT_PLY,
                   distance_threshold: float = 0.01,
                   ransac_n: int = 3,
-                  num_iterations: int = 1000) -> dict:
-    return pct.segment_plane(path, distance_threshold, ransac_n, num_iterations)
+                  num_iterations: int = 1000,
+                  approximate: bool = False,
+                  sample_size: int | None = None) -> dict:
+    return pct.segment_plane(path, distance_threshold, ransac_n, num_iterations, approximate, sample_size)
 
 @mcp.tool()
+@traced
 def slice_cloud(path: str = DEFAULT_PLY,
                 axis: str = "z",
                 num_slices: int = 5) -> dict:
     return pct.slice_cloud(path, axis, num_slices)
 
 @mcp.tool()
-def poisson_mesh_reconstruction(path: str = DEFAULT_PLY, depth: int = 9) -> dict:
-    return pct.poisson_mesh_reconstruction(path, depth)
+@traced
+def poisson_mesh_reconstruction(path: str = DEFAULT_PLY,
+                                depth: int | None = None,
+                                voxel_size: float | None = None,
+                                density_quantile: float = 0.01,
+                                display: bool = True) -> dict:
+    return pct.poisson_mesh_reconstruction(path, depth, voxel_size, density_quantile, display)
 
 @mcp.tool()
+@traced
 def mesh_poisson_compare(path: str = DEFAULT_PLY,
                          depth1: int = 8,
-                         depth2: int = 12) -> dict:
-    return pct.mesh_poisson_compare(path, depth1, depth2)
+                         depth2: int = 12,
+                         voxel_size: float | None = None,
+                         density_quantile: float = 0.01,
+                         display: bool = True) -> dict:
+    return pct.mesh_poisson_compare(path, depth1, depth2, voxel_size, density_quantile, display)
 
 @mcp.tool()
+@traced
 def ball_pivot_mesh(path: str = DEFAULT_PLY,
-                    radii: list[float] = [0.005, 0.01, 0.02]) -> dict:
-    return pct.ball_pivot_mesh(path, radii)
+                    radii: list[float] | None = None,
+                    voxel_size: float | None = None,
+                    chunk_points: int | None = None,
+                    workers: int | None = None,
+                    display: bool = True) -> dict:
+    return pct.ball_pivot_mesh(path, radii, voxel_size, chunk_points, workers, display)
 
 @mcp.tool()
-def delaunay_mesh(path: str = DEFAULT_PLY) -> dict:
-    return pct.delaunay_mesh(path)
+@traced
+def delaunay_mesh(path: str = DEFAULT_PLY,
+                  tiled: bool = False,
+                  tile_size: float | None = None,
+                  overlap: float | None = None,
+                  voxel_size: float | None = None,
+                  workers: int | None = None,
+                  output_path: str | None = None,
+                  display: bool = True) -> dict:
+    return pct.delaunay_mesh(path, tiled, tile_size, overlap, voxel_size, workers, output_path, display)
 
 @mcp.tool()
+@traced
 def voxel_downsample(path: str = DEFAULT_PLY, voxel_size: float = 0.05) -> dict:
     return pct.voxel_downsample(path, voxel_size)
 
 # ─── Features & Registration ────────────────────────────────────────────────────
 
 @mcp.tool()
+@traced
 def compute_fpfh(path: str = DEFAULT_PLY,
                  voxel_size: float = 0.05,
                  radius_normal: float = 0.1,
-                 radius_feature: float = 0.25) -> dict:
-    return pct.compute_fpfh(path, voxel_size, radius_normal, radius_feature)
+                 radius_feature: float = 0.25,
+                 return_features: bool = False) -> dict:
+    return pct.compute_fpfh(path, voxel_size, radius_normal, radius_feature, return_features)
+
+@mcp.tool()
+@traced
+def register_clouds(source: str,
+                    target: str = DEFAULT_PLY,
+                    voxel_size: float = 0.05,
+                    radius_normal: float = 0.1,
+                    radius_feature: float = 0.25,
+                    method: str = "ransac",
+                    mutual_filter: bool = True,
+                    workers: int = -1,
+                    icp_refine: bool = True) -> dict:
+    return pct.register_clouds(source, target, voxel_size, radius_normal, radius_feature,
+                               method, mutual_filter, workers, icp_refine)
+
+# ─── Pipelines ─────────────────────────────────────────────────────────────────
+
+@mcp.tool()
+@traced
+def run_pipeline(steps: list[dict], path: str = DEFAULT_PLY, output_path: str | None = None) -> dict:
+    """
+    Run several operations on one in-memory cloud, loading the file once.
+    steps: [{"op": "voxel_downsample" | "remove_outliers" | "segment_plane" | "cluster_dbscan" |
+             "compute_fpfh" | "estimate_normals" | "get_bounding_box" | "count_points",
+             "args": {...}}, ...]
+    segment_plane takes keep="outliers" (drop the plane, default), "inliers" or "all".
+    """
+    return pct.run_pipeline(path, steps, output_path)
+
+# ─── Array results ─────────────────────────────────────────────────────────────
+
+@mcp.tool()
+@traced
+def describe_array(handle: str) -> dict:
+    return pct.describe_array(handle)
+
+@mcp.tool()
+@traced
+def release_array(handle: str) -> dict:
+    return pct.release_array(handle)
+
+@mcp.tool()
+@traced
+def collect_arrays() -> dict:
+    return pct.collect_arrays()
+
+# ─── Change detection ─────────────────────────────────────────────────────────
+
+@mcp.tool()
+@traced
+def detect_changes(path: str,
+                   reference: str,
+                   voxel_size: float = 0.05,
+                   min_points: int = 1,
+                   min_region_voxels: int = 3,
+                   max_regions: int = 20,
+                   save_as: str | None = None,
+                   display: bool = False) -> dict:
+    """
+    Added/removed regions between a scan and a reference scan of the same space.
+    reference may be "ref:<name>" for an occupancy stored earlier with save_as=<name>.
+    """
+    return pct.detect_changes(path, reference, voxel_size, min_points, min_region_voxels,
+                              max_regions, save_as, display)
+
+# ─── Scan library retrieval ────────────────────────────────────────────────────
+
+@mcp.tool()
+@traced
+def index_scans(path: str = ".", workers: int | None = None) -> dict:
+    return pct.index_scans(path, workers)
+
+@mcp.tool()
+@traced
+def find_similar_scans(path: str = DEFAULT_PLY,
+                       k: int = 5,
+                       nprobe: int = 4,
+                       library: str | None = None) -> dict:
+    return pct.find_similar_scans(path, k, nprobe, library)
+
+# ─── Diagnostics ──────────────────────────────────────────────────────────────
+
+@mcp.tool()
+def server_stats(tool: str | None = None, last: int = 0, export_path: str | None = None) -> dict:
+    """Per-tool latency/stage/memory statistics; optionally dump every trace as JSONL to export_path."""
+    out = tracing.stats(tool, last)
+    out["cloud_cache"] = pct.cloud_cache_stats()
+    out["startup"] = {**STARTUP, "lazy_imports": dict(lazy_import.IMPORT_TIMES)}
+    if export_path:
+        out["exported"] = tracing.export_jsonl(export_path)
+        out["export_path"] = export_path
+    return out
+
+# Startup-time breakdown (seconds), reported on stderr and through server_stats
+STARTUP = {
+    "import_tools": _t_tools_imported - _t_start,
+    "import_fastmcp": _t_fastmcp_imported - _t_tools_imported,
+    "register_tools": time.perf_counter() - _t_fastmcp_imported,
+}
+STARTUP["total_before_listen"] = sum(STARTUP.values())
 
 if __name__ == "__main__":
+    print("[startup] " + ", ".join(f"{k}={v * 1000:.0f}ms" for k, v in STARTUP.items()), file=sys.stderr, flush=True)
+    array_channel.start_gc()
+    if PREWARM:
+        lazy_import.prewarm([pct.o3d, pct.spatial, pct.plt], wait_for=(HOST, PORT))
     mcp.run(transport="streamable-http")
 
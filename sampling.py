@@ -0,0 +1,162 @@
+import os
+import sys
+import threading
+import numpy as np
+from collections import OrderedDict
+
+from cache_store import file_fingerprint
+from tracing import span
+
+# Uniform random point samples read straight from a PLY file, for the
+# approximate mode of get_bounding_box / segment_plane / cluster_dbscan.
+#
+#   • binary PLY: the vertex block is memory-mapped and only the sampled rows
+#     are touched, so a 100k sample of a 100M-point file reads a few MB
+#   • ASCII PLY: one pass over the lines, only the sampled lines are parsed
+#
+# Samples are kept per file version and grow on request: asking again with a
+# larger sample_size only reads the extra points, and the smaller sample is a
+# subset of the larger one, so refined answers stay consistent.
+#
+# Anything else (other formats, list properties in the vertex element) returns
+# None and the caller falls back to loading the whole cloud.
+
+PLY_TYPES = {
+    "char": "i1", "int8": "i1", "uchar": "u1", "uint8": "u1",
+    "short": "i2", "int16": "i2", "ushort": "u2", "uint16": "u2",
+    "int": "i4", "int32": "i4", "uint": "u4", "uint32": "u4",
+    "float": "f4", "float32": "f4", "double": "f8", "float64": "f8",
+}
+ASCII_CHUNK = 64 << 20
+MAX_SAMPLES = int(os.environ.get("PCT_SAMPLE_CACHE", "8"))  # files whose samples are kept in memory
+
+_samples: OrderedDict = OrderedDict()  # fingerprint → (row indices in draw order, points)
+_lock = threading.Lock()
+
+
+def ply_header(path: str) -> dict | None:
+    """{"format", "count", "dtype", "offset", "skip_lines"} of the vertex element, or None if unsupported."""
+    if not path.lower().endswith(".ply"):
+        return None
+    with open(path, "rb") as f:
+        if f.readline().strip() != b"ply":
+            return None
+        fmt, count, props, before, lines = None, None, [], 0, 1
+        current = None
+        while True:
+            line = f.readline()
+            if not line:
+                return None
+            lines += 1
+            words = line.decode("ascii", "replace").split()
+            if not words or words[0] in ("comment", "obj_info"):
+                continue
+            if words[0] == "format":
+                fmt = words[1]
+            elif words[0] == "element":
+                current = words[1]
+                if current == "vertex":
+                    count = int(words[2])
+                elif count is None:
+                    before += 1  # an element stored ahead of the vertices
+            elif words[0] == "property" and current == "vertex":
+                if words[1] == "list" or words[1] not in PLY_TYPES:
+                    return None
+                props.append((words[2], PLY_TYPES[words[1]]))
+            elif words[0] == "end_header":
+                break
+        offset = f.tell()
+    names = [p for p, _ in props]
+    if count is None or before or not all(a in names for a in "xyz"):
+        return None
+    if fmt == "ascii":
+        dtype = None
+    elif fmt in ("binary_little_endian", "binary_big_endian"):
+        order = "<" if fmt == "binary_little_endian" else ">"
+        dtype = np.dtype([(p, order + t) for p, t in props])
+    else:
+        return None
+    return {"format": fmt, "count": count, "dtype": dtype, "names": names,
+            "offset": offset, "skip_lines": lines}
+
+
+def _read_rows(path: str, header: dict, idx: np.ndarray) -> np.ndarray:
+    """xyz (float64) of the vertex rows `idx` (sorted ascending)."""
+    if header["dtype"] is not None:
+        rows = np.memmap(path, dtype=header["dtype"], mode="r", offset=header["offset"], shape=(header["count"],))
+        picked = rows[idx]
+        return np.stack([picked["x"], picked["y"], picked["z"]], axis=1).astype(np.float64)
+    cols = [header["names"].index(a) for a in "xyz"]
+    out = np.empty((len(idx), 3))
+    want, row, tail = 0, 0, b""
+    with open(path, "rb") as f:
+        for _ in range(header["skip_lines"]):
+            f.readline()
+        # split big chunks in C instead of iterating line by line in Python
+        while want < len(idx):
+            chunk = f.read(ASCII_CHUNK)
+            if not chunk:
+                break
+            lines = (tail + chunk).split(b"\n")
+            tail = lines.pop()
+            end = row + len(lines)
+            while want < len(idx) and idx[want] < end:
+                values = lines[idx[want] - row].split()
+                out[want] = [float(values[c]) for c in cols]
+                want += 1
+            row = end
+        if want < len(idx) and tail:
+            values = tail.split()
+            out[want] = [float(values[c]) for c in cols]
+            want += 1
+    if want < len(idx):
+        raise ValueError(f"'{path}' has fewer vertex rows than its header says")
+    return out
+
+
+def _draw(total: int, have: np.ndarray, extra: int, rng: np.random.Generator) -> np.ndarray:
+    """`extra` new distinct row indices not already in `have`."""
+    if extra > (total - len(have)) // 4:
+        # dense request: rejection sampling would keep hitting taken rows
+        return rng.permutation(np.setdiff1d(np.arange(total), have))[:extra]
+    fresh = np.empty(0, dtype=np.int64)
+    while len(fresh) < extra:
+        cand = rng.integers(0, total, size=int((extra - len(fresh)) * 1.2) + 16)
+        fresh = np.union1d(fresh, np.setdiff1d(cand, have, assume_unique=False))
+    return rng.permutation(fresh)[:extra]
+
+
+def sample_points(path: str, n: int, seed: int = 0) -> tuple[np.ndarray, int] | None:
+    """
+    (points, total_points) with a uniform sample of min(n, total) points, or
+    None if the file cannot be sampled without a full load.
+    """
+    try:
+        header = ply_header(path)
+    except (OSError, ValueError) as e:
+        print(f"[warn] could not read PLY header of '{path}': {e}", file=sys.stderr, flush=True)
+        return None
+    if header is None:
+        return None
+    total = header["count"]
+    n = min(int(n), total)
+    key = file_fingerprint(path)
+    with _lock:
+        idx, pts = _samples.get(key, (np.empty(0, dtype=np.int64), np.empty((0, 3))))
+    if len(idx) < n:
+        rng = np.random.default_rng([seed, len(idx)])
+        new = _draw(total, idx, n - len(idx), rng)
+        order = np.argsort(new)
+        with span("load", sampled=True, points=len(new)):
+            rows = _read_rows(path, header, new[order])  # file order: sequential reads
+        # keep rows in the order they were drawn, so any prefix is itself a uniform sample
+        new_pts = np.empty_like(rows)
+        new_pts[order] = rows
+        idx = np.concatenate([idx, new])
+        pts = np.concatenate([pts, new_pts])
+        with _lock:
+            _samples[key] = (idx, pts)
+            _samples.move_to_end(key)
+            while len(_samples) > MAX_SAMPLES:
+                _samples.popitem(last=False)
+    return pts[:n], total
@@ -0,0 +1,305 @@
+import os
+import sys
+import json
+import threading
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+
+import feature_store
+import scan_metadata
+from cache_store import CACHE_DIR, file_fingerprint
+from lazy_import import lazy_import
+
+o3d = lazy_import("open3d")
+
+# On-disk vector index of one global descriptor per scan, used to answer
+# "which stored scan looks most like this one".
+#
+#   .pct_cache/scan_index/manifest.json   [{"path", "fingerprint"}, ...]  (row order)
+#   .pct_cache/scan_index/vectors.npy     float32 (N, DESCRIPTOR_DIM)
+#   .pct_cache/scan_index/ivf.npz         k-means centroids + per-row list assignment
+#
+# Search is an inverted-file (IVF) approximate kNN: the query is compared against
+# the centroids first and only the `nprobe` closest lists are scanned exactly.
+
+INDEX_DIR = os.path.join(CACHE_DIR, "scan_index")
+FPFH_BINS = 33
+SHAPE_BINS = 16
+DESCRIPTOR_DIM = 2 * FPFH_BINS + 2 * SHAPE_BINS
+# below this many scans an exact scan is faster than maintaining the coarse quantizer
+IVF_MIN_SIZE = 256
+
+
+# ─── Global descriptor ────────────────────────────────────────────────────────
+
+def _descriptor_params(extent: np.ndarray) -> tuple[float, float, float]:
+    """Voxel size and FPFH radii relative to the scan extent, so descriptors are scale-aware."""
+    voxel = max(float(np.linalg.norm(extent)) / 64.0, 1e-6)
+    return voxel, voxel * 2.0, voxel * 5.0
+
+
+def _unit(v: np.ndarray) -> np.ndarray:
+    n = np.linalg.norm(v)
+    return v / n if n > 0 else v
+
+
+def compute_descriptor(path: str, seed: int = 0) -> np.ndarray:
+    """
+    Global descriptor of one cloud (float32, DESCRIPTOR_DIM):
+      pooled FPFH (mean + std over all points) | D2 shape distribution | height histogram
+    Every block is L2-normalised so no single part dominates the distance.
+    """
+    # the extent comes from the precomputed record when there is one; otherwise the
+    # cloud is loaded once (sidecar first) and handed on, so a store miss reuses it
+    pc = None
+    record = scan_metadata.load_metadata(path)
+    if record is not None and "aabb" in record:
+        extent = np.subtract(record["aabb"]["max"], record["aabb"]["min"])
+    else:
+        pc = scan_metadata.load_sidecar(path)
+        if pc is None:
+            pc = o3d.io.read_point_cloud(path)
+        extent = pc.get_axis_aligned_bounding_box().get_extent()
+    voxel, r_normal, r_feature = _descriptor_params(extent)
+    points, _, features, _ = feature_store.get_features(path, voxel, r_normal, r_feature, pc=pc)
+    fpfh = np.concatenate([_unit(features.mean(axis=0)), _unit(features.std(axis=0))])
+
+    rng = np.random.default_rng(seed)
+    pts = points.astype(np.float64)
+    diam = float(np.linalg.norm(pts.max(axis=0) - pts.min(axis=0))) or 1.0
+    a = pts[rng.integers(0, len(pts), 4096)]
+    b = pts[rng.integers(0, len(pts), 4096)]
+    d2, _ = np.histogram(np.linalg.norm(a - b, axis=1) / diam, bins=SHAPE_BINS, range=(0.0, 1.0))
+    z = pts[:, 2]
+    span = (z.max() - z.min()) or 1.0
+    zh, _ = np.histogram((z - z.min()) / span, bins=SHAPE_BINS, range=(0.0, 1.0))
+
+    return np.concatenate([fpfh, _unit(d2.astype(np.float64)), _unit(zh.astype(np.float64))]).astype(np.float32)
+
+
+def _descriptor_job(path: str):
+    try:
+        return path, compute_descriptor(path), None
+    except Exception as e:  # one unreadable scan must not abort the whole update
+        return path, None, str(e)
+
+
+# ─── Index ────────────────────────────────────────────────────────────────────
+
+def _kmeans(x: np.ndarray, k: int, iters: int = 20, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    centroids = x[rng.choice(len(x), k, replace=False)].copy()
+    for _ in range(iters):
+        assign = _nearest(x, centroids)
+        for c in range(k):
+            members = x[assign == c]
+            if len(members):
+                centroids[c] = members.mean(axis=0)
+    return centroids
+
+
+def _sq_dists(x: np.ndarray, y: np.ndarray) -> np.ndarray:
+    return (x * x).sum(1)[:, None] - 2.0 * x @ y.T + (y * y).sum(1)[None, :]
+
+
+def _nearest(x: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    return _sq_dists(x, centroids).argmin(axis=1)
+
+
+class ScanIndex:
+    def __init__(self, root: str = INDEX_DIR):
+        self.root = root
+        self.entries: list[dict] = []
+        self.vectors = np.zeros((0, DESCRIPTOR_DIM), dtype=np.float32)
+        self.centroids: np.ndarray | None = None
+        self.assign: np.ndarray | None = None
+        self.trained_size = 0
+
+    # -- persistence ----------------------------------------------------------
+
+    def load(self) -> "ScanIndex":
+        manifest = os.path.join(self.root, "manifest.json")
+        if not os.path.exists(manifest):
+            return self
+        with open(manifest) as f:
+            self.entries = json.load(f)
+        self.vectors = np.load(os.path.join(self.root, "vectors.npy"))
+        ivf = os.path.join(self.root, "ivf.npz")
+        if os.path.exists(ivf):
+            with np.load(ivf) as data:
+                self.centroids = data["centroids"]
+                self.assign = data["assign"]
+                self.trained_size = int(data["trained_size"])
+        if len(self.entries) != len(self.vectors):
+            print(f"[warn] scan index manifest/vectors mismatch in '{self.root}', rebuilding", file=sys.stderr, flush=True)
+            self.__init__(self.root)
+        return self
+
+    def copy(self) -> "ScanIndex":
+        """Independent copy to update while readers keep using the shared instance."""
+        other = ScanIndex(self.root)
+        other.entries = [dict(e) for e in self.entries]
+        other.vectors = self.vectors.copy()
+        other.centroids, other.assign, other.trained_size = self.centroids, self.assign, self.trained_size
+        return other
+
+    def save(self) -> None:
+        os.makedirs(self.root, exist_ok=True)
+        np.save(os.path.join(self.root, "vectors.tmp.npy"), self.vectors)
+        os.replace(os.path.join(self.root, "vectors.tmp.npy"), os.path.join(self.root, "vectors.npy"))
+        if self.centroids is not None:
+            np.savez(os.path.join(self.root, "ivf.tmp.npz"), centroids=self.centroids,
+                     assign=self.assign, trained_size=self.trained_size)
+            os.replace(os.path.join(self.root, "ivf.tmp.npz"), os.path.join(self.root, "ivf.npz"))
+        elif os.path.exists(os.path.join(self.root, "ivf.npz")):
+            os.remove(os.path.join(self.root, "ivf.npz"))
+        tmp = os.path.join(self.root, "manifest.tmp.json")
+        with open(tmp, "w") as f:
+            json.dump(self.entries, f)
+        os.replace(tmp, os.path.join(self.root, "manifest.json"))
+
+    # -- updates --------------------------------------------------------------
+
+    def upsert(self, items: list[tuple[str, str, np.ndarray]]) -> None:
+        """Insert or overwrite (path, fingerprint, vector) rows in one batch."""
+        rows = {e["path"]: i for i, e in enumerate(self.entries)}
+        new_vecs = []
+        for path, fingerprint, vector in items:
+            if path in rows:
+                self.entries[rows[path]]["fingerprint"] = fingerprint
+                self.vectors[rows[path]] = vector
+            else:
+                rows[path] = len(self.entries)
+                self.entries.append({"path": path, "fingerprint": fingerprint})
+                new_vecs.append(vector)
+        if new_vecs:
+            self.vectors = np.vstack([self.vectors, np.stack(new_vecs)])
+        if self.centroids is not None:
+            # incremental: new/changed rows join their nearest existing list without retraining
+            self.assign = _nearest(self.vectors, self.centroids)
+
+    def remove(self, paths: set[str]) -> None:
+        keep = np.array([e["path"] not in paths for e in self.entries], dtype=bool)
+        self.entries = [e for e, k in zip(self.entries, keep) if k]
+        self.vectors = self.vectors[keep]
+        if self.assign is not None:
+            self.assign = self.assign[keep]
+
+    def maybe_train(self) -> None:
+        """(Re)train the coarse quantizer once the index has doubled since the last training."""
+        n = len(self.vectors)
+        if n < IVF_MIN_SIZE:
+            self.centroids, self.assign, self.trained_size = None, None, 0
+            return
+        if self.centroids is not None and n < 2 * self.trained_size:
+            return
+        k = int(np.sqrt(n))
+        self.centroids = _kmeans(self.vectors, k)
+        self.assign = _nearest(self.vectors, self.centroids)
+        self.trained_size = n
+
+    # -- search ---------------------------------------------------------------
+
+    def search(self, query: np.ndarray, k: int = 5, nprobe: int = 4) -> list[tuple[int, float]]:
+        if not len(self.vectors):
+            return []
+        if self.centroids is None:
+            candidates = np.arange(len(self.vectors))
+        else:
+            lists = np.argsort(_sq_dists(query[None, :], self.centroids)[0])[:nprobe]
+            candidates = np.flatnonzero(np.isin(self.assign, lists))
+        d = _sq_dists(query[None, :], self.vectors[candidates])[0]
+        order = np.argsort(d)[:k]
+        return [(int(candidates[i]), float(np.sqrt(max(d[i], 0.0)))) for i in order]
+
+
+# ─── Tool entry points ────────────────────────────────────────────────────────
+
+_loaded: dict[str, tuple] = {}  # root → (manifest stamp, ScanIndex), shared by every call
+_loaded_lock = threading.Lock()
+
+
+def _manifest_stamp(root: str):
+    try:
+        st = os.stat(os.path.join(root, "manifest.json"))
+    except FileNotFoundError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+def _index(root: str = INDEX_DIR) -> "ScanIndex":
+    """The index under `root`, read from disk only when its manifest changed (treat as read-only)."""
+    stamp = _manifest_stamp(root)
+    with _loaded_lock:
+        hit = _loaded.get(root)
+        if hit is not None and hit[0] == stamp:
+            return hit[1]
+    index = ScanIndex(root).load()
+    with _loaded_lock:
+        _loaded[root] = (stamp, index)
+    return index
+
+
+def _publish(index: "ScanIndex") -> None:
+    with _loaded_lock:
+        _loaded[index.root] = (_manifest_stamp(index.root), index)
+
+def update_index(paths: list[str], workers: int | None = None, root: str | None = None) -> dict:
+    """
+    Add new scans from `paths` and refresh changed ones. Entries are dropped
+    only if their file is gone, or if they lie under `root` (the folder `paths`
+    was listed from) but were not found there, so indexing one folder never
+    touches the rest of the library.
+    """
+    index = _index().copy()
+    known = {e["path"]: e["fingerprint"] for e in index.entries}
+    wanted = {os.path.abspath(p): p for p in paths}
+
+    todo = []
+    for abspath in wanted:
+        fp = file_fingerprint(abspath)
+        if known.get(abspath) != fp:
+            todo.append((abspath, fp))
+    prefix = os.path.join(os.path.abspath(root), "") if root is not None else None
+    removed = {p for p in known
+               if p not in wanted and (not os.path.exists(p) or (prefix is not None and p.startswith(prefix)))}
+
+    failed = {}
+    if todo:
+        fps = dict(todo)
+        done = []
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for path, vec, err in pool.map(_descriptor_job, [p for p, _ in todo]):
+                if vec is None:
+                    failed[path] = err
+                    print(f"[warn] could not index '{path}': {err}", file=sys.stderr, flush=True)
+                else:
+                    done.append((path, fps[path], vec))
+        index.upsert(done)
+    if removed:
+        index.remove(removed)
+    if todo or removed:
+        index.maybe_train()
+        index.save()
+        _publish(index)
+
+    return {
+        "indexed": len(index.entries),
+        "added_or_updated": len(todo) - len(failed),
+        "removed": len(removed),
+        "failed": failed,
+        "ivf_lists": 0 if index.centroids is None else len(index.centroids)
+    }
+
+
+def query_index(path: str, k: int = 5, nprobe: int = 4) -> list[dict]:
+    index = _index()
+    self_path = os.path.abspath(path)
+    # an indexed, unchanged query scan reuses its stored vector instead of a full reload
+    fp = file_fingerprint(self_path)
+    row = next((i for i, e in enumerate(index.entries) if e["path"] == self_path and e["fingerprint"] == fp), None)
+    query = index.vectors[row] if row is not None else compute_descriptor(path)
+    hits = index.search(query, k + 1, nprobe)
+    results = [{"path": index.entries[i]["path"], "distance": d}
+               for i, d in hits if index.entries[i]["path"] != self_path]
+    return results[:k]
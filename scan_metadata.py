@@ -0,0 +1,161 @@
+import os
+import sys
+import json
+import time
+import numpy as np
+
+from cache_store import cache_path, cache_key, file_fingerprint
+from tracing import span
+from lazy_import import lazy_import
+
+o3d = lazy_import("open3d")
+
+# Precomputed facts about a scan, written by precompute_daemon.py (or on demand)
+# and keyed by the file fingerprint, so a rewritten file is never served stale:
+#
+#   .pct_cache/meta/<key>.json   point count, AABB, OBB, height histogram, ...
+#   .pct_cache/meta/<key>.npz    binary sidecar: points (+ colors/normals) and a
+#                                voxel-downsampled preview, loaded much faster
+#                                than parsing the PLY again
+#
+# Set PCT_META_SIDECAR=0 to only write the JSON record.
+
+WRITE_SIDECAR = os.environ.get("PCT_META_SIDECAR", "1") not in ("", "0")
+HEIGHT_BINS = 32
+PREVIEW_POINTS = 50_000  # rough size of the voxel-downsampled preview
+
+
+def _paths(path: str) -> tuple[str, str]:
+    key = cache_key(file_fingerprint(path))
+    return cache_path("meta", key, ".json"), cache_path("meta", key, ".npz")
+
+
+def load_metadata(path: str) -> dict | None:
+    """The record for the current version of `path`, or None if not computed yet."""
+    try:
+        record_path, _ = _paths(path)
+    except OSError:
+        return None
+    if not os.path.exists(record_path):
+        return None
+    try:
+        with open(record_path) as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"[warn] corrupt metadata record '{record_path}': {e}", file=sys.stderr, flush=True)
+        return None
+
+
+def _compact(a: np.ndarray) -> np.ndarray:
+    """float32 when that is lossless (PLY floats are usually float32), else as is."""
+    f32 = a.astype(np.float32)
+    return f32 if np.array_equal(f32, a) else a
+
+
+def compute_metadata(path: str, pc: "o3d.geometry.PointCloud | None" = None, store: bool = True) -> dict:
+    """
+    Compute the record for `path` and, with `store`, persist it with its sidecar.
+    store=False is for clouds that are not files (the live scan; pass `pc`).
+    """
+    record_path, sidecar_path = _paths(path) if store else (None, None)
+    fingerprint = file_fingerprint(path) if store else None
+    t0 = time.perf_counter()
+    if pc is None:
+        with span("load", bytes_read=os.path.getsize(path)) as attrs:
+            pc = o3d.io.read_point_cloud(path)
+            attrs["points"] = len(pc.points)
+    pts = np.asarray(pc.points)
+    n = len(pts)
+
+    record = {"path": os.path.abspath(path) if store else path, "fingerprint": fingerprint, "points": n,
+              "has_colors": pc.has_colors(), "has_normals": pc.has_normals()}
+    if n:
+        lo, hi = pts.min(axis=0), pts.max(axis=0)
+        record["aabb"] = {"min": lo.tolist(), "max": hi.tolist()}
+        if n >= 4:
+            try:
+                obb = pc.get_oriented_bounding_box()
+                record["obb"] = {"center": np.asarray(obb.center).tolist(),
+                                 "extent": np.asarray(obb.extent).tolist(),
+                                 "R": np.asarray(obb.R).tolist()}
+            except RuntimeError as e:  # degenerate (e.g. planar) clouds
+                print(f"[warn] no OBB for '{path}': {e}", file=sys.stderr, flush=True)
+        counts, edges = np.histogram(pts[:, 2], bins=HEIGHT_BINS, range=(lo[2], hi[2]) if hi[2] > lo[2] else None)
+        record["height_histogram"] = {"edges": edges.tolist(), "counts": counts.tolist()}
+
+        # voxel edge that leaves roughly PREVIEW_POINTS occupied voxels on a surface scan
+        diag = float(np.linalg.norm(hi - lo))
+        voxel = diag / np.sqrt(PREVIEW_POINTS) if diag > 0 else 0.0
+        preview = pc.voxel_down_sample(voxel) if voxel > 0 and n > PREVIEW_POINTS else pc
+        record["preview_voxel_size"] = voxel
+        record["preview_points"] = len(preview.points)
+
+        arrays = {"preview_points": np.asarray(preview.points, dtype=np.float32)}
+        if WRITE_SIDECAR:
+            arrays["points"] = _compact(pts)
+            if pc.has_colors():
+                arrays["colors"] = _compact(np.asarray(pc.colors))
+            if pc.has_normals():
+                arrays["normals"] = _compact(np.asarray(pc.normals))
+        if store:
+            tmp = sidecar_path + ".tmp.npz"
+            np.savez(tmp, **arrays)
+            os.replace(tmp, sidecar_path)
+        record["sidecar"] = sidecar_path if store and WRITE_SIDECAR else None
+
+    record["seconds"] = time.perf_counter() - t0
+    record["computed_at"] = time.time()
+    if not store:
+        return record
+    tmp = record_path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(record, f)
+    os.replace(tmp, record_path)  # readers never see half a record
+    return record
+
+
+def get_metadata(path: str) -> dict:
+    """Stored record, computed now if the daemon has not reached this file yet."""
+    return load_metadata(path) or compute_metadata(path)
+
+
+def load_sidecar(path: str) -> "o3d.geometry.PointCloud | None":
+    """The full cloud from the binary sidecar, or None if there is none for this version."""
+    record = load_metadata(path)
+    if not record or not record.get("sidecar") or not os.path.exists(record["sidecar"]):
+        return None
+    try:
+        with span("load", sidecar=True) as attrs, np.load(record["sidecar"]) as data:
+            if "points" not in data.files:
+                return None
+            pc = o3d.geometry.PointCloud()
+            pc.points = o3d.utility.Vector3dVector(data["points"].astype(np.float64))
+            if "colors" in data.files:
+                pc.colors = o3d.utility.Vector3dVector(data["colors"].astype(np.float64))
+            if "normals" in data.files:
+                pc.normals = o3d.utility.Vector3dVector(data["normals"].astype(np.float64))
+            attrs["points"] = len(pc.points)
+            return pc
+    except (OSError, KeyError, ValueError) as e:
+        print(f"[warn] corrupt sidecar '{record['sidecar']}': {e}", file=sys.stderr, flush=True)
+        return None
+
+
+def load_preview(path: str) -> np.ndarray | None:
+    record = load_metadata(path)
+    if not record or "preview_points" not in record:
+        return None
+    _, sidecar_path = _paths(path)
+    try:
+        with np.load(sidecar_path) as data:
+            return data["preview_points"]
+    except (OSError, KeyError, ValueError):
+        return None
+
+
+def metadata_job(path: str):
+    """Process-pool entry point: (path, record or None, error or None)."""
+    try:
+        return path, compute_metadata(path), None
+    except Exception as e:  # one bad file must not stop the daemon
+        return path, None, str(e)
@@ -1,6 +1,8 @@
 #!/usr/bin/env python3
 import os
 import pointcloud_tools as pct
+import tracing
+from tracing import traced
 from mcp.server.fastmcp import FastMCP
 
 mcp = FastMCP(
@@ -13,26 +15,49 @@ mcp = FastMCP(
 DEFAULT_PATH = "data/bunny.ply"
 
 @mcp.tool()
+@traced
 def count_points(path: str = DEFAULT_PATH) -> int | dict:
     return pct.count_points(path)
 
 @mcp.tool()
-def get_bounding_box(path: str = DEFAULT_PATH) -> dict:
-    return pct.get_bounding_box(path)
+@traced
+def get_bounding_box(path: str = DEFAULT_PATH, approximate: bool = False,
+                     sample_size: int | None = None) -> dict:
+    return pct.get_bounding_box(path, approximate, sample_size)
 
 @mcp.tool()
-def list_files(path: str = ".", extension: str | None = None):
-    return pct.list_files(path, extension)
+@traced
+def list_files(path: str = ".",
+               extension: str | None = None,
+               limit: int | None = None,
+               cursor: str | None = None,
+               summarize: bool = False):
+    return pct.list_files(path, extension, limit, cursor, summarize)
 
 @mcp.tool()
-def find_ply_files(path: str = ".") -> list[str]:
-    return pct.find_ply_files(path)
+@traced
+def find_ply_files(path: str = ".",
+                   limit: int | None = None,
+                   cursor: str | None = None,
+                   summarize: bool = False) -> list[str] | dict:
+    return pct.find_ply_files(path, limit, cursor, summarize)
 
 @mcp.tool()
+@traced
 def visualize_pointcloud(path: str = DEFAULT_PATH) -> dict:
     """MCP tool to pop up an Open3D window for the given .ply file."""
     return pct.visualize_pointcloud(path)
 
+@mcp.tool()
+def server_stats(tool: str | None = None, last: int = 0, export_path: str | None = None) -> dict:
+    """Per-tool latency/stage/memory statistics; optionally dump every trace as JSONL to export_path."""
+    out = tracing.stats(tool, last)
+    out["cloud_cache"] = pct.cloud_cache_stats()
+    if export_path:
+        out["exported"] = tracing.export_jsonl(export_path)
+        out["export_path"] = export_path
+    return out
+
 if __name__ == "__main__":
     # Serve over SSE/HTTP with JSON responses
     mcp.run(transport="streamable-http")
@@ -0,0 +1,216 @@
+"""
+dispatcher.py against real s.py worker processes on ephemeral ports.
+
+    python -m pytest -q test_dispatcher.py -s     (-s shows the throughput lines)
+
+Needs the server stack (fastmcp, uvicorn, httpx, open3d); skipped otherwise.
+"""
+
+import os
+import sys
+import json
+import time
+import socket
+import signal
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+httpx = pytest.importorskip("httpx")
+pytest.importorskip("uvicorn")
+pytest.importorskip("fastmcp")
+pytest.importorskip("open3d")
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+HTTP = httpx.Client(timeout=60, follow_redirects=True)  # shared: a new client per call costs more than the call
+N_PATHS = 12
+ROUNDS = 4
+CONCURRENCY = 6
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _free_range(n: int) -> int:
+    """First port of `n` consecutive free ports."""
+    for _ in range(100):
+        base = _free_port()
+        if base + n > 65535:
+            continue
+        socks = []
+        try:
+            for p in range(base, base + n):
+                s = socket.socket()
+                socks.append(s)
+                s.bind(("127.0.0.1", p))
+            return base
+        except OSError:
+            continue
+        finally:
+            for s in socks:
+                s.close()
+    raise RuntimeError(f"no {n} consecutive free ports")
+
+
+def _write_ply(path: str, n: int) -> None:
+    with open(path, "w") as f:
+        f.write(f"ply\nformat ascii 1.0\nelement vertex {n}\n"
+                "property float x\nproperty float y\nproperty float z\nend_header\n")
+        for i in range(n):
+            f.write(f"{i * 0.01:.3f} {(i % 7) * 0.1:.3f} {(i % 3) * 0.2:.3f}\n")
+
+
+def _rpc(url: str, tool: str, args: dict, rpc_id: int = 1) -> tuple[str | None, dict]:
+    """(X-PCT-Worker header, JSON-RPC reply) of one tools/call."""
+    rpc = {"jsonrpc": "2.0", "id": rpc_id, "method": "tools/call", "params": {"name": tool, "arguments": args}}
+    headers = {"Content-Type": "application/json", "Accept": "application/json, text/event-stream"}
+    resp = HTTP.post(url, json=rpc, headers=headers)
+    resp.raise_for_status()
+    if resp.headers.get("content-type", "").startswith("application/json"):
+        reply = resp.json()
+    else:
+        reply = next(json.loads(line[len("data:"):]) for line in resp.text.splitlines() if line.startswith("data:"))
+    return resp.headers.get("x-pct-worker"), reply
+
+
+def _tool_json(reply: dict):
+    result = reply["result"]
+    assert not result.get("isError"), result
+    if result.get("structuredContent") is not None:
+        content = result["structuredContent"]
+        return content.get("result", content)
+    return json.loads(result["content"][0]["text"])
+
+
+class Cluster:
+    def __init__(self, workdir: str, workers: int):
+        self.workers = workers
+        self.port = _free_port()
+        self.base_port = _free_range(workers)
+        self.url = f"http://127.0.0.1:{self.port}/mcp/"
+        env = dict(os.environ, PCT_HEADLESS="1", PCT_PREWARM="0",
+                   PCT_CACHE_DIR=os.path.join(workdir, ".pct_cache"))
+        self.proc = subprocess.Popen([sys.executable, os.path.join(HERE, "dispatcher.py"),
+                                      "--workers", str(workers), "--port", str(self.port),
+                                      "--base-port", str(self.base_port), "--health-interval", "1"],
+                                     cwd=workdir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    def stats(self) -> dict:
+        return HTTP.get(f"http://127.0.0.1:{self.port}/dispatcher/stats", timeout=5).json()
+
+    def wait_ready(self, timeout: float = 120) -> None:
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            try:
+                if len(self.stats()["ring_nodes"]) == self.workers:
+                    return
+            except (httpx.HTTPError, ValueError):
+                pass
+            time.sleep(0.2)
+        raise RuntimeError(f"{self.workers} workers did not join the ring within {timeout}s")
+
+    def worker_stats(self, index: int) -> dict:
+        _, reply = _rpc(f"http://127.0.0.1:{self.base_port + index}/mcp/", "server_stats", {})
+        return _tool_json(reply)
+
+    def close(self) -> None:
+        self.proc.terminate()
+        try:
+            self.proc.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            self.proc.kill()
+
+
+@pytest.fixture
+def scans(tmp_path):
+    paths = []
+    for i in range(N_PATHS):
+        path = tmp_path / f"scan_{i}.ply"
+        _write_ply(str(path), 50 + i)
+        paths.append(path.name)
+    return tmp_path, paths
+
+
+@pytest.fixture
+def cluster(scans):
+    started = []
+
+    def start(workers: int) -> Cluster:
+        c = Cluster(str(scans[0]), workers)
+        started.append(c)
+        c.wait_ready()
+        return c
+
+    yield start
+    for c in started:
+        c.close()
+
+
+def _run_rounds(c: Cluster, paths: list[str]) -> tuple[dict[str, set], float]:
+    """
+    Every path ROUNDS times, CONCURRENCY calls in flight; returns
+    (path → workers that served it, calls per second). The first round runs
+    alone so each cloud is loaded exactly once.
+    """
+    owners: dict[str, set] = {p: set() for p in paths}
+
+    def call(job):
+        rpc_id, p = job
+        worker, reply = _rpc(c.url, "count_points", {"path": p}, rpc_id=rpc_id)
+        assert _tool_json(reply) == 50 + int(p[len("scan_"):-len(".ply")])
+        return p, worker
+
+    jobs = [(r * len(paths) + i, p) for r in range(ROUNDS) for i, p in enumerate(paths)]
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(CONCURRENCY) as pool:
+        done = list(pool.map(call, jobs[:len(paths)])) + list(pool.map(call, jobs[len(paths):]))
+    rate = len(jobs) / (time.perf_counter() - t0)
+    for p, worker in done:
+        owners[p].add(worker)
+    return owners, rate
+
+
+@pytest.mark.parametrize("workers", [1, 3])
+def test_paths_stick_to_one_worker(cluster, scans, workers):
+    _, paths = scans
+    c = cluster(workers)
+    owners, rate = _run_rounds(c, paths)
+    print(f"\n[dispatcher] {workers} worker(s): {rate:.1f} count_points calls/s")
+
+    assert all(len(w) == 1 for w in owners.values()), owners
+    used = {next(iter(w)) for w in owners.values()}
+    if workers == 1:
+        assert used == {"worker-0"}
+    else:
+        assert len(used) > 1, used  # 12 paths over 3 workers: all on one is ~1e-5
+
+    # each cloud was loaded once, by its owner; every repeat was a cache hit
+    hits = misses = 0
+    for i in range(workers):
+        cache = c.worker_stats(i)["cloud_cache"]
+        hits += cache["hits"]
+        misses += cache["misses"]
+    assert misses == len(paths)
+    assert hits == (ROUNDS - 1) * len(paths)
+
+
+def test_dead_worker_keys_move_to_survivors(cluster, scans):
+    _, paths = scans
+    c = cluster(3)
+    owners = {p: next(iter(w)) for p, w in _run_rounds(c, paths)[0].items()}
+    victim = owners[paths[0]]
+    pid = next(w["pid"] for w in c.stats()["workers"] if w["name"] == victim)
+    os.kill(pid, signal.SIGKILL)
+    time.sleep(0.2)
+
+    for i, p in enumerate(paths):
+        worker, reply = _rpc(c.url, "count_points", {"path": p}, rpc_id=1000 + i)
+        _tool_json(reply)
+        if owners[p] == victim:
+            assert worker != victim, p
+        else:
+            assert worker == owners[p], p  # only the dead worker's share moved
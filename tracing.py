@@ -0,0 +1,173 @@
+import os
+import sys
+import json
+import time
+import resource
+import functools
+import threading
+import tracemalloc
+import contextvars
+from collections import deque, OrderedDict
+from contextlib import contextmanager
+
+# Per-stage tracing for MCP tool calls.
+#
+# Every tool wrapped with @traced gets one trace record:
+#   {"tool", "args", "started", "seconds", "ok", "error",
+#    "spans": [{"stage", "seconds", ...attrs}], "rss_peak_delta_kb", "py_peak_kb"}
+# Stages are recorded by span() calls in the code under the tool:
+#   resolve (path lookup) · load (file → cloud) · convert (numpy ↔ Open3D)
+#   render (viewer) · serialize (result → JSON). Whatever time is not covered
+#   by a top-level span is reported as "compute".
+# rss_peak_delta_kb is how far the call raised the process peak RSS (0 when it
+# stayed under an earlier peak). The JSON text made for the serialize span is
+# handed to the transport through serialize(), so results are encoded once.
+#
+# PCT_TRACE_LOG=<file>   append every finished trace as a JSON line
+# PCT_TRACE_MEMORY=1     also track Python-heap peaks with tracemalloc (slower)
+# PCT_TRACE_KEEP=<n>     traces kept in memory for server_stats (default 1000)
+
+TRACE_LOG = os.environ.get("PCT_TRACE_LOG")
+TRACE_MEMORY = os.environ.get("PCT_TRACE_MEMORY", "") not in ("", "0")
+TRACES: deque = deque(maxlen=int(os.environ.get("PCT_TRACE_KEEP", "1000")))
+
+_current = contextvars.ContextVar("pct_trace", default=None)
+_lock = threading.Lock()
+_encoded: OrderedDict = OrderedDict()  # id(result) → (result, JSON text), awaiting the transport
+ENCODED_KEEP = 16
+
+if TRACE_MEMORY:
+    tracemalloc.start()
+
+
+@contextmanager
+def span(stage: str, **attrs):
+    """
+    Time one stage of the current tool call. Yields the attribute dict so the
+    caller can fill in values only known afterwards (e.g. point counts).
+    Outside a traced call this is a no-op apart from the timing.
+    """
+    trace = _current.get()
+    depth = trace["_depth"] if trace is not None else 0
+    if trace is not None:
+        trace["_depth"] += 1
+    t0 = time.perf_counter()
+    try:
+        yield attrs
+    finally:
+        if trace is not None:
+            trace["_depth"] -= 1
+            trace["spans"].append({"stage": stage, "seconds": time.perf_counter() - t0,
+                                   "depth": depth, **attrs})
+
+
+def _short_args(kwargs: dict) -> dict:
+    return {k: (v if isinstance(v, (int, float, bool, type(None))) or len(str(v)) < 200 else f"<{len(str(v))} chars>")
+            for k, v in kwargs.items()}
+
+
+def _finish(trace: dict) -> None:
+    covered = sum(s["seconds"] for s in trace["spans"] if s["depth"] == 0)
+    trace["spans"].append({"stage": "compute", "seconds": max(trace["seconds"] - covered, 0.0), "depth": 0})
+    del trace["_depth"]
+    with _lock:
+        TRACES.append(trace)
+        if TRACE_LOG:
+            with open(TRACE_LOG, "a") as f:
+                f.write(json.dumps(trace, default=str) + "\n")
+
+
+def traced(fn):
+    """Decorator for MCP tool functions (put it under @mcp.tool())."""
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        trace = {"tool": fn.__name__, "args": _short_args(kwargs), "started": time.time(),
+                 "spans": [], "ok": True, "error": None, "_depth": 0}
+        token = _current.set(trace)
+        if TRACE_MEMORY:
+            tracemalloc.reset_peak()
+        rss0 = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        t0 = time.perf_counter()
+        try:
+            result = fn(*args, **kwargs)
+            # what the transport will send; strings go out as they are
+            with span("serialize") as attrs:
+                if isinstance(result, str):
+                    attrs["bytes"] = len(result.encode("utf-8"))
+                else:
+                    text = json.dumps(result, default=str)
+                    attrs["bytes"] = len(text)
+                    with _lock:
+                        _encoded[id(result)] = (result, text)
+                        while len(_encoded) > ENCODED_KEEP:
+                            _encoded.popitem(last=False)
+            return result
+        except Exception as e:
+            trace["ok"] = False
+            trace["error"] = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            trace["seconds"] = time.perf_counter() - t0
+            trace["rss_peak_delta_kb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss0
+            if TRACE_MEMORY:
+                trace["py_peak_kb"] = tracemalloc.get_traced_memory()[1] // 1024
+            _current.reset(token)
+            try:
+                _finish(trace)
+            except Exception as e:  # tracing must never break a tool call
+                print(f"[warn] could not record trace: {e}", file=sys.stderr, flush=True)
+    return wrapper
+
+
+def serialize(result) -> str:
+    """tool_serializer for FastMCP: reuses the JSON text @traced made for this result."""
+    with _lock:
+        hit = _encoded.pop(id(result), None)
+    if hit is not None and hit[0] is result:
+        return hit[1]
+    return json.dumps(result, default=str)
+
+
+# ─── Queries ──────────────────────────────────────────────────────────────────
+
+def _pct(values: list[float], q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))] if values else 0.0
+
+
+def stats(tool: str | None = None, last: int = 0) -> dict:
+    """Aggregate per tool (calls, errors, latency percentiles, mean per stage) plus the `last` raw traces."""
+    with _lock:
+        traces = [t for t in TRACES if tool is None or t["tool"] == tool]
+    per_tool: dict[str, dict] = {}
+    for t in traces:
+        agg = per_tool.setdefault(t["tool"], {"calls": 0, "errors": 0, "seconds": [], "stages": {},
+                                              "bytes_read": 0, "points": 0, "max_rss_peak_delta_kb": 0})
+        agg["calls"] += 1
+        agg["errors"] += not t["ok"]
+        agg["seconds"].append(t["seconds"])
+        agg["max_rss_peak_delta_kb"] = max(agg["max_rss_peak_delta_kb"], t.get("rss_peak_delta_kb") or 0)
+        for s in t["spans"]:
+            agg["stages"][s["stage"]] = agg["stages"].get(s["stage"], 0.0) + s["seconds"]
+            agg["bytes_read"] += s.get("bytes_read", 0)
+            agg["points"] += s.get("points", 0) if s["stage"] == "load" else 0
+    for agg in per_tool.values():
+        secs = agg.pop("seconds")
+        agg["mean_seconds"] = sum(secs) / len(secs)
+        agg["p50_seconds"] = _pct(secs, 0.5)
+        agg["p95_seconds"] = _pct(secs, 0.95)
+        agg["stages"] = {k: v / agg["calls"] for k, v in agg["stages"].items()}
+    out = {"traces_kept": len(traces), "tools": per_tool}
+    if last:
+        out["last"] = traces[-last:]
+    return out
+
+
+def export_jsonl(path: str) -> int:
+    """Write every trace currently held in memory to `path` (one JSON object per line)."""
+    with _lock:
+        traces = list(TRACES)
+    with open(path, "w") as f:
+        for t in traces:
+            f.write(json.dumps(t, default=str) + "\n")
+    return len(traces)
@@ -0,0 +1,105 @@
+import os
+import json
+import time
+from contextlib import contextmanager
+
+# End-to-end timing of one agent turn in the chat clients.
+#
+# A turn is split into stages: "draft" (first LLM completion), "extract"
+# (JSON tool-call extraction), "tool" (MCP round-trip) and "wrapup" (second
+# LLM completion on the tool result). LLM stages also record prompt tokens,
+# tokens reused from the KV cache, generated tokens, time to first token
+# (≈ prompt evaluation) and generation speed.
+#
+# PCT_PROFILE=1            print a compact summary line after every turn
+# PCT_PROFILE_LOG=<file>   append full turn records as JSON lines
+#                          (default turn_profile.jsonl, empty string disables)
+
+PROFILE_SUMMARY = os.environ.get("PCT_PROFILE", "") not in ("", "0")
+PROFILE_LOG = os.environ.get("PCT_PROFILE_LOG", "turn_profile.jsonl")
+
+
+class TurnProfiler:
+    def __init__(self, llm, summary: bool = PROFILE_SUMMARY, log_path: str | None = PROFILE_LOG):
+        self.llm = llm
+        self.summary = summary
+        self.log_path = log_path or None
+        self.turn: dict | None = None
+
+    # -- turn lifecycle -------------------------------------------------------
+
+    def start_turn(self, user_input: str) -> None:
+        self.turn = {"started": time.time(), "input_chars": len(user_input), "stages": [], "_t0": time.perf_counter()}
+
+    def end_turn(self, **attrs) -> dict | None:
+        if self.turn is None:
+            return None
+        turn, self.turn = self.turn, None
+        turn["seconds"] = time.perf_counter() - turn.pop("_t0")
+        turn.update(attrs)
+        if self.log_path:
+            with open(self.log_path, "a") as f:
+                f.write(json.dumps(turn) + "\n")
+        if self.summary:
+            print(format_summary(turn), flush=True)
+        return turn
+
+    @contextmanager
+    def stage(self, name: str, **attrs):
+        t0 = time.perf_counter()
+        try:
+            yield attrs
+        finally:
+            if self.turn is not None:
+                self.turn["stages"].append({"stage": name, "seconds": time.perf_counter() - t0, **attrs})
+
+    # -- LLM calls ------------------------------------------------------------
+
+    def _cached_tokens(self, tokens: list[int]) -> int | None:
+        """How much of the prompt is already in llama.cpp's KV cache (longest common token prefix)."""
+        prev = getattr(self.llm, "input_ids", None)
+        if prev is None:
+            return None
+        # input_ids is preallocated to n_ctx; only the first n_tokens are in the cache
+        prev = prev[:getattr(self.llm, "n_tokens", 0)]
+        n = 0
+        for a, b in zip(prev, tokens):
+            if a != b:
+                break
+            n += 1
+        return n
+
+    def complete(self, stage: str, **params) -> str:
+        """
+        llm.create_completion, streamed so prompt evaluation (time to first
+        token) and generation can be timed separately.
+        """
+        tokens = self.llm.tokenize(params["prompt"].encode("utf-8"))
+        with self.stage(stage, prompt_tokens=len(tokens), cached_tokens=self._cached_tokens(tokens)) as attrs:
+            t0 = time.perf_counter()
+            first = None
+            generated = 0
+            parts = []
+            for chunk in self.llm.create_completion(stream=True, **params):
+                if first is None:
+                    first = time.perf_counter()
+                generated += 1
+                parts.append(chunk["choices"][0]["text"])
+            end = time.perf_counter()
+            first = first or end
+            attrs["generated_tokens"] = generated
+            attrs["prompt_eval_seconds"] = first - t0
+            attrs["generation_seconds"] = end - first
+            attrs["tokens_per_sec"] = generated / (end - first) if end > first else 0.0
+        return "".join(parts)
+
+
+def format_summary(turn: dict) -> str:
+    parts = []
+    for s in turn["stages"]:
+        if "generated_tokens" in s:
+            parts.append(f"{s['stage']} {s['seconds']:.2f}s (p={s['prompt_tokens']} c={s['cached_tokens']} "
+                         f"g={s['generated_tokens']} pe={s['prompt_eval_seconds']:.2f}s {s['tokens_per_sec']:.1f}tok/s)")
+        else:
+            parts.append(f"{s['stage']} {s['seconds']:.3f}s")
+    return "[turn] " + " | ".join(parts) + f" | total {turn['seconds']:.2f}s"